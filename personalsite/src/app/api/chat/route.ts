@@ -1,13 +1,22 @@
 import { Pinecone } from "@pinecone-database/pinecone";
 import OpenAI from "openai";
 import { NextRequest, NextResponse } from "next/server";
-import bm25Model from "@/data/bm25-model.json";
+// Query-side BM25 export (vocab + IDF); bm25-model.json holds the full
+// statistics the indexer needs and isn't loaded here.
+import bm25Model from "@/data/bm25-query.json";
+// Written by create-pinecone.py when a rebuild is validated. It ships in the
+// same deploy as bm25-query.json, so the namespace and the sparse vocabulary
+// always switch together.
+import ragIndex from "@/data/rag-index.json";
 import { getJobsFromYaml } from "@/utils/jobUtils";
 import { getInvolvementsFromYaml } from "@/utils/involvementUtils";
 import { resolveTopic } from "@/utils/topicsUtils";
 import { projects as projectsCatalog } from "@/data/projectsData";
 import { getCorpusForArtifact } from "@/utils/quotesUtils";
 import { checkChatRateLimit, getClientIdentifier } from "@/utils/rateLimit";
+import { hydrateChunkTexts } from "@/utils/chunkTexts";
+import { lookupQueryEmbedding } from "@/utils/queryEmbeddings";
+import { hydratePrecomputedMatches, lookupQueryResults } from "@/utils/queryResults";
 import { composeA2UI } from "@/a2ui/compose";
 import {
   formatCanonicalWorkContext,
@@ -42,6 +51,15 @@ import {
 } from "@/utils/localEvidence";
 
 const MODEL_CONFIG = getModelRoutingConfig();
+// Written by python-rag/create-pinecone.py. build_id and dimension are
+// absent until its first run that records them; index only names a
+// Pinecone index other than PINECONE_INDEX_NAME for shortened embeddings.
+const INDEX_POINTER = ragIndex as {
+  namespace: string;
+  build_id?: string;
+  index?: string;
+  dimension?: number;
+};
 
 type RetrievalMatchLike = {
   metadata?: Record<string, unknown>;
@@ -704,7 +722,9 @@ export async function POST(req: NextRequest) {
     const pinecone = new Pinecone({
       apiKey: process.env.PINECONE_API_KEY!,
     });
-    const index = pinecone.Index(process.env.PINECONE_INDEX_NAME!);
+    const index = pinecone
+      .Index(INDEX_POINTER.index ?? process.env.PINECONE_INDEX_NAME!)
+      .namespace(INDEX_POINTER.namespace);
 
     const allJobs = getJobsFromYaml();
     const canonicalJobs = selectCanonicalJobsForQuery(currentQuery, allJobs);
@@ -734,25 +754,55 @@ export async function POST(req: NextRequest) {
     console.log(`🔍 Original: "${currentQuery}"`);
 
     const tRetrievalStart = Date.now();
-    const baselineEmbResp = await openai.embeddings.create({
+    // Known queries (chat suggestions) were embedded at index time.
+    const precomputedQuery = lookupQueryEmbedding(currentQuery, {
       model: MODEL_CONFIG.embeddingModel,
-      input: currentQuery,
+      dimension: INDEX_POINTER.dimension,
     });
-    const baselineEmbeddingUsage = toUsageRecord(
-      "baseline_embedding",
-      MODEL_CONFIG.embeddingModel,
-      baselineEmbResp.usage,
-    );
-    if (baselineEmbeddingUsage) recordUsage(baselineEmbeddingUsage);
-    const baselineEmbedding = baselineEmbResp.data[0].embedding;
-    const baselineSparse = encodeSparseQuery(currentQuery);
+    let baselineEmbedding: number[];
+    let baselineSparse: { indices: number[]; values: number[] };
+    if (precomputedQuery) {
+      console.log("⚡ Using precomputed query vectors");
+      baselineEmbedding = precomputedQuery.dense;
+      baselineSparse = precomputedQuery.sparse;
+    } else {
+      const baselineEmbResp = await openai.embeddings.create({
+        model: MODEL_CONFIG.embeddingModel,
+        input: currentQuery,
+        dimensions: INDEX_POINTER.dimension,
+      });
+      const baselineEmbeddingUsage = toUsageRecord(
+        "baseline_embedding",
+        MODEL_CONFIG.embeddingModel,
+        baselineEmbResp.usage,
+      );
+      if (baselineEmbeddingUsage) recordUsage(baselineEmbeddingUsage);
+      baselineEmbedding = baselineEmbResp.data[0].embedding;
+      baselineSparse = encodeSparseQuery(currentQuery);
+    }
+    // Their hybrid results were taken at index time too, and stay usable
+    // until a run changes the index (and its build_id).
+    const storedMatches = precomputedQuery
+      ? lookupQueryResults(currentQuery, INDEX_POINTER.build_id)
+      : null;
+    const precomputedMatches = storedMatches && hydratePrecomputedMatches(storedMatches);
+    if (storedMatches && !precomputedMatches) {
+      console.warn("Precomputed retrieval results are missing chunk text; querying the index instead");
+    }
     let retrievalMode: "hybrid" | "dense" = "hybrid";
-    let baselineResponse = await index.query({
-      vector: baselineEmbedding,
-      sparseVector: baselineSparse.indices.length > 0 ? baselineSparse : undefined,
-      topK: 30,
-      includeMetadata: true,
-    });
+    let baselineResponse: Awaited<ReturnType<typeof index.query>>;
+    if (precomputedMatches) {
+      console.log("⚡ Using precomputed retrieval results");
+      baselineResponse = { matches: precomputedMatches, namespace: INDEX_POINTER.namespace };
+    } else {
+      baselineResponse = await index.query({
+        vector: baselineEmbedding,
+        sparseVector: baselineSparse.indices.length > 0 ? baselineSparse : undefined,
+        topK: 30,
+        includeMetadata: true,
+      });
+    }
+    hydrateChunkTexts(baselineResponse.matches);
     if (
       baselineSparse.indices.length > 0 &&
       sparseResultsLookMisaligned(currentQuery, baselineResponse.matches)
@@ -766,6 +816,7 @@ export async function POST(req: NextRequest) {
         topK: 30,
         includeMetadata: true,
       });
+      hydrateChunkTexts(baselineResponse.matches);
     }
     const baselineMs = Date.now() - tRetrievalStart;
     console.log(`⏱️  Baseline retrieval: ${baselineMs}ms (${baselineResponse.matches.length} matches)`);
@@ -832,6 +883,7 @@ export async function POST(req: NextRequest) {
         const expEmbResp = await openai.embeddings.create({
           model: MODEL_CONFIG.embeddingModel,
           input: expandedQueries,
+          dimensions: INDEX_POINTER.dimension,
         });
         const expandedEmbeddingUsage = toUsageRecord(
           "expanded_embedding",
@@ -864,8 +916,8 @@ export async function POST(req: NextRequest) {
         // Merge: dedupe by id, keep max score, sort descending.
         type Match = (typeof baselineResponse.matches)[number];
         const byId = new Map<string, Match>();
-        const expandedMatches = expResponses.flatMap(
-          (response) => response.matches,
+        const expandedMatches = hydrateChunkTexts(
+          expResponses.flatMap((response) => response.matches),
         );
         for (const m of [...baselineResponse.matches, ...expandedMatches]) {
           const existing = byId.get(m.id);
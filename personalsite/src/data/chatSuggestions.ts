@@ -65,6 +65,11 @@ export const CHAT_SUGGESTION_CATEGORIES: readonly ChatSuggestionCategory[] = [
   "life",
 ];
 
+// Bump when normalizeSuggestedQuestion changes, together with its port in
+// python-rag/known_queries.py (normalize_query): the precomputed query
+// vectors are keyed by it.
+export const SUGGESTED_QUESTION_NORMALIZATION = "suggested-question-v1";
+
 export function normalizeSuggestedQuestion(value: string): string {
   return value
     .normalize("NFKC")
@@ -0,0 +1,116 @@
+import fs from "fs";
+import path from "path";
+import zlib from "zlib";
+
+// Chunk texts keyed by chunk ID, written by python-rag/content_store.py on
+// every indexing run. With --text-store the indexer leaves `text` out of the
+// Pinecone metadata (smaller query responses), and hydrateChunkTexts puts it
+// back on the matches that need it.
+
+const CHUNK_TEXTS_PATH = path.join(process.cwd(), "src", "data", "chunk-texts.bin");
+const MAGIC = "RAGTXT1\n";
+const FOOTER_BYTES = 8 + 4 + MAGIC.length; // index offset (u64), index length (u32), magic
+const MAX_CACHED_BLOCKS = 64; // ~4 MB of decompressed text
+
+type ChunkTextIndex = {
+  version: number;
+  codec: "zstd" | "deflate";
+  blocks: [offset: number, length: number][];
+  chunks: Record<string, [block: number, start: number, length: number]>;
+};
+
+type MatchWithMetadata = {
+  id: string;
+  metadata?: Record<string, unknown>;
+};
+
+function decompressBlock(codec: ChunkTextIndex["codec"], data: Buffer): Buffer {
+  if (codec === "deflate") return zlib.inflateSync(data);
+  // zlib gained zstd in Node 22.15; older runtimes need a deflate store.
+  const { zstdDecompressSync } = zlib as unknown as {
+    zstdDecompressSync?: (data: Buffer) => Buffer;
+  };
+  if (!zstdDecompressSync) {
+    throw new Error(
+      "chunk-texts.bin is zstd-compressed, which needs Node 22.15+; rebuild it with the deflate codec",
+    );
+  }
+  return zstdDecompressSync(data);
+}
+
+export class ChunkTextStore {
+  private readonly data: Buffer;
+  private readonly index: ChunkTextIndex;
+  private readonly blocks = new Map<number, Buffer>();
+
+  constructor(data: Buffer) {
+    this.data = data;
+    const footer = data.length - FOOTER_BYTES;
+    if (footer < 0 || data.toString("latin1", footer + 12) !== MAGIC) {
+      throw new Error("Not a chunk text store");
+    }
+    const indexOffset = Number(data.readBigUInt64LE(footer));
+    const indexLength = data.readUInt32LE(footer + 8);
+    this.index = JSON.parse(
+      data.toString("utf8", indexOffset, indexOffset + indexLength),
+    );
+  }
+
+  get(id: string): string | undefined {
+    const entry = Object.hasOwn(this.index.chunks, id)
+      ? this.index.chunks[id]
+      : undefined;
+    if (!entry) return undefined;
+    const [block, start, length] = entry;
+    let text = this.blocks.get(block);
+    if (!text) {
+      const [offset, size] = this.index.blocks[block];
+      text = decompressBlock(this.index.codec, this.data.subarray(offset, offset + size));
+      if (this.blocks.size >= MAX_CACHED_BLOCKS) {
+        this.blocks.delete(this.blocks.keys().next().value!);
+      }
+      this.blocks.set(block, text);
+    }
+    return text.toString("utf8", start, start + length);
+  }
+}
+
+let cachedStore: ChunkTextStore | null | undefined;
+
+export function loadChunkTextStore(): ChunkTextStore | null {
+  if (cachedStore === undefined) {
+    try {
+      cachedStore = new ChunkTextStore(fs.readFileSync(CHUNK_TEXTS_PATH));
+    } catch (error) {
+      console.warn(`Chunk text store unavailable: ${error}`);
+      cachedStore = null;
+    }
+  }
+  return cachedStore;
+}
+
+/**
+ * Fill in metadata.text for matches uploaded without it. Matches that still
+ * carry their text (indexed without --text-store) are left alone, so the
+ * store is only read once text has actually been moved out of Pinecone.
+ * A block that can't be decoded leaves its matches without text rather than
+ * failing the request.
+ */
+export function hydrateChunkTexts<T extends MatchWithMetadata>(
+  matches: T[],
+  store?: ChunkTextStore | null,
+): T[] {
+  for (const match of matches) {
+    if (!match.metadata || typeof match.metadata.text === "string") continue;
+    store ??= loadChunkTextStore();
+    let text: string | undefined;
+    try {
+      text = store?.get(match.id);
+    } catch (error) {
+      console.warn(`Chunk text for ${match.id} unavailable: ${error}`);
+      continue;
+    }
+    if (text !== undefined) match.metadata.text = text;
+  }
+  return matches;
+}
@@ -0,0 +1,72 @@
+import fs from "fs";
+import path from "path";
+import {
+  SUGGESTED_QUESTION_NORMALIZATION,
+  normalizeSuggestedQuestion,
+} from "../data/chatSuggestions.ts";
+
+// Dense and sparse vectors for the queries known at index time (chat
+// suggestions and bench-chat.mjs defaults), written by
+// python-rag/create-pinecone.py next to bm25-query.json. A hit lets the route
+// query Pinecone without waiting on the embeddings API.
+
+const QUERY_EMBEDDINGS_PATH = path.join(process.cwd(), "src", "data", "query-embeddings.json");
+
+export type SparseVector = { indices: number[]; values: number[] };
+
+export type PrecomputedQuery = {
+  text: string;
+  dense: number[];
+  sparse: SparseVector;
+};
+
+export type QueryEmbeddingsExport = {
+  version: number;
+  normalization: string;
+  model: string;
+  dimension: number;
+  queries: Record<string, { text: string; dense: string; sparse: SparseVector }>;
+};
+
+export function unpackVector(packed: string): number[] {
+  const bytes = Buffer.from(packed, "base64");
+  const vector = new Array<number>(bytes.length / 4);
+  for (let i = 0; i < vector.length; i++) vector[i] = bytes.readFloatLE(i * 4);
+  return vector;
+}
+
+let cachedExport: QueryEmbeddingsExport | null | undefined;
+
+function loadQueryEmbeddings(): QueryEmbeddingsExport | null {
+  if (cachedExport === undefined) {
+    try {
+      const parsed = JSON.parse(fs.readFileSync(QUERY_EMBEDDINGS_PATH, "utf8"));
+      cachedExport =
+        parsed.normalization === SUGGESTED_QUESTION_NORMALIZATION ? parsed : null;
+      if (!cachedExport) {
+        console.warn("Precomputed query vectors use a different normalization; ignoring them");
+      }
+    } catch {
+      cachedExport = null;
+    }
+  }
+  return cachedExport;
+}
+
+/**
+ * Precomputed vectors for query if it is a known query embedded with model
+ * (at dimension, when given), else null. The sparse vector was encoded with
+ * the BM25 model shipped in the same deploy.
+ */
+export function lookupQueryEmbedding(
+  query: string,
+  embedding: { model: string; dimension?: number },
+  source: QueryEmbeddingsExport | null = loadQueryEmbeddings(),
+): PrecomputedQuery | null {
+  if (!source || source.model !== embedding.model) return null;
+  if (embedding.dimension !== undefined && source.dimension !== embedding.dimension) return null;
+  const key = normalizeSuggestedQuestion(query);
+  const entry = Object.hasOwn(source.queries, key) ? source.queries[key] : undefined;
+  if (!entry) return null;
+  return { text: entry.text, dense: unpackVector(entry.dense), sparse: entry.sparse };
+}
@@ -0,0 +1,78 @@
+import fs from "fs";
+import path from "path";
+import { type ChunkTextStore, hydrateChunkTexts } from "./chunkTexts.ts";
+import {
+  SUGGESTED_QUESTION_NORMALIZATION,
+  normalizeSuggestedQuestion,
+} from "../data/chatSuggestions.ts";
+
+// Retrieval results for the queries known at index time, taken from the
+// index right after python-rag/create-pinecone.py built it. They describe one
+// index build only: every run that changes the index writes a new build_id
+// to rag-index.json, and results stamped with another build are ignored.
+// Chunk text is not included: hydratePrecomputedMatches fills it in from the
+// chunk text store, and gives up on the results if any of it is missing.
+
+const QUERY_RESULTS_PATH = path.join(process.cwd(), "src", "data", "query-results.json");
+
+// Pinecone's RecordMetadata, so matches can stand in for a query response.
+export type PrecomputedMatch = {
+  id: string;
+  score: number;
+  metadata: Record<string, string | number | boolean | string[]>;
+};
+
+export type QueryResultsExport = {
+  version: number;
+  normalization: string;
+  build_id: string;
+  namespace: string;
+  top_k: number;
+  queries: Record<string, PrecomputedMatch[]>;
+};
+
+let cachedExport: QueryResultsExport | null | undefined;
+
+function loadQueryResults(): QueryResultsExport | null {
+  if (cachedExport === undefined) {
+    try {
+      const parsed = JSON.parse(fs.readFileSync(QUERY_RESULTS_PATH, "utf8"));
+      cachedExport =
+        parsed.normalization === SUGGESTED_QUESTION_NORMALIZATION ? parsed : null;
+    } catch {
+      cachedExport = null;
+    }
+  }
+  return cachedExport;
+}
+
+/**
+ * Precomputed hybrid matches (best first) for query if it is a known query
+ * and the results were taken from index build buildId, else null. The
+ * matches are copies, so callers may hydrate or rewrite their metadata.
+ */
+export function lookupQueryResults(
+  query: string,
+  buildId: string | undefined,
+  source: QueryResultsExport | null = loadQueryResults(),
+): PrecomputedMatch[] | null {
+  if (!source || !buildId || source.build_id !== buildId) return null;
+  const key = normalizeSuggestedQuestion(query);
+  const matches = Object.hasOwn(source.queries, key) ? source.queries[key] : undefined;
+  if (!matches) return null;
+  return matches.map((match) => ({ ...match, metadata: { ...match.metadata } }));
+}
+
+/**
+ * Put the chunk text back on precomputed matches. Returns null, so the
+ * caller queries the index instead, if any match's text can't be read:
+ * answering a suggested prompt from partial context is worse than paying
+ * for the live query.
+ */
+export function hydratePrecomputedMatches(
+  matches: PrecomputedMatch[],
+  store?: ChunkTextStore | null,
+): PrecomputedMatch[] | null {
+  hydrateChunkTexts(matches, store);
+  return matches.every((match) => typeof match.metadata.text === "string") ? matches : null;
+}
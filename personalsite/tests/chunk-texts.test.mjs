@@ -0,0 +1,71 @@
+import assert from "node:assert/strict";
+import test from "node:test";
+import zlib from "node:zlib";
+
+import {
+  ChunkTextStore,
+  hydrateChunkTexts,
+} from "../src/utils/chunkTexts.ts";
+
+// Same layout python-rag/content_store.py writes: compressed blocks, a JSON
+// index, then the footer (u64 index offset, u32 index length, magic).
+function buildStore(blocksOfTexts, codec = "deflate", compress = zlib.deflateSync) {
+  const frames = [];
+  const blocks = [];
+  const chunks = {};
+  let offset = 0;
+  blocksOfTexts.forEach((texts, block) => {
+    let start = 0;
+    for (const [id, text] of Object.entries(texts)) {
+      const length = Buffer.byteLength(text);
+      chunks[id] = [block, start, length];
+      start += length;
+    }
+    const frame = compress(Buffer.from(Object.values(texts).join("")));
+    frames.push(frame);
+    blocks.push([offset, frame.length]);
+    offset += frame.length;
+  });
+  const index = Buffer.from(
+    JSON.stringify({ version: 1, codec, blocks, chunks }),
+  );
+  const footer = Buffer.alloc(20);
+  footer.writeBigUInt64LE(BigInt(offset), 0);
+  footer.writeUInt32LE(index.length, 8);
+  footer.write("RAGTXT1\n", 12, "latin1");
+  return new ChunkTextStore(Buffer.concat([...frames, index, footer]));
+}
+
+test("chunk texts are read back by id across blocks", () => {
+  const store = buildStore([
+    { "a.md#1": "first chunk", "a.md#2": "zweiter Abschnitt – ü" },
+    { "b.md#1": "another block" },
+  ]);
+
+  assert.equal(store.get("a.md#2"), "zweiter Abschnitt – ü");
+  assert.equal(store.get("b.md#1"), "another block");
+  assert.equal(store.get("a.md#1"), "first chunk");
+  assert.equal(store.get("missing"), undefined);
+});
+
+test("hydration only fills matches uploaded without text", () => {
+  const store = buildStore([{ "a.md#1": "from the store" }]);
+  const matches = [
+    { id: "a.md#1", metadata: { title: "A" } },
+    { id: "a.md#1", metadata: { text: "kept from Pinecone" } },
+  ];
+
+  hydrateChunkTexts(matches, store);
+
+  assert.equal(matches[0].metadata.text, "from the store");
+  assert.equal(matches[1].metadata.text, "kept from Pinecone");
+});
+
+test("hydration leaves matches without text when a block can't be decoded", () => {
+  // Not a zstd frame, so decoding fails whether or not this Node has zstd.
+  const store = buildStore([{ "a.md#1": "unreadable" }], "zstd", (data) => data);
+  const matches = [{ id: "a.md#1", metadata: { title: "A" } }];
+
+  assert.doesNotThrow(() => hydrateChunkTexts(matches, store));
+  assert.equal(matches[0].metadata.text, undefined);
+});
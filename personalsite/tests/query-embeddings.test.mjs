@@ -0,0 +1,52 @@
+import assert from "node:assert/strict";
+import test from "node:test";
+
+import { SUGGESTED_QUESTION_NORMALIZATION } from "../src/data/chatSuggestions.ts";
+import {
+  lookupQueryEmbedding,
+  unpackVector,
+} from "../src/utils/queryEmbeddings.ts";
+
+function packVector(values) {
+  const bytes = Buffer.alloc(values.length * 4);
+  values.forEach((value, i) => bytes.writeFloatLE(value, i * 4));
+  return bytes.toString("base64");
+}
+
+const source = {
+  version: 1,
+  normalization: SUGGESTED_QUESTION_NORMALIZATION,
+  model: "text-embedding-3-small",
+  dimension: 3,
+  queries: {
+    "what's veritas": {
+      text: "What's Veritas?",
+      dense: packVector([0.5, -0.25, 1]),
+      sparse: { indices: [4, 9], values: [1.5, 2.25] },
+    },
+  },
+};
+
+test("known queries are found under the suggestion normalization", () => {
+  const hit = lookupQueryEmbedding("  What’s   Veritas?? ", { model: "text-embedding-3-small" }, source);
+
+  assert.deepEqual(hit?.dense, [0.5, -0.25, 1]);
+  assert.deepEqual(hit?.sparse, { indices: [4, 9], values: [1.5, 2.25] });
+  assert.equal(lookupQueryEmbedding("What is Veritas?", { model: "text-embedding-3-small" }, source), null);
+});
+
+test("vectors from another embedding model or width are not used", () => {
+  assert.equal(lookupQueryEmbedding("What's Veritas?", { model: "text-embedding-3-large" }, source), null);
+  assert.equal(
+    lookupQueryEmbedding("What's Veritas?", { model: "text-embedding-3-small", dimension: 512 }, source),
+    null,
+  );
+  assert.notEqual(
+    lookupQueryEmbedding("What's Veritas?", { model: "text-embedding-3-small", dimension: 3 }, source),
+    null,
+  );
+});
+
+test("packed vectors round-trip as float32", () => {
+  assert.deepEqual(unpackVector(packVector([1, 2, -3.5])), [1, 2, -3.5]);
+});
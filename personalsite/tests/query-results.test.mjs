@@ -0,0 +1,63 @@
+import assert from "node:assert/strict";
+import test from "node:test";
+
+import { SUGGESTED_QUESTION_NORMALIZATION } from "../src/data/chatSuggestions.ts";
+import {
+  hydratePrecomputedMatches,
+  lookupQueryResults,
+} from "../src/utils/queryResults.ts";
+
+const source = {
+  version: 1,
+  normalization: SUGGESTED_QUESTION_NORMALIZATION,
+  build_id: "20261018T120000Z",
+  namespace: "build-20261018T120000Z",
+  top_k: 30,
+  queries: {
+    "what's veritas": [
+      { id: "projects-3", score: 4.25, metadata: { source: "projects", title: "Veritas" } },
+      { id: "jobs-1", score: 1.5, metadata: { source: "jobs" } },
+    ],
+  },
+};
+
+test("known queries get the results of the current index build", () => {
+  const matches = lookupQueryResults("what’s Veritas?", "20261018T120000Z", source);
+
+  assert.deepEqual(matches?.map((m) => m.id), ["projects-3", "jobs-1"]);
+  assert.equal(lookupQueryResults("What is Veritas?", "20261018T120000Z", source), null);
+});
+
+test("results from another index build are not used", () => {
+  assert.equal(lookupQueryResults("What's Veritas?", "20261019T080000Z", source), null);
+  assert.equal(lookupQueryResults("What's Veritas?", undefined, source), null);
+});
+
+test("returned matches can be hydrated without touching the export", () => {
+  const [match] = lookupQueryResults("What's Veritas?", "20261018T120000Z", source);
+  match.metadata.text = "Veritas is ...";
+
+  assert.equal(source.queries["what's veritas"][0].metadata.text, undefined);
+});
+
+test("precomputed results are only used when every chunk text is available", () => {
+  const texts = { "projects-3": "Veritas is ...", "jobs-1": "Worked on ..." };
+  const store = { get: (id) => texts[id] };
+  const matches = hydratePrecomputedMatches(
+    lookupQueryResults("What's Veritas?", "20261018T120000Z", source),
+    store,
+  );
+  assert.deepEqual(matches?.map((m) => m.metadata.text), ["Veritas is ...", "Worked on ..."]);
+
+  delete texts["jobs-1"];
+  const partial = lookupQueryResults("What's Veritas?", "20261018T120000Z", source);
+  assert.equal(hydratePrecomputedMatches(partial, store), null);
+
+  const unreadable = {
+    get() {
+      throw new Error("zstd is not available");
+    },
+  };
+  const failing = lookupQueryResults("What's Veritas?", "20261018T120000Z", source);
+  assert.equal(hydratePrecomputedMatches(failing, unreadable), null);
+});
@@ -0,0 +1,193 @@
+"""
+Approximate nearest-neighbour search over the local store's dense matrix.
+
+IVFIndex is an inverted-file index in NumPy:
+
+  coarse quantizer - spherical k-means centroids (nlist unit vectors); each
+                     row is filed under the centroid it has the highest
+                     dotproduct with, and a query only scans the rows of
+                     the nprobe centroids that score highest
+  PQ (optional)    - with pq_subvectors=m, each row's residual from its
+                     centroid is compressed to m one-byte codes (256
+                     centroids per subvector); probed rows are ranked from
+                     lookup tables and only the best `limit` are returned
+                     for exact re-scoring
+
+The index stores, per row of the dense matrix, its list number and PQ codes,
+so rows are added as they are upserted (assignment against the trained
+centroids, no retraining) and compaction just keeps the surviving rows.
+Training runs over the whole matrix (sampled), and callers retrain once the
+matrix has grown well past what the centroids were trained on.
+
+Scores are dotproducts, the metric the hybrid index uses. Plain (L2) k-means
+leaves short "catch-all" centroids near the origin that hold rows from many
+unrelated topics yet never score well against a query, so whole topics go
+missing; unit-length centroids avoid that for unit-norm embeddings.
+"""
+
+import numpy as np
+
+PQ_CENTROIDS = 256  # One byte per subvector code
+ADD_BATCH = 8192    # Rows filed at a time
+KMEANS_ITERATIONS = 12
+KMEANS_SAMPLE_PER_CENTROID = 32
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0,
+           spherical: bool = False) -> np.ndarray:
+    """Lloyd's k-means on a sample of vectors; returns (k, dim) float32
+    centroids. spherical=True assigns by dotproduct and keeps the centroids
+    unit-length."""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample = vectors[np.sort(rng.choice(n, min(n, k * KMEANS_SAMPLE_PER_CENTROID), replace=False))]
+    sample = np.asarray(sample, dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = nearest(sample, centroids, spherical)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Re-seed empty clusters with random sample points.
+        if empty.any():
+            centroids[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        if spherical:
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+def nearest(vectors: np.ndarray, centroids: np.ndarray, by_dotproduct: bool = False, batch: int = 8192) -> np.ndarray:
+    """Index of the L2-nearest (or highest-dotproduct) centroid for each vector."""
+    half_norms = 0.0 if by_dotproduct else 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch):
+        block = np.asarray(vectors[start:start + batch], dtype=np.float32)
+        out[start:start + batch] = np.argmax(block @ centroids.T - half_norms, axis=1)
+    return out
+
+
+class IVFIndex:
+    def __init__(self, dimension: int, nlist: int | None = None, pq_subvectors: int = 0, seed: int = 0):
+        """nlist=None picks ~2*sqrt(rows) at training time. pq_subvectors=0
+        keeps full vectors (IVF-Flat); otherwise it must divide dimension."""
+        if pq_subvectors and dimension % pq_subvectors:
+            raise ValueError(f"pq_subvectors={pq_subvectors} must divide dimension {dimension}")
+        self.dimension = dimension
+        self.nlist = nlist
+        self.pq_subvectors = pq_subvectors
+        self.seed = seed
+        self.centroids: np.ndarray | None = None
+        self.codebooks: np.ndarray | None = None           # (m, 256, dim / m)
+        self.lists = np.empty(0, dtype=np.int32)            # row -> list number
+        self.codes = np.empty((0, pq_subvectors), dtype=np.uint8)
+        self.trained_rows = 0
+        self._by_list: tuple[np.ndarray, np.ndarray] | None = None
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self) -> int:
+        return len(self.lists)
+
+    def train(self, vectors: np.ndarray):
+        """Fit centroids (and PQ codebooks) to vectors and re-file every row.
+        vectors only needs len() and row indexing that returns float arrays
+        (a memmap, a quantization.VectorFile)."""
+        n = len(vectors)
+        nlist = min(self.nlist or max(1, int(2 * np.sqrt(n))), n)
+        self.centroids = kmeans(vectors, nlist, seed=self.seed, spherical=True)
+        self.codebooks = None
+        if self.pq_subvectors:
+            rng = np.random.default_rng(self.seed + 1)
+            sample = np.sort(rng.choice(n, min(n, PQ_CENTROIDS * KMEANS_SAMPLE_PER_CENTROID), replace=False))
+            residuals = self._residuals(np.asarray(vectors[sample], dtype=np.float32))
+            sub = self.dimension // self.pq_subvectors
+            self.codebooks = np.stack([
+                kmeans(residuals[:, i * sub:(i + 1) * sub], min(PQ_CENTROIDS, len(sample)), seed=self.seed + i)
+                for i in range(self.pq_subvectors)
+            ])
+        self.lists = np.empty(0, dtype=np.int32)
+        self.codes = np.empty((0, self.pq_subvectors), dtype=np.uint8)
+        self.trained_rows = n
+        self.add(vectors)
+
+    def _residuals(self, vectors: np.ndarray, lists: np.ndarray | None = None) -> np.ndarray:
+        if lists is None:
+            lists = nearest(vectors, self.centroids, by_dotproduct=True)
+        return vectors - self.centroids[lists]
+
+    def add(self, vectors: np.ndarray):
+        """File new rows (appended after the existing ones) under their lists."""
+        for start in range(0, len(vectors), ADD_BATCH):
+            self._add(np.asarray(vectors[start:start + ADD_BATCH], dtype=np.float32))
+
+    def _add(self, vectors: np.ndarray):
+        lists = nearest(vectors, self.centroids, by_dotproduct=True)
+        self.lists = np.concatenate([self.lists, lists])
+        self._by_list = None
+        if self.pq_subvectors:
+            residuals = self._residuals(vectors, lists)
+            sub = self.dimension // self.pq_subvectors
+            codes = np.stack([
+                nearest(residuals[:, i * sub:(i + 1) * sub], self.codebooks[i]).astype(np.uint8)
+                for i in range(self.pq_subvectors)
+            ], axis=1)
+            self.codes = np.concatenate([self.codes, codes])
+
+    def keep(self, rows):
+        """Drop every row not in rows (the store compacted its matrix)."""
+        self.lists = self.lists[rows]
+        self._by_list = None
+        if self.pq_subvectors:
+            self.codes = self.codes[rows]
+
+    def _list_rows(self):
+        """Rows sorted by list number and where each list's run starts."""
+        if self._by_list is None:
+            order = np.argsort(self.lists, kind="stable")
+            starts = np.searchsorted(self.lists[order], np.arange(len(self.centroids) + 1))
+            self._by_list = (order, starts)
+        return self._by_list
+
+    def search(self, query: np.ndarray, nprobe: int, limit: int) -> np.ndarray:
+        """Rows filed under the nprobe best centroids for query. With PQ only
+        the `limit` rows with the highest approximate dotproduct are kept;
+        without it every probed row is returned for exact scoring."""
+        query = np.asarray(query, dtype=np.float32)
+        centroid_scores = self.centroids @ query
+        nprobe = min(nprobe, len(self.centroids))
+        probed = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        order, starts = self._list_rows()
+        rows = np.concatenate([order[starts[i]:starts[i + 1]] for i in probed])
+        if not self.pq_subvectors or len(rows) <= limit:
+            return rows
+        sub = self.dimension // self.pq_subvectors
+        # q . x = q . centroid + sum over subvectors of q_i . codeword_i
+        tables = np.einsum("mkd,md->mk", self.codebooks, query.reshape(self.pq_subvectors, sub))
+        approx = centroid_scores[self.lists[rows]] + tables[np.arange(self.pq_subvectors), self.codes[rows]].sum(axis=1)
+        return rows[np.argpartition(-approx, limit - 1)[:limit]]
+
+    def save(self, path: str):
+        arrays = {"lists": self.lists, "codes": self.codes,
+                  "meta": np.array([self.dimension, self.pq_subvectors, self.trained_rows, self.seed])}
+        if self.centroids is not None:
+            arrays["centroids"] = self.centroids
+        if self.codebooks is not None:
+            arrays["codebooks"] = self.codebooks
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str, nlist: int | None = None) -> "IVFIndex":
+        data = np.load(path)
+        dimension, pq_subvectors, trained_rows, seed = (int(x) for x in data["meta"])
+        index = cls(dimension, nlist=nlist, pq_subvectors=pq_subvectors, seed=seed)
+        index.lists = data["lists"]
+        index.codes = data["codes"]
+        index.trained_rows = trained_rows
+        index.centroids = data["centroids"] if "centroids" in data else None
+        index.codebooks = data["codebooks"] if "codebooks" in data else None
+        return index
@@ -0,0 +1,143 @@
+"""
+Benchmark approximate (IVF / IVF-PQ) hybrid retrieval in LocalVectorStore
+against its exact brute-force scan, on a synthetic corpus: clustered
+unit-norm dense vectors plus BM25-like sparse vectors drawn from a Zipf
+vocabulary.
+
+The store is filled the way the indexer fills it: upserts in slices, a
+save() that trains the IVF index on the first part of the corpus, then more
+upserts that are filed incrementally against the trained centroids.
+
+Reports recall@k (overlap with the exact top-k) and p50/p99 query latency
+for each IVF setting, for hybrid queries and for dense-only ones (the chat
+route's fallback). Hybrid rankings are usually decided by the sparse scores,
+which are found exactly through term postings, so dense-only queries are the
+real test of the IVF index.
+
+Usage:
+  uv run python bench-ann.py                        # 20k and 100k vectors, 1536 dims
+  uv run python bench-ann.py --sizes 50000 --dim 512 --nprobe 4 16 64 --pq 0 32
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from vector_store import LocalVectorStore
+
+SLICE = 512          # Upsert batch size, like PIPELINE_SLICE
+VOCAB = 50_000
+DOC_TERMS = 40       # Sparse nonzeros per chunk, about the real average
+QUERY_TERMS = 4
+
+
+def unit(x):
+    return x / np.linalg.norm(x, axis=-1, keepdims=True)
+
+
+def synthetic_corpus(n, dim, spread, seed=0):
+    """Dense vectors scattered around n/100 topic centers, and sparse vectors
+    whose terms lean towards each topic's own slice of the vocabulary."""
+    rng = np.random.default_rng(seed)
+    topics = max(1, n // 100)
+    centers = unit(rng.standard_normal((topics, dim)).astype(np.float32))
+    topic = rng.integers(0, topics, n)
+    dense = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 8192):
+        block = topic[start:start + 8192]
+        noise = rng.standard_normal((len(block), dim)).astype(np.float32) * spread / np.sqrt(dim)
+        dense[start:start + 8192] = unit(centers[block] + noise)
+    common = rng.zipf(1.3, (n, DOC_TERMS // 2)) % VOCAB
+    local = (topic[:, None] * 37 + rng.integers(0, 200, (n, DOC_TERMS // 2))) % VOCAB
+    sparse = []
+    for row in np.concatenate([common, local], axis=1):
+        terms = np.unique(row)
+        sparse.append({"indices": terms.tolist(), "values": rng.uniform(0.3, 1.5, len(terms)).round(4).tolist()})
+    return centers, topic, dense, sparse
+
+
+def queries(centers, topic, sparse, count, spread, seed=1):
+    rng = np.random.default_rng(seed)
+    dim = centers.shape[1]
+    out = []
+    for row in rng.integers(0, len(topic), count):
+        vector = unit(centers[topic[row]] + rng.standard_normal(dim).astype(np.float32) * spread / np.sqrt(dim))
+        terms = rng.choice(sparse[row]["indices"], min(QUERY_TERMS, len(sparse[row]["indices"])), replace=False)
+        out.append((vector, {"indices": sorted(int(t) for t in terms), "values": rng.uniform(1, 6, len(terms)).tolist()}))
+    return out
+
+
+def fill(store, dense, sparse, start, end):
+    for i in range(start, end, SLICE):
+        j = min(i + SLICE, end)
+        store.upsert([{"id": f"c{row}", "values": dense[row], "sparse_values": sparse[row], "metadata": {}}
+                      for row in range(i, j)])
+
+
+def run_queries(store, query_set, top_k, hybrid, **options):
+    results, latencies = [], []
+    for vector, sparse_vector in query_set:
+        start = time.perf_counter()
+        matches = store.query(vector, sparse_vector if hybrid else None, top_k=top_k, **options)
+        latencies.append(time.perf_counter() - start)
+        results.append([m["id"] for m in matches])
+    return results, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark IVF/IVF-PQ hybrid retrieval against brute force")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20_000, 100_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--spread", type=float, default=1.5,
+                        help="Noise around each topic center relative to its length; higher overlaps topics more")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--pq", type=int, nargs="+", default=[0, 96],
+                        help="PQ subvectors to try (0 = IVF-Flat)")
+    parser.add_argument("--train-fraction", type=float, default=0.6,
+                        help="Share of the corpus upserted before the index is trained; the rest is added incrementally")
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.sizes:
+        centers, topic, dense, sparse = synthetic_corpus(n, args.dim, args.spread)
+        query_set = queries(centers, topic, sparse, args.queries, args.spread)
+        trained = int(n * args.train_fraction)
+        for pq in args.pq:
+            with tempfile.TemporaryDirectory() as tmp:
+                store = LocalVectorStore(tmp, args.dim, ann_pq_subvectors=pq, ann_min_rows=min(trained, n))
+                fill(store, dense, sparse, 0, trained)
+                start = time.perf_counter()
+                store.save()
+                train_s = time.perf_counter() - start
+                start = time.perf_counter()
+                fill(store, dense, sparse, trained, n)
+                add_s = time.perf_counter() - start
+                store.save()
+
+                for hybrid in (True, False):
+                    mode = "hybrid" if hybrid else "dense"
+                    exact, exact_ms = run_queries(store, query_set, args.top_k, hybrid, exact=True)
+                    if pq == args.pq[0]:
+                        rows.append((n, mode, "brute force", "-", 1.0,
+                                     np.percentile(exact_ms, 50), np.percentile(exact_ms, 99), "", ""))
+                    for nprobe in args.nprobe:
+                        approx, approx_ms = run_queries(store, query_set, args.top_k, hybrid, nprobe=nprobe)
+                        recall = np.mean([len(set(a) & set(e)) / max(len(e), 1) for a, e in zip(approx, exact)])
+                        name = f"IVF{len(store.ann.centroids)}" + (f",PQ{pq}" if pq else ",Flat")
+                        rows.append((n, mode, name, nprobe, recall, np.percentile(approx_ms, 50),
+                                     np.percentile(approx_ms, 99), f"{train_s:.1f}", f"{add_s:.1f}"))
+
+    rows.sort(key=lambda row: (row[0], row[1] != "hybrid"))
+    print()
+    print(f"{'vectors':>8} {'query':>6} {'index':>16} {'nprobe':>6} {'recall@' + str(args.top_k):>9} "
+          f"{'p50 ms':>7} {'p99 ms':>7} {'train s':>8} {'add s':>6}")
+    for n, mode, name, nprobe, recall, p50, p99, train_s, add_s in rows:
+        print(f"{n:>8} {mode:>6} {name:>16} {nprobe:>6} {recall:>9.3f} {p50:>7.2f} {p99:>7.2f} {train_s:>8} {add_s:>6}")
+
+
+if __name__ == "__main__":
+    main()
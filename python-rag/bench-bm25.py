@@ -0,0 +1,206 @@
+"""
+Benchmark the vectorized SimpleBM25 engine against the original per-document
+loops (fit + encode_document per chunk) on synthetic corpora built from the
+real rag-docs vocabulary, and check that both produce identical output.
+
+With --prune-report it instead fits the real rag-docs chunks under a few
+vocabulary pruning settings and reports exported model sizes (full and
+query-only) and sparse vector density.
+
+With --sparse-report it builds the real index (as bench-retrieval.py does)
+under a few per-document sparse pruning settings (bm25.sparsify) and reports
+nonzeros per vector, sparse upsert payload bytes and BM25-only retrieval
+quality on eval-queries.yaml.
+
+Usage:
+  uv run python bench-bm25.py                     # 10k and 100k chunks
+  uv run python bench-bm25.py --sizes 1000 10000
+  uv run python bench-bm25.py --prune-report
+  uv run python bench-bm25.py --sparse-report
+"""
+
+import argparse
+import importlib
+import json
+import math
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from bm25 import SimpleBM25, tokenize
+
+
+def reference_fit(bm25, corpus):
+    """The original pure-Python fit loop, kept here as the baseline."""
+    bm25.n_docs = len(corpus)
+    total_length = 0
+    for text in corpus:
+        tokens = tokenize(text)
+        total_length += len(tokens)
+        seen = set()
+        for token in tokens:
+            idx = bm25._get_or_create_index(token)
+            if idx not in seen:
+                bm25.doc_freq[idx] = bm25.doc_freq.get(idx, 0) + 1
+                seen.add(idx)
+    bm25.avgdl = total_length / max(bm25.n_docs, 1)
+    for idx, df in bm25.doc_freq.items():
+        bm25.idf[idx] = math.log((bm25.n_docs - df + 0.5) / (df + 0.5) + 1.0)
+    return bm25
+
+
+def synthetic_corpus(n, seed=0):
+    """n chunk-sized texts: words sampled from the real corpus plus a tail of
+    rare synthetic terms, so vocabulary keeps growing like a real corpus."""
+    cp = importlib.import_module("create-pinecone")
+    words = " ".join(chunk.page_content for chunk in cp.chunk_documents(cp.load_text_files())).split()
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(n):
+        length = rng.randint(60, 220)
+        chunk = rng.choices(words, k=length)
+        chunk.extend(f"term{rng.randint(0, n)}" for _ in range(rng.randint(0, 5)))
+        corpus.append(" ".join(chunk))
+    return corpus
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+PRUNE_CONFIGS = [
+    ("none", {}),
+    ("min_df=2", {"min_df": 2}),
+    ("max_df=0.1", {"max_df": 0.1}),
+    ("min_df=2,max_df=0.1", {"min_df": 2, "max_df": 0.1}),
+    ("max_vocab=2000", {"max_vocab": 2000}),
+    ("min_idf=2.0", {"min_idf": 2.0}),
+]
+
+
+def prune_report():
+    """Exported model sizes and sparse vector density on the real chunks per
+    pruning setting. Pruning shrinks the query export the chat route loads;
+    the full model keeps masked terms' statistics for update runs."""
+    cp = importlib.import_module("create-pinecone")
+    corpus = [chunk.page_content for chunk in cp.chunk_documents(cp.load_text_files())]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, options in PRUNE_CONFIGS:
+            bm25 = SimpleBM25().fit(corpus, **options)
+            vectors = bm25.encode_documents(corpus)
+            json_path, query_path = os.path.join(tmp, "model.json"), os.path.join(tmp, "query.json")
+            bm25.save(json_path)
+            bm25.save_query(query_path)
+            nnz = sum(len(v["indices"]) for v in vectors) / max(len(vectors), 1)
+            rows.append((name, len(bm25.idf), os.path.getsize(json_path), os.path.getsize(query_path), nnz))
+
+    _, base_terms, base_json, base_query, base_nnz = rows[0]
+    print()
+    print(f"{len(corpus)} chunks")
+    print(f"{'pruning':>22} {'terms':>7} {'model KB':>9} {'query KB':>9} {'avg nnz':>8} {'query -%':>9} {'nnz -%':>7}")
+    for name, terms, json_bytes, query_bytes, nnz in rows:
+        print(f"{name:>22} {terms:>7} {json_bytes / 1024:>9.1f} {query_bytes / 1024:>9.1f} {nnz:>8.1f} "
+              f"{100 * (1 - query_bytes / base_query):>8.1f}% {100 * (1 - nnz / base_nnz):>6.1f}%")
+
+
+SPARSE_CONFIGS = [
+    ("none", {}),
+    ("max_terms=64", {"max_terms": 64}),
+    ("max_terms=32", {"max_terms": 32}),
+    ("mass=0.9", {"mass": 0.9}),
+    ("mass=0.75", {"mass": 0.75}),
+    ("levels=16", {"levels": 16}),
+    ("levels=8", {"levels": 8}),
+    ("mass=0.9,levels=16", {"mass": 0.9, "levels": 16}),
+]
+
+
+def sparse_report(k=10):
+    """Sparse vector size and BM25-only retrieval quality per per-document
+    pruning setting, on the index bench-retrieval.py builds by default."""
+    cp = importlib.import_module("create-pinecone")
+    bench_retrieval = importlib.import_module("bench-retrieval")
+    query_set = bench_retrieval.load_query_set(bench_retrieval.QUERY_SET)
+    documents = list(cp.stream_documents(processes=1))
+    dimension = cp.EMBED_NATIVE_DIM
+    query_vectors = np.zeros((len(query_set), dimension), dtype=np.float32)
+
+    def embed(texts):
+        return np.zeros((len(texts), dimension), dtype=np.float32)
+
+    rows = []
+    for name, options in SPARSE_CONFIGS:
+        with tempfile.TemporaryDirectory() as tmp:
+            store, bm25 = bench_retrieval.build_index(cp, documents, {"sparse_prune": options}, tmp, embed, dimension)
+            vectors = bm25.encode_documents([meta["text"] for meta in store.metadata], **options)
+            nnz = sum(len(v["indices"]) for v in vectors) / max(len(vectors), 1)
+            # What the sparse part of the upsert records adds to the JSON payload.
+            payload = sum(len(json.dumps(v)) for v in vectors)
+
+            def total_relevant(targets):
+                return sum(bench_retrieval.is_relevant(meta, targets) for meta in store.metadata)
+
+            recall, mrr, ndcg, _ = bench_retrieval.evaluate(store, bm25, query_set, query_vectors, "sparse", k,
+                                                            total_relevant)
+            rows.append((name, nnz, payload, recall, mrr, ndcg))
+
+    _, base_nnz, base_payload, base_recall, *_ = rows[0]
+    print()
+    print(f"{len(vectors)} chunks, BM25-only retrieval on {len(query_set)} labeled queries")
+    print(f"{'sparse pruning':>22} {'avg nnz':>8} {'nnz -%':>7} {'payload KB':>11} {'bytes -%':>9} "
+          f"{f'recall@{k}':>9} {'change':>7} {'MRR':>6} {f'nDCG@{k}':>7}")
+    for name, nnz, payload, recall, mrr, ndcg in rows:
+        print(f"{name:>22} {nnz:>8.1f} {100 * (1 - nnz / base_nnz):>6.1f}% {payload / 1024:>11.1f} "
+              f"{100 * (1 - payload / base_payload):>8.1f}% {recall:>9.3f} {recall - base_recall:>+7.3f} "
+              f"{mrr:>6.3f} {ndcg:>7.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vectorized vs per-document BM25")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--prune-report", action="store_true",
+                        help="Report model size and vector density under vocabulary pruning settings")
+    parser.add_argument("--sparse-report", action="store_true",
+                        help="Report sparse vector size and retrieval quality under per-document pruning settings")
+    args = parser.parse_args()
+
+    if args.prune_report:
+        prune_report()
+        return
+    if args.sparse_report:
+        sparse_report()
+        return
+
+    rows = []
+    for n in args.sizes:
+        corpus = synthetic_corpus(n)
+
+        reference, ref_fit_s = timed(lambda: reference_fit(SimpleBM25(), corpus))
+        ref_vectors, ref_encode_s = timed(lambda: [reference.encode_document(text) for text in corpus])
+
+        vectorized, vec_fit_s = timed(lambda: SimpleBM25().fit(corpus))
+        vec_vectors, vec_encode_s = timed(lambda: vectorized.encode_documents(corpus))
+
+        identical = (
+            vec_vectors == ref_vectors
+            and vectorized.vocab == reference.vocab
+            and vectorized.idf == reference.idf
+        )
+        rows.append((n, ref_fit_s + ref_encode_s, vec_fit_s + vec_encode_s, ref_encode_s, vec_encode_s, identical))
+        del ref_vectors, vec_vectors
+
+    print()
+    print(f"{'chunks':>8} {'loop s':>8} {'vector s':>9} {'speedup':>8} {'encode loop s':>14} {'encode vec s':>13} {'identical':>10}")
+    for n, ref_s, vec_s, ref_enc, vec_enc, identical in rows:
+        print(f"{n:>8} {ref_s:>8.2f} {vec_s:>9.2f} {ref_s / vec_s:>7.1f}x {ref_enc:>14.2f} {vec_enc:>13.2f} {str(identical):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark the chunking stage on a synthetic corpus built from the real
+documents (default 100 MB of text).
+
+  reference  the original chunk_documents: a new splitter per document, all
+             documents and chunks held in lists
+  cached     splitters cached per source_type, still list in / list out
+  streaming  iter_chunks over lazily generated documents, chunks consumed
+             as they are yielded (what create-pinecone.py does now)
+
+Each variant runs in its own process so peak RSS can be compared.
+
+Usage:
+  uv run python bench-chunking.py
+  uv run python bench-chunking.py --megabytes 20
+"""
+
+import argparse
+import importlib
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+VARIANTS = ["reference", "cached", "streaming"]
+
+
+def reference_chunk_documents(cp, documents):
+    """The original chunking loop, kept here as the baseline."""
+    chunks = []
+    for doc in documents:
+        settings = cp.SPLITTER_SETTINGS.get(doc.metadata.get("source_type", "unknown"), cp.DEFAULT_SPLITTER_SETTINGS)
+        splitter = RecursiveCharacterTextSplitter(**settings)
+        chunks.extend(splitter.split_documents([doc]))
+    return chunks
+
+
+def synthetic_documents(cp, megabytes):
+    """Yield copies of the real documents (each made unique with a suffix)
+    until `megabytes` of text has been produced."""
+    base = cp.load_text_files()
+    target = megabytes * 1_000_000
+    produced = i = 0
+    while produced < target:
+        doc = base[i % len(base)]
+        text = f"{doc.page_content}\n\n## Copy {i}\nSynthetic copy {i} of {doc.metadata.get('file_path', '')}."
+        produced += len(text)
+        i += 1
+        yield Document(page_content=text, metadata=dict(doc.metadata))
+
+
+def run_variant(variant, megabytes):
+    cp = importlib.import_module("create-pinecone")
+    start = time.perf_counter()
+    if variant == "streaming":
+        count = text_bytes = 0
+        for chunk in cp.iter_chunks(synthetic_documents(cp, megabytes)):
+            count += 1
+            text_bytes += len(chunk.page_content)
+    else:
+        documents = list(synthetic_documents(cp, megabytes))
+        chunker = cp.chunk_documents if variant == "cached" else lambda docs: reference_chunk_documents(cp, docs)
+        chunks = chunker(documents)
+        count, text_bytes = len(chunks), sum(len(chunk.page_content) for chunk in chunks)
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    return {"chunks": count, "chunk_bytes": text_bytes, "seconds": elapsed, "peak_mb": peak_mb}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunking throughput and memory")
+    parser.add_argument("--megabytes", type=int, default=100, help="Size of the synthetic corpus")
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        # Child process: print the result as the last line of output.
+        print(json.dumps(run_variant(args.variant, args.megabytes)))
+        return
+
+    results = {}
+    for variant in VARIANTS:
+        output = subprocess.run(
+            [sys.executable, __file__, "--variant", variant, "--megabytes", str(args.megabytes)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results[variant] = json.loads(output.strip().splitlines()[-1])
+
+    print()
+    print(f"{args.megabytes} MB synthetic corpus")
+    print(f"{'variant':>10} {'chunks':>9} {'seconds':>8} {'chunks/s':>10} {'MB/s':>6} {'peak RSS MB':>12}")
+    for variant, r in results.items():
+        print(f"{variant:>10} {r['chunks']:>9} {r['seconds']:>8.2f} {r['chunks'] / r['seconds']:>10,.0f} "
+              f"{args.megabytes / r['seconds']:>6.1f} {r['peak_mb']:>12.0f}")
+    same = len({(r["chunks"], r["chunk_bytes"]) for r in results.values()}) == 1
+    print(f"\nSame chunks from every variant: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark the batched embedding engine against a local stub of the OpenAI
+embeddings endpoint (no API key or network needed).
+
+The stub answers POST /v1/embeddings with deterministic vectors after a
+configurable latency, and can inject 429/500 responses to exercise backoff.
+
+Usage:
+  uv run python bench-embeddings.py
+  uv run python bench-embeddings.py --texts 5000 --latency 0.3 --error-rate 0.1 --concurrency 1 4 8
+  uv run python bench-embeddings.py --serve 8765   # just run the stub; point OPENAI_BASE_URL at it
+"""
+
+import argparse
+import hashlib
+import importlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+
+from embedding_engine import BatchedEmbedder
+
+
+def make_stub_handler(dimension, latency, error_rate):
+    class StubEmbeddingsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(latency)
+
+            roll = random.random()
+            if roll < error_rate / 2:
+                self._send(429, {"error": {"message": "Rate limit reached", "type": "requests"}}, {"Retry-After": "0.2"})
+                return
+            if roll < error_rate:
+                self._send(500, {"error": {"message": "Stub server error", "type": "server_error"}})
+                return
+
+            inputs = request.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            dim = request.get("dimensions") or dimension
+            data = []
+            for i, text in enumerate(inputs):
+                seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+                rng = random.Random(seed)
+                data.append({"object": "embedding", "index": i, "embedding": [rng.uniform(-1, 1) for _ in range(dim)]})
+            tokens = sum(max(1, len(text) // 4) for text in inputs)
+            self._send(200, {
+                "object": "list",
+                "data": data,
+                "model": request.get("model", "stub"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+
+    return StubEmbeddingsHandler
+
+
+def start_stub_server(port, dimension, latency, error_rate):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_stub_handler(dimension, latency, error_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def corpus_texts(n):
+    """Real chunk texts from the indexer, repeated (with a suffix so every text
+    is unique) until there are n of them."""
+    cp = importlib.import_module("create-pinecone")
+    chunks = cp.chunk_documents(cp.load_text_files())
+    base = [chunk.page_content for chunk in chunks]
+    return [f"{base[i % len(base)]}\n#{i}" for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BatchedEmbedder against a local stub server")
+    parser.add_argument("--texts", type=int, default=2000, help="Number of texts to embed")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub latency per request (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Fraction of requests answered with 429/500")
+    parser.add_argument("--batch-tokens", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--serve", type=int, metavar="PORT", help="Only run the stub server on PORT")
+    args = parser.parse_args()
+
+    if args.serve:
+        start_stub_server(args.serve, args.dimension, args.latency, args.error_rate)
+        print(f"Stub embeddings server on http://127.0.0.1:{args.serve}/v1 (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            return
+
+    server = start_stub_server(0, args.dimension, args.latency, args.error_rate)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    texts = corpus_texts(args.texts)
+
+    results = []
+    for concurrency in args.concurrency:
+        client = openai.OpenAI(api_key="stub", base_url=base_url, max_retries=0)
+        embedder = BatchedEmbedder(
+            "text-embedding-3-small",
+            max_batch_tokens=args.batch_tokens,
+            max_concurrency=concurrency,
+            base_delay=0.1,
+            client=client,
+        )
+        start = time.perf_counter()
+        vectors = embedder.embed_documents(texts)
+        elapsed = time.perf_counter() - start
+        assert len(vectors) == len(texts) and all(len(v) == args.dimension for v in vectors)
+        latencies = sorted(stat["seconds"] for stat in embedder.batch_stats)
+        results.append({
+            "concurrency": concurrency,
+            "batches": len(embedder.batch_stats),
+            "api_calls": embedder.api_calls,
+            "seconds": elapsed,
+            "texts_per_sec": len(texts) / elapsed,
+            "tokens_per_sec": embedder.total_tokens / elapsed,
+            "p50_batch_s": latencies[len(latencies) // 2],
+            "max_batch_s": latencies[-1],
+        })
+
+    server.shutdown()
+    print()
+    print(f"{'concurrency':>11} {'batches':>8} {'calls':>6} {'wall s':>8} {'texts/s':>9} {'tok/s':>10} {'p50 s':>7} {'max s':>7}")
+    for r in results:
+        print(f"{r['concurrency']:>11} {r['batches']:>8} {r['api_calls']:>6} {r['seconds']:>8.2f} "
+              f"{r['texts_per_sec']:>9.1f} {r['tokens_per_sec']:>10,.0f} {r['p50_batch_s']:>7.2f} {r['max_batch_s']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
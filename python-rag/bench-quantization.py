@@ -0,0 +1,88 @@
+"""
+Benchmark the dense storage codecs of LocalVectorStore (float32, int8,
+binary; see quantization.py) on the synthetic corpus of bench-ann.py.
+
+Every codec gets its own store without an IVF index, filled the same way.
+The reference ranking is the float32 store's exact scan; for each codec the
+report gives the bytes stored and scanned per vector, how closely decoded
+vectors match the originals (mean cosine), recall@k against the reference
+for hybrid and dense-only queries, and p50 query latency. Binary stores are
+run once per --candidates multiplier: the sign scan keeps top_k * candidates
+rows for int8 rescoring, which trades latency for recall.
+
+Usage:
+  uv run python bench-quantization.py                       # 20k and 100k vectors, 1536 dims
+  uv run python bench-quantization.py --sizes 50000 --dim 512 --candidates 10 40
+"""
+
+import argparse
+import importlib
+import tempfile
+
+import numpy as np
+
+from quantization import CODECS, roundtrip
+from vector_store import LocalVectorStore
+
+bench_ann = importlib.import_module("bench-ann")
+
+
+def decode_cosine(dense, codec, sample=2000):
+    """Mean cosine between sampled vectors and what reads back after storing
+    them with codec (binary rescoring reads its int8 copy)."""
+    original = dense[:sample]
+    decoded = roundtrip(original, codec)
+    return float(np.mean(np.sum(original * decoded, axis=1) / np.linalg.norm(decoded, axis=1)))
+
+
+def recall(results, reference):
+    return float(np.mean([len(set(r) & set(e)) / max(len(e), 1) for r, e in zip(results, reference)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quantized dense vector storage against float32")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20_000, 100_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--spread", type=float, default=1.5,
+                        help="Noise around each topic center relative to its length; higher overlaps topics more")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 40],
+                        help="Binary sign-scan candidates kept per requested result")
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.sizes:
+        centers, topic, dense, sparse = bench_ann.synthetic_corpus(n, args.dim, args.spread)
+        query_set = bench_ann.queries(centers, topic, sparse, args.queries, args.spread)
+        reference = {}
+        for codec in CODECS:
+            with tempfile.TemporaryDirectory() as tmp:
+                # No IVF index: every codec is compared on its own full scan (or sign scan).
+                store = LocalVectorStore(tmp, args.dim, ann_min_rows=n + 1, codec=codec)
+                bench_ann.fill(store, dense, sparse, 0, n)
+                store.save()
+                stored, scanned = store.vectors.bytes_per_vector, store.vectors.scan_bytes_per_vector
+                cosine = decode_cosine(dense, codec)
+                settings = args.candidates if codec == "binary" else [None]
+                for candidates in settings:
+                    options = {"candidates": candidates} if candidates else {"exact": True}
+                    name = f"{codec} x{candidates}" if candidates else codec
+                    for hybrid in (True, False):
+                        mode = "hybrid" if hybrid else "dense"
+                        results, ms = bench_ann.run_queries(store, query_set, args.top_k, hybrid, **options)
+                        reference.setdefault(mode, results)
+                        rows.append((n, mode, name, stored, scanned, args.dim * 4 / scanned, cosine,
+                                     recall(results, reference[mode]), np.percentile(ms, 50)))
+
+    rows.sort(key=lambda row: (row[0], row[1] != "hybrid"))
+    print()
+    print(f"{'vectors':>8} {'query':>6} {'codec':>12} {'B/vec':>6} {'scan B':>7} {'scan x':>7} "
+          f"{'cosine':>8} {'recall@' + str(args.top_k):>9} {'p50 ms':>7}")
+    for n, mode, name, stored, scanned, ratio, cosine, hits, p50 in rows:
+        print(f"{n:>8} {mode:>6} {name:>12} {stored:>6} {scanned:>7} {ratio:>7.1f} "
+              f"{cosine:>8.5f} {hits:>9.3f} {p50:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
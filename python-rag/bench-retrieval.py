@@ -0,0 +1,265 @@
+"""
+Evaluate retrieval quality and query-side latency of the Python-built index
+against the labeled queries in eval-queries.yaml.
+
+By default every preset in CONFIGS (chunk sizing, chunk dedup, BM25 pruning,
+per-document sparse pruning)
+is built into a throwaway LocalVectorStore from the real sources and queried
+the way the chat route queries Pinecone (hybrid dotproduct, top 30), so the
+settings can be compared side by side. --existing evaluates an index that
+is already built instead: the live Pinecone index or the --backend local one.
+
+Metrics, averaged over queries:
+  recall@k  share of a query's expected targets hit by at least one top-k chunk
+  MRR       1 / rank of the first relevant chunk (0 if none in the top k)
+  nDCG@k    binary relevance per chunk, normalized by the best possible top k
+plus the latency of SimpleBM25.encode_query per query: cold (tokenizer cache
+cleared before every call) and warm (memoized tokens).
+
+--dimensions builds every config at each embedding width and reports recall
+against the full width of the same config, plus the dense vector storage
+(which is also what dominates upsert bytes). Vectors are embedded once at
+full width and shortened locally (shorten_embeddings), which is what the
+API's `dimensions` parameter does, so comparing widths costs no extra calls.
+
+--mode sparse ranks by BM25 alone and needs no network or API key; dense and
+hybrid embed chunks and queries with the configured OpenAI model, reusing
+the embedding cache (so after the first run only new chunks cost anything).
+
+Usage:
+  uv run python bench-retrieval.py --mode sparse
+  uv run python bench-retrieval.py --configs default tokens bm25-min-df-2 --k 5
+  uv run python bench-retrieval.py --existing local --verbose
+  uv run python bench-retrieval.py --configs default --dimensions 256 512 1024 1536
+"""
+
+import argparse
+import importlib
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import yaml
+
+from bm25 import SimpleBM25, tokenize_query
+from dedup import ChunkDeduplicator, merge_metadata
+from embedding_cache import EmbeddingCache, embed_with_cache
+from embedding_engine import BatchedEmbedder, shorten_embeddings
+from vector_store import LocalVectorStore, PineconeVectorStore
+
+QUERY_SET = "eval-queries.yaml"
+RETRIEVE_TOP_K = 30  # What the chat route asks Pinecone for
+
+CONFIGS = {
+    "default": {},
+    "tokens": {"chunk_sizing": "tokens"},
+    "no-dedup": {"dedup_threshold": None},
+    "bm25-min-df-2": {"bm25_prune": {"min_df": 2}},
+    "bm25-max-df-0.1": {"bm25_prune": {"max_df": 0.1}},
+    "sparse-top-64": {"sparse_prune": {"max_terms": 64}},
+    "sparse-mass-0.9": {"sparse_prune": {"mass": 0.9}},
+    "sparse-levels-16": {"sparse_prune": {"levels": 16}},
+}
+
+
+def load_query_set(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def hits_target(metadata, target):
+    """True if any of the target's alternative field matches hits metadata."""
+    for key, wanted in target.items():
+        wanted = {str(w).lower() for w in (wanted if isinstance(wanted, list) else [wanted])}
+        value = metadata.get(key)
+        values = value if isinstance(value, list) else [value]
+        if any(str(v).lower() in wanted for v in values if v is not None):
+            return True
+    return False
+
+
+def is_relevant(metadata, targets):
+    return any(hits_target(metadata, target) for target in targets)
+
+
+def score_query(matches, targets, k, total_relevant=None):
+    """(recall@k, reciprocal rank, nDCG@k) for one query. total_relevant is
+    the number of relevant chunks in the index (for the ideal DCG); without
+    it the relevant chunks among the retrieved matches are used."""
+    top = [m["metadata"] for m in matches[:k]]
+    recall = sum(any(hits_target(meta, target) for meta in top) for target in targets) / len(targets)
+    relevant = [is_relevant(meta, targets) for meta in top]
+    rr = next((1 / (rank + 1) for rank, rel in enumerate(relevant) if rel), 0.0)
+    if total_relevant is None:
+        total_relevant = sum(is_relevant(m["metadata"], targets) for m in matches)
+    dcg = sum(1 / np.log2(rank + 2) for rank, rel in enumerate(relevant) if rel)
+    ideal = sum(1 / np.log2(rank + 2) for rank in range(min(k, total_relevant)))
+    return recall, rr, dcg / ideal if ideal else 0.0
+
+
+def encode_latency(bm25, queries):
+    """Per-query encode_query latency in microseconds: (cold, warm)."""
+    cold, warm = [], []
+    for query in queries:
+        tokenize_query.cache_clear()
+        start = time.perf_counter()
+        bm25.encode_query(query)
+        cold.append((time.perf_counter() - start) * 1e6)
+        start = time.perf_counter()
+        bm25.encode_query(query)
+        warm.append((time.perf_counter() - start) * 1e6)
+    return cold, warm
+
+
+def percentile(values, p):
+    return float(np.percentile(values, p)) if values else 0.0
+
+
+def build_index(cp, documents, config, directory, embed, dimension):
+    """Chunk, dedup, fit BM25 and upsert documents into a LocalVectorStore
+    the way create-pinecone.py does under config, with embed's vectors
+    shortened to dimension. Returns (store, bm25)."""
+    dedup_threshold = config.get("dedup_threshold", cp.DEDUP_THRESHOLD)
+    dedup = ChunkDeduplicator(dedup_threshold) if dedup_threshold is not None else None
+    kept, duplicates = [], {}
+    for cid, chunk in cp.iter_manifest(cp.iter_chunks(documents, config.get("chunk_sizing", cp.CHUNK_SIZING))):
+        canonical = dedup.check(cid, chunk.page_content) if dedup is not None else None
+        if canonical is not None:
+            duplicates.setdefault(canonical, []).append(chunk.metadata)
+            continue
+        kept.append((cid, chunk))
+
+    texts = [chunk.page_content for _, chunk in kept]
+    bm25 = SimpleBM25(k1=1.2, b=0.75).fit(texts, **config.get("bm25_prune", {}))
+    vectors = shorten_embeddings(embed(texts), dimension)
+    store = LocalVectorStore(directory, dimension)
+    records = []
+    sparse_vectors = bm25.encode_documents(texts, **config.get("sparse_prune", {}))
+    for (cid, chunk), vector, sparse in zip(kept, vectors, sparse_vectors):
+        metadata = merge_metadata(chunk.metadata, duplicates[cid]) if cid in duplicates else dict(chunk.metadata)
+        metadata["text"] = chunk.page_content
+        records.append({"id": cid, "values": vector, "sparse_values": sparse, "metadata": metadata})
+    store.upsert(records)
+    return store, bm25
+
+
+def evaluate(store, bm25, query_set, query_vectors, mode, k, total_relevant=None, verbose=False):
+    """Average metrics over the query set plus per-query search latency (ms)."""
+    recalls, rrs, ndcgs, search_ms = [], [], [], []
+    for item, vector in zip(query_set, query_vectors):
+        sparse = bm25.encode_query(item["query"]) if mode != "dense" else None
+        start = time.perf_counter()
+        matches = store.query(vector, sparse, top_k=max(k, RETRIEVE_TOP_K))
+        search_ms.append((time.perf_counter() - start) * 1000)
+        relevant = total_relevant(item["expect"]) if total_relevant else None
+        recall, rr, ndcg = score_query(matches, item["expect"], k, relevant)
+        recalls.append(recall)
+        rrs.append(rr)
+        ndcgs.append(ndcg)
+        if verbose:
+            first = round(1 / rr) if rr else "-"
+            print(f"  recall {recall:.2f}  first hit {first!s:>2}  {item['query']}")
+    return statistics.mean(recalls), statistics.mean(rrs), statistics.mean(ndcgs), search_ms
+
+
+def main():
+    cp = importlib.import_module("create-pinecone")
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and query latency on labeled queries")
+    parser.add_argument("--queries", default=QUERY_SET, help=f"Labeled query set (default: {QUERY_SET})")
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=list(CONFIGS),
+                        help="Index settings to build and compare")
+    parser.add_argument("--existing", choices=["pinecone", "local"],
+                        help="Evaluate an already built index instead of building the configs")
+    parser.add_argument("--mode", choices=["sparse", "dense", "hybrid"],
+                        help="Scores to rank by (default: hybrid with OPENAI_API_KEY set, else sparse)")
+    parser.add_argument("--dimensions", type=int, nargs="+", choices=cp.EMBED_DIM_CHOICES,
+                        help=f"Embedding widths to compare (default: {cp.EMBED_DIM})")
+    parser.add_argument("--k", type=int, default=10, help="Cutoff for recall@k and nDCG@k")
+    parser.add_argument("--verbose", action="store_true", help="Print per-query recall and first relevant rank")
+    args = parser.parse_args()
+
+    mode = args.mode or ("hybrid" if os.environ.get("OPENAI_API_KEY") else "sparse")
+    dimensions = args.dimensions or [cp.EMBED_DIM]
+    if mode == "sparse" and args.dimensions:
+        print("Note: --mode sparse ignores the dense vectors, so every width scores the same")
+    query_set = load_query_set(args.queries)
+    queries = [item["query"] for item in query_set]
+
+    # Everything is embedded at full width and shortened per index.
+    embedder = cache = None
+    if mode != "sparse":
+        embedder = BatchedEmbedder(cp.EMBED_MODEL, max_batch_tokens=cp.EMBED_BATCH_TOKENS)
+        cache = EmbeddingCache(cp.EMBED_CACHE_DIR, cp.EMBED_MODEL, cp.EMBED_NATIVE_DIM, cp.EMBED_CACHE_MAX_ENTRIES)
+        query_vectors = np.asarray(embed_with_cache(queries, embedder, cache), dtype=np.float32)
+    else:
+        query_vectors = np.zeros((len(queries), cp.EMBED_NATIVE_DIM), dtype=np.float32)
+
+    def embed(texts):
+        if mode == "sparse":
+            return np.zeros((len(texts), cp.EMBED_NATIVE_DIM), dtype=np.float32)
+        return embed_with_cache(texts, embedder, cache)
+
+    print(f"{len(query_set)} labeled queries, {mode} retrieval, k={args.k}")
+    rows = []
+    if args.existing:
+        # Query the namespace the index pointer marks as live.
+        if args.existing == "pinecone":
+            pointer = cp.load_index_pointer()
+            dimension = pointer.get("dimension", cp.EMBED_NATIVE_DIM)
+            store = PineconeVectorStore(cp.PINECONE_API_KEY, cp.pinecone_index_name(dimension), dimension,
+                                        namespace=pointer["namespace"])
+            bm25 = SimpleBM25.load(cp.BM25_MODEL_PATH)
+        else:
+            pointer = cp.load_index_pointer(os.path.join(cp.LOCAL_INDEX_DIR, "rag-index.json"))
+            dimension = pointer.get("dimension", cp.EMBED_NATIVE_DIM)
+            store = LocalVectorStore(cp.LOCAL_INDEX_DIR, dimension, namespace=pointer["namespace"])
+            bm25 = SimpleBM25.load(os.path.join(cp.LOCAL_INDEX_DIR, "bm25-model.json"))
+        total_relevant = None
+        if isinstance(store, LocalVectorStore):
+            def total_relevant(targets):
+                return sum(meta is not None and is_relevant(meta, targets) for meta in store.metadata)
+        metrics = evaluate(store, bm25, query_set, shorten_embeddings(query_vectors, dimension), mode, args.k,
+                           total_relevant, args.verbose)
+        rows.append((args.existing, dimension, store.count(), len(bm25.idf), *metrics,
+                     *encode_latency(bm25, queries)))
+    else:
+        documents = list(cp.stream_documents(processes=1))
+        for name in args.configs:
+            for dimension in dimensions:
+                with tempfile.TemporaryDirectory() as tmp:
+                    store, bm25 = build_index(cp, documents, CONFIGS[name], tmp, embed, dimension)
+
+                    def total_relevant(targets):
+                        return sum(is_relevant(meta, targets) for meta in store.metadata)
+
+                    if args.verbose:
+                        print(f"\n{name} @ {dimension}:")
+                    metrics = evaluate(store, bm25, query_set, shorten_embeddings(query_vectors, dimension), mode,
+                                       args.k, total_relevant, args.verbose)
+                    rows.append((name, dimension, len(store), len(bm25.idf), *metrics,
+                                 *encode_latency(bm25, queries)))
+
+    if cache is not None:
+        cache.save()
+
+    # Recall change against the same index at full width, when it was built.
+    full_recall = {name: recall for name, dimension, _, _, recall, *_ in rows if dimension == cp.EMBED_NATIVE_DIM}
+
+    k = args.k
+    print()
+    print(f"{'index':>16} {'dim':>5} {'dense MB':>8} {'chunks':>7} {'terms':>6} {f'recall@{k}':>9} "
+          f"{f'vs {cp.EMBED_NATIVE_DIM}':>8} {'MRR':>6} {f'nDCG@{k}':>7} "
+          f"{'search p50 ms':>13} {'encode p50/p99 us cold':>22} {'warm':>11}")
+    for name, dimension, chunks, terms, recall, mrr, ndcg, search_ms, cold, warm in rows:
+        delta = f"{recall - full_recall[name]:+.3f}" if name in full_recall else "-"
+        print(f"{name:>16} {dimension:>5} {chunks * dimension * 4 / 1e6:>8.2f} {chunks:>7} {terms:>6} "
+              f"{recall:>9.3f} {delta:>8} {mrr:>6.3f} {ndcg:>7.3f} "
+              f"{percentile(search_ms, 50):>13.2f} "
+              f"{f'{percentile(cold, 50):.1f} / {percentile(cold, 99):.1f}':>22} "
+              f"{f'{percentile(warm, 50):.1f} / {percentile(warm, 99):.1f}':>11}")
+
+
+if __name__ == "__main__":
+    main()
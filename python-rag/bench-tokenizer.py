@@ -0,0 +1,108 @@
+"""
+Microbenchmarks for the BM25 tokenizer on the real rag-docs corpus: the
+original re.sub + split implementation, the compiled findall fast path and
+the memoized query path. Also checks that every variant produces exactly
+the same token streams.
+
+Usage:
+  uv run python bench-tokenizer.py
+  uv run python bench-tokenizer.py --repeat 20 --queries 5000
+"""
+
+import argparse
+import importlib
+import random
+import re
+import time
+
+from bm25 import STOPWORDS, tokenize, tokenize_query
+
+
+def reference_tokenize(text):
+    """The original tokenizer, kept here as the baseline."""
+    text = text.lower()
+    text = re.sub(r"[^a-z0-9\s]", " ", text)
+    tokens = text.split()
+    return [t for t in tokens if len(t) > 1 and t not in STOPWORDS]
+
+
+EDGE_CASES = [
+    "",
+    "   ",
+    "C++ / C# & F#: don't-stop_believing!",
+    "naïve café résumé — über straße",
+    "İstanbul KELVIN K sign",
+    "tabs\tand\nnewlines\r\nand nbsp em sep",
+    "x y z a1 b2 42 3.14 v2.0.1 e-mail foo@bar.com",
+    "zero\u200bwidth \x1cfile\x1dsep \x85nel \u2028line",
+    "emoji 🚀 rocket ✨ sparkles",
+]
+
+
+def random_unicode(n, seed=0):
+    """Random strings mixing ASCII with arbitrary BMP characters."""
+    rng = random.Random(seed)
+    alphabet = "abcXYZ019 _-.\t\n"
+    return [
+        "".join(rng.choice(alphabet) if rng.random() < 0.7 else chr(rng.randint(0x80, 0xFFFF))
+                for _ in range(rng.randint(0, 40)))
+        for _ in range(n)
+    ]
+
+
+def sample_queries(corpus, n, seed=0):
+    """Query-sized snippets drawn from the corpus, with repeats like real traffic."""
+    rng = random.Random(seed)
+    words = " ".join(corpus).split()
+    distinct = [" ".join(rng.choices(words, k=rng.randint(3, 12))) for _ in range(max(n // 10, 1))]
+    return [rng.choice(distinct) for _ in range(n)]
+
+
+def throughput(fn, texts, repeat):
+    start = time.perf_counter()
+    tokens = 0
+    for _ in range(repeat):
+        for text in texts:
+            tokens += len(fn(text))
+    elapsed = time.perf_counter() - start
+    return tokens / elapsed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the BM25 tokenizer")
+    parser.add_argument("--repeat", type=int, default=10, help="Passes over the corpus per variant")
+    parser.add_argument("--queries", type=int, default=20_000, help="Number of sampled queries")
+    args = parser.parse_args()
+
+    cp = importlib.import_module("create-pinecone")
+    corpus = [chunk.page_content for chunk in cp.chunk_documents(cp.load_text_files())]
+    queries = sample_queries(corpus, args.queries)
+
+    mismatches = [
+        text for text in corpus + queries + EDGE_CASES + random_unicode(5000)
+        if not (reference_tokenize(text) == tokenize(text) == list(tokenize_query(text)))
+    ]
+
+    tokenize_query.cache_clear()
+    rows = [
+        ("reference (chunks)",) + throughput(reference_tokenize, corpus, args.repeat),
+        ("translate (chunks)",) + throughput(tokenize, corpus, args.repeat),
+        ("reference (queries)",) + throughput(reference_tokenize, queries, 1),
+        ("translate (queries)",) + throughput(tokenize, queries, 1),
+        ("memoized (queries)",) + throughput(tokenize_query, queries, 1),
+    ]
+    info = tokenize_query.cache_info()
+
+    print()
+    print(f"{len(corpus)} chunks x {args.repeat}, {len(queries)} queries "
+          f"(cache: {info.hits} hits, {info.misses} misses)")
+    print(f"{'variant':>20} {'tokens/s':>12} {'seconds':>8}")
+    for name, rate, elapsed in rows:
+        print(f"{name:>20} {rate:>12,.0f} {elapsed:>8.3f}")
+    print(f"\nIdentical token streams: {not mismatches}")
+    for text in mismatches[:5]:
+        print(f"  mismatch: {text[:80]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,47 @@
 Simple BM25 encoder for hybrid search with Pinecone.
 Designed to produce sparse vectors compatible with Pinecone,
 with a model export format that can be loaded in TypeScript.
+
+save_query writes just the vocab and IDF that query encoding needs, which
+is all the chat route loads. Models can also be exported to a compact binary format (save_binary) that
+load() memory-maps, looking terms up without building Python dicts:
+
+  magic "BM25BIN\\0" | u32 version | u32 header length | JSON header
+  (k1, b, avgdl, n_docs, total_length, n_terms, index_size), padded to 4 bytes, then:
+  u32[n_terms + 1]  byte offsets of each term in the blob (terms sorted by UTF-8 bytes)
+  u32[n_terms]      term index of each sorted term
+  f64[index_size]   IDF aligned to term index (0 = no IDF), padded to 8 bytes
+                    (f32 and unpadded before version 3)
+  u32[index_size]   document frequency aligned to term index (version 2+)
+  bytes             the concatenated sorted terms
+
+All numbers are little-endian. The IDF is stored at full precision, so a
+binary model encodes exactly what the JSON one does.
+
+Both formats keep the raw document frequencies and total token length, so a
+loaded model can be updated in place with add_documents/remove_documents
+instead of being refitted on the whole corpus. Vocabulary pruning only masks
+terms (they get no IDF, so they are never emitted); their raw counts are kept
+and updated like any other, so online statistics match a full refit. The
+JSON model lists the masked terms under "pruned"; in the binary one they are
+the terms with a document frequency but no IDF.
+
+Document vectors can also be thinned per document at encode time (see
+sparsify): keep a vector's top-N terms, or the fewest terms that carry a
+share of its BM25 mass, and quantize the values to a few levels. Unlike
+vocabulary pruning this leaves the model alone, so queries are unaffected.
 """
 
 import json
 import math
+import mmap
 import re
+import struct
 from collections import Counter
+from collections.abc import Mapping
+from functools import lru_cache
+
+import numpy as np
 
 # Common English stopwords
 STOPWORDS = {
@@ -23,12 +58,157 @@ STOPWORDS = {
 }
 
 
+# The tokenizer below must split text exactly like
+#   re.sub(r"[^a-z0-9\s]", " ", text.lower()).split()
+# (the TypeScript encoder in the chat route does the same). Tokens are the
+# maximal runs of [a-z0-9]; every other character, whitespace or not, only
+# separates them. So the lowered text can be encoded to ASCII with any
+# non-ASCII character replaced by "?", then run through a byte translate
+# table that maps everything except [a-z0-9] and whitespace to a space.
+_NON_TOKEN_CHAR = re.compile(r"[^a-z0-9\s]")
+_TOKEN_BYTES = bytes(32 if _NON_TOKEN_CHAR.match(chr(c)) else c for c in range(128)) + b" " * 128
+# Stopwords plus every single-character token, so filtering is one set lookup
+_DROPPED_TOKENS = frozenset(STOPWORDS) | frozenset("abcdefghijklmnopqrstuvwxyz0123456789")
+QUERY_TOKEN_CACHE_SIZE = 4096
+QUANTIZED_DECIMALS = 4  # Quantized values are multiples of a coarser step; fewer digits to upload
+
+
 def tokenize(text: str) -> list[str]:
     """Simple tokenizer: lowercase, remove non-alphanumeric, split, remove stopwords and short tokens."""
-    text = text.lower()
-    text = re.sub(r"[^a-z0-9\s]", " ", text)
-    tokens = text.split()
-    return [t for t in tokens if len(t) > 1 and t not in STOPWORDS]
+    ascii_text = text.lower().encode("ascii", "replace").translate(_TOKEN_BYTES).decode("ascii")
+    return [t for t in ascii_text.split() if t not in _DROPPED_TOKENS]
+
+
+@lru_cache(maxsize=QUERY_TOKEN_CACHE_SIZE)
+def tokenize_query(text: str) -> tuple[str, ...]:
+    """Memoized tokenize for short, frequently repeated strings such as queries."""
+    return tuple(tokenize(text))
+
+
+BINARY_MAGIC = b"BM25BIN\0"
+BINARY_VERSION = 3
+
+
+def _align4(n: int) -> int:
+    return (n + 3) & ~3
+
+
+def _align8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class MappedVocab(Mapping):
+    """Read-only token -> index mapping backed by the sorted term blob of a
+    memory-mapped binary model. Lookups binary-search the blob."""
+
+    def __init__(self, blob: memoryview, offsets: np.ndarray, indices: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+        self._indices = indices
+
+    def _term(self, i: int) -> bytes:
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+    def __getitem__(self, token: str) -> int:
+        key = token.encode("utf-8")
+        lo, hi = 0, len(self._indices)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._indices) and self._term(lo) == key:
+            return int(self._indices[lo])
+        raise KeyError(token)
+
+    def __iter__(self):
+        for i in range(len(self._indices)):
+            yield self._term(i).decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+
+class MappedArray(Mapping):
+    """Read-only index -> value mapping over a numeric array (IDF or document
+    frequency) of a memory-mapped binary model. Zero values are treated as absent."""
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        self._len: int | None = None
+
+    def __getitem__(self, idx: int) -> float:
+        if 0 <= idx < len(self.values):
+            value = self.values[idx].item()
+            if value > 0:
+                return value
+        raise KeyError(idx)
+
+    def __iter__(self):
+        return iter(np.flatnonzero(self.values > 0).tolist())
+
+    def __len__(self) -> int:
+        if self._len is None:
+            self._len = int(np.count_nonzero(self.values > 0))
+        return self._len
+
+
+def _round6(values: np.ndarray) -> np.ndarray:
+    """Vectorized round(value, 6) with Python's exact semantics.
+
+    rint(x * 1e6) / 1e6 is exact except when x * 1e6 lands within floating
+    point error of a .5 tie; those few values go through round() itself.
+    """
+    scaled = values * 1e6
+    rounded = np.rint(scaled) / 1e6
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        positions = np.flatnonzero(near_tie)
+        rounded[positions] = [round(value, 6) for value in values[positions].tolist()]
+    return rounded
+
+
+def sparsify(vector: dict, max_terms: int | None = None, mass: float = 1.0, levels: int = 0) -> dict:
+    """Per-document pruning of an encoded sparse vector.
+
+    max_terms  - keep only the N highest-scoring terms
+    mass       - keep the fewest highest-scoring terms whose values add up to
+                 at least this fraction (0-1) of the vector's total
+    levels     - quantize the kept values to multiples of (largest value /
+                 levels), never below one step, so only `levels` distinct
+                 values remain
+    Kept terms stay in their original order. With the defaults the vector
+    is returned unchanged.
+    """
+    if max_terms is None and mass >= 1.0 and not levels:
+        return vector
+    values = np.asarray(vector["values"], dtype=np.float64)
+    if not len(values):
+        return vector
+    order = np.argsort(-values, kind="stable")
+    keep = len(values) if max_terms is None else min(len(values), max_terms)
+    if mass < 1.0:
+        cumulative = np.cumsum(values[order])
+        keep = min(keep, int(np.searchsorted(cumulative, mass * cumulative[-1])) + 1)
+    kept = np.sort(order[:keep])
+    values = values[kept]
+    if levels:
+        step = values.max() / levels
+        values = np.round(np.maximum(np.rint(values / step), 1) * step, QUANTIZED_DECIMALS)
+    return {"indices": np.asarray(vector["indices"])[kept].tolist(), "values": values.tolist()}
+
+
+def _take_rows(matrix: tuple, rows: list[int]) -> tuple:
+    """Select rows (in the given order) from a CSR matrix built by _count_matrix."""
+    indptr, term_ids, counts, lengths = matrix
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = indptr[rows]
+    sizes = indptr[rows + 1] - starts
+    new_indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=new_indptr[1:])
+    positions = np.arange(new_indptr[-1]) - np.repeat(new_indptr[:-1] - starts, sizes)
+    return new_indptr, term_ids[positions], counts[positions], lengths[rows]
 
 
 class SimpleBM25:
@@ -40,7 +220,12 @@ class SimpleBM25:
         self.idf: dict[int, float] = {}        # index -> IDF score
         self.avgdl: float = 0.0
         self.n_docs: int = 0
+        self.total_length: int = 0             # tokens across all docs (avgdl = total_length / n_docs)
+        self.pruned: set[int] = set()          # indices masked by prune(); counted, never scored
         self._next_index: int = 0
+        # Term-count matrix of the fitted corpus, reused by encode_documents
+        self._fitted: tuple | None = None
+        self._fitted_rows: dict[str, int] = {}
 
     def _get_or_create_index(self, token: str) -> int:
         if token not in self.vocab:
@@ -48,33 +233,281 @@ class SimpleBM25:
             self._next_index += 1
         return self.vocab[token]
 
-    def fit(self, corpus: list[str]) -> "SimpleBM25":
-        """Fit BM25 on a list of document strings."""
+    def _count_matrix(self, token_lists: list[list[str]], grow_vocab: bool) -> tuple:
+        """Build a CSR term-count matrix for tokenized documents.
+
+        Returns (indptr, term_ids, counts, lengths): row i's terms are
+        term_ids[indptr[i]:indptr[i + 1]] in order of first occurrence (the
+        order encode_document emits them), lengths[i] is the document's total
+        token count including out-of-vocabulary tokens. With grow_vocab=False,
+        tokens that aren't in the vocab are dropped.
+        """
+        n = len(token_lists)
+        lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=n)
+        vocab = self.vocab
+        if grow_vocab:
+            next_index = self._next_index
+            for tokens in token_lists:
+                for token in tokens:
+                    if token not in vocab:
+                        vocab[token] = next_index
+                        next_index += 1
+            self._next_index = next_index
+            ids = [vocab[token] for tokens in token_lists for token in tokens]
+        else:
+            ids = [vocab[token] if token in vocab else -1 for tokens in token_lists for token in tokens]
+        term_ids = np.array(ids, dtype=np.int64)
+        doc_ids = np.repeat(np.arange(n, dtype=np.int64), lengths)
+        if not grow_vocab:
+            known = term_ids >= 0
+            term_ids, doc_ids = term_ids[known], doc_ids[known]
+
+        width = int(term_ids.max()) + 1 if term_ids.size else 1
+        keys, first, counts = np.unique(doc_ids * width + term_ids, return_index=True, return_counts=True)
+        # Positions increase with (doc, position in doc), so sorting the unique
+        # (doc, term) pairs by first position gives doc order, then first occurrence.
+        order = np.argsort(first, kind="stable")
+        keys, counts = keys[order], counts[order]
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // width, minlength=n), out=indptr[1:])
+        return indptr, keys % width, counts, lengths
+
+    def fit(
+        self,
+        corpus: list[str],
+        base_model: "SimpleBM25 | None" = None,
+        min_df: int = 1,
+        max_df: float = 1.0,
+        max_vocab: int | None = None,
+        min_idf: float = 0.0,
+    ) -> "SimpleBM25":
+        """Fit BM25 on a list of document strings.
+
+        Each document is tokenized once into a CSR term-count matrix; document
+        frequencies come from that matrix in one pass. The matrix is kept so
+        encode_documents() doesn't re-tokenize texts that were part of the fit.
+
+        If base_model is given (e.g. the previously exported model), its term
+        indices are kept and new terms are appended after them, so sparse
+        vectors already stored in Pinecone stay valid.
+
+        Pruning options drop terms from the vocabulary after counting:
+          min_df     - keep terms that appear in at least this many documents
+          max_df     - drop terms that appear in more than this fraction of documents
+          max_vocab  - keep only the N terms with the highest document frequency
+          min_idf    - drop terms whose IDF is below this floor
+        Pruned terms are never emitted in sparse vectors; indices of the
+        remaining terms don't change. See prune().
+        """
+        if base_model is not None:
+            self.inherit_vocab(base_model)
+        corpus = list(corpus)
         self.n_docs = len(corpus)
-        total_length = 0
-
-        # Count document frequencies
-        for text in corpus:
-            tokens = tokenize(text)
-            total_length += len(tokens)
-            seen = set()
-            for token in tokens:
-                idx = self._get_or_create_index(token)
-                if idx not in seen:
-                    self.doc_freq[idx] = self.doc_freq.get(idx, 0) + 1
-                    seen.add(idx)
-
-        self.avgdl = total_length / max(self.n_docs, 1)
-
-        # Compute IDF for each term
-        for idx, df in self.doc_freq.items():
-            self.idf[idx] = math.log((self.n_docs - df + 0.5) / (df + 0.5) + 1.0)
-
-        print(f"  BM25 fitted: {len(self.vocab)} terms, {self.n_docs} docs, avgdl={self.avgdl:.1f}")
+
+        indptr, term_ids, counts, lengths = self._count_matrix([tokenize(text) for text in corpus], grow_vocab=True)
+        self._fitted = (indptr, term_ids, counts, lengths)
+        self._fitted_rows = {text: i for i, text in enumerate(corpus)}
+
+        self.total_length = int(lengths.sum())
+        self.avgdl = self.total_length / max(self.n_docs, 1)
+
+        # Document frequency = number of (doc, term) pairs per term. Terms are
+        # recorded in order of first appearance, as the per-token loop did.
+        df = np.bincount(term_ids, minlength=self._next_index)
+        seen_terms, first_seen = np.unique(term_ids, return_index=True)
+        for idx in seen_terms[np.argsort(first_seen, kind="stable")].tolist():
+            self.doc_freq[idx] = self.doc_freq.get(idx, 0) + int(df[idx])
+
+        self._compute_idf()
+        pruned = self.prune(min_df, max_df, max_vocab, min_idf)
+        pruned_note = f", {pruned} pruned" if pruned else ""
+        print(f"  BM25 fitted: {len(self.idf)} terms{pruned_note}, {self.n_docs} docs, avgdl={self.avgdl:.1f}")
         return self
 
-    def encode_document(self, text: str) -> dict:
-        """Encode a document into a sparse vector using BM25 TF-IDF scoring."""
+    def inherit_vocab(self, base_model: "SimpleBM25"):
+        """Reuse base_model's term indices (and never reuse ones it retired),
+        so vectors encoded with it stay valid. Statistics are not copied."""
+        if base_model.vocab:
+            self.vocab = dict(base_model.vocab)
+            self._next_index = max(base_model._next_index, max(self.vocab.values()) + 1)
+
+    def _raw_idf(self, df: int) -> float:
+        # math.log, not np.log, so values match the TypeScript encoder bit for bit
+        return math.log((self.n_docs - df + 0.5) / (df + 0.5) + 1.0)
+
+    def _compute_idf(self):
+        self.idf = {idx: self._raw_idf(df) for idx, df in self.doc_freq.items() if idx not in self.pruned}
+
+    def _materialize(self):
+        """Swap memory-mapped tables for dicts so the model can be updated."""
+        if isinstance(self.idf, MappedArray):
+            self.vocab = dict(self.vocab)
+            self.doc_freq = dict(self.doc_freq)
+            self.idf = dict(self.idf)
+
+    def footprints(self, texts: list[str]) -> list[list]:
+        """[token count, sorted term indices] per text: what remove_documents
+        needs to take a document back out of the statistics without its text."""
+        fitted_rows = self._fitted_rows
+        if self._fitted is not None and all(text in fitted_rows for text in texts):
+            matrix = _take_rows(self._fitted, [fitted_rows[text] for text in texts])
+        else:
+            matrix = self._count_matrix([tokenize(text) for text in texts], grow_vocab=False)
+        indptr, term_ids, _, lengths = matrix
+        bounds, ids, lengths = indptr.tolist(), term_ids.tolist(), lengths.tolist()
+        return [[lengths[i], sorted(ids[bounds[i]:bounds[i + 1]])] for i in range(len(texts))]
+
+    def add_documents(self, texts: list[str]) -> list[list]:
+        """Add documents to the corpus statistics in O(new documents).
+
+        New terms are appended to the vocabulary; existing indices never
+        change. IDF is recomputed from the updated document frequencies.
+        Returns the documents' footprints (see footprints()).
+        """
+        self._materialize()
+        texts = list(texts)
+        indptr, term_ids, counts, lengths = self._count_matrix([tokenize(text) for text in texts], grow_vocab=True)
+        self._fitted = (indptr, term_ids, counts, lengths)
+        self._fitted_rows = {text: i for i, text in enumerate(texts)}
+
+        df = np.bincount(term_ids, minlength=self._next_index)
+        for idx in np.flatnonzero(df).tolist():
+            self.doc_freq[idx] = self.doc_freq.get(idx, 0) + int(df[idx])
+        self.n_docs += len(texts)
+        self.total_length += int(lengths.sum())
+        self.avgdl = self.total_length / max(self.n_docs, 1)
+        self._compute_idf()
+        return self.footprints(texts)
+
+    def remove_documents(self, texts: list[str] | None = None, footprints: list[list] | None = None):
+        """Remove documents from the corpus statistics in O(removed documents).
+
+        Pass the removed texts, or their footprints when the text is gone.
+        Terms whose document frequency drops to zero lose their IDF but keep
+        their index, so it is never handed to a different term.
+        """
+        self._materialize()
+        if footprints is None:
+            footprints = self.footprints(texts or [])
+        for length, term_ids in footprints:
+            self.total_length -= length
+            for idx in term_ids:
+                df = self.doc_freq.get(idx, 0) - 1
+                if df > 0:
+                    self.doc_freq[idx] = df
+                else:
+                    self.doc_freq.pop(idx, None)
+        self.n_docs = max(self.n_docs - len(footprints), 0)
+        self.total_length = max(self.total_length, 0)
+        self.avgdl = self.total_length / max(self.n_docs, 1)
+        self._compute_idf()
+
+    def stats_snapshot(self) -> dict:
+        """Corpus statistics to compare against later with drift()."""
+        return {
+            "n_docs": self.n_docs,
+            "avgdl": self.avgdl,
+            # Masked terms are in no stored vector, so their weights can't drift.
+            "doc_freq": {str(idx): df for idx, df in self.doc_freq.items() if idx not in self.pruned},
+        }
+
+    def drift(self, snapshot: dict) -> float:
+        """How far stored sparse vectors encoded under `snapshot` are from what
+        this model would produce now.
+
+        Returns the document-frequency-weighted mean relative change of the
+        per-term weights (IDF times the avgdl-dependent length normalization)
+        over the snapshot's terms. 0.05 means stored values are ~5% off on
+        average; terms gone from the corpus count as fully changed.
+        """
+        old_n, old_avgdl = snapshot["n_docs"], snapshot["avgdl"]
+        if not old_n or not self.n_docs:
+            return 0.0 if old_n == self.n_docs else 1.0
+        # Length normalization for an average-length document, at the old
+        # and new avgdl: the TF part of the score at tf=1.
+        length_ratio = (1 + self.k1 * (1 - self.b + self.b * old_avgdl / self.avgdl)) / (1 + self.k1)
+
+        weighted, total = 0.0, 0
+        for key, old_df in snapshot["doc_freq"].items():
+            old_idf = math.log((old_n - old_df + 0.5) / (old_df + 0.5) + 1.0)
+            new_idf = self.idf.get(int(key), 0.0)
+            weighted += old_df * abs(new_idf / length_ratio / old_idf - 1) if old_idf > 0 else 0.0
+            total += old_df
+        return weighted / total if total else 0.0
+
+    def prune(self, min_df: int = 1, max_df: float = 1.0, max_vocab: int | None = None, min_idf: float = 0.0) -> int:
+        """Mask the terms that fail the pruning options (see fit). Returns how
+        many are masked.
+
+        The mask is recomputed from the raw statistics on every call, so a
+        term comes back (under its old index) once it passes again, and
+        calling with the defaults lifts it. Masked terms stay in the
+        vocabulary and document frequencies; they only lose their IDF.
+        """
+        self._materialize()
+        max_df_count = max_df * self.n_docs
+        keep = {
+            idx for idx, df in self.doc_freq.items()
+            if min_df <= df <= max_df_count and self._raw_idf(df) >= min_idf
+        }
+        if max_vocab is not None and len(keep) > max_vocab:
+            keep = set(sorted(keep, key=lambda idx: (-self.doc_freq[idx], idx))[:max_vocab])
+
+        self.pruned = {idx for idx in self.doc_freq if idx not in keep}
+        self._compute_idf()
+        return len(self.pruned)
+
+    def _score_rows(self, term_ids: np.ndarray, counts: np.ndarray, doc_lens: np.ndarray) -> np.ndarray:
+        """Vectorized BM25 TF saturation * IDF. Same operation order as
+        encode_document, so float64 results are identical."""
+        idf_table = np.zeros(max(self._next_index, 1), dtype=np.float64)
+        if isinstance(self.idf, MappedArray):
+            idf_table[:len(self.idf.values)] = self.idf.values
+        elif self.idf:
+            idf_table[np.fromiter(self.idf.keys(), dtype=np.int64)] = np.fromiter(self.idf.values(), dtype=np.float64)
+        tf = counts.astype(np.float64)
+        tf_score = (tf * (self.k1 + 1)) / (tf + self.k1 * (1 - self.b + self.b * doc_lens.astype(np.float64) / self.avgdl))
+        return idf_table[term_ids] * tf_score
+
+    def encode_documents(self, texts: list[str], **sparse_options) -> list[dict]:
+        """Encode many documents at once. Output is identical to calling
+        encode_document on each text, but scoring is vectorized and texts that
+        were part of the fit reuse its term counts instead of being
+        re-tokenized. sparse_options (max_terms, mass, levels) prune each
+        vector, see sparsify."""
+        fitted_rows = self._fitted_rows
+        fitted_pos = [i for i, text in enumerate(texts) if text in fitted_rows]
+        fresh_pos = [i for i, text in enumerate(texts) if text not in fitted_rows]
+
+        results: list[dict | None] = [None] * len(texts)
+        if fitted_pos:
+            matrix = _take_rows(self._fitted, [fitted_rows[texts[i]] for i in fitted_pos])
+            self._emit_rows(matrix, fitted_pos, results)
+        if fresh_pos:
+            matrix = self._count_matrix([tokenize(texts[i]) for i in fresh_pos], grow_vocab=False)
+            self._emit_rows(matrix, fresh_pos, results)
+        if sparse_options:
+            results = [sparsify(vector, **sparse_options) for vector in results]
+        return results
+
+    def _emit_rows(self, matrix: tuple, positions: list[int], results: list) -> None:
+        indptr, term_ids, counts, lengths = matrix
+        row_sizes = np.diff(indptr)
+        scores = self._score_rows(term_ids, counts, np.repeat(lengths, row_sizes))
+        keep = scores > 0
+        entry_rows = np.repeat(np.arange(len(row_sizes)), row_sizes)
+        kept_indptr = np.zeros(len(indptr), dtype=np.int64)
+        np.cumsum(np.bincount(entry_rows[keep], minlength=len(row_sizes)), out=kept_indptr[1:])
+        indices = term_ids[keep].tolist()
+        values = _round6(scores[keep]).tolist()
+        bounds = kept_indptr.tolist()
+        for row, position in enumerate(positions):
+            start, end = bounds[row], bounds[row + 1]
+            results[position] = {"indices": indices[start:end], "values": values[start:end]}
+
+    def encode_document(self, text: str, **sparse_options) -> dict:
+        """Encode a document into a sparse vector using BM25 TF-IDF scoring.
+        sparse_options (max_terms, mass, levels) prune it, see sparsify."""
         tokens = tokenize(text)
         doc_len = len(tokens)
         tf_counts = Counter(tokens)
@@ -93,11 +526,11 @@ class SimpleBM25:
                 indices.append(idx)
                 values.append(round(score, 6))
 
-        return {"indices": indices, "values": values}
+        return sparsify({"indices": indices, "values": values}, **sparse_options)
 
     def encode_query(self, text: str) -> dict:
         """Encode a query into a sparse vector using IDF-only scoring."""
-        tokens = tokenize(text)
+        tokens = tokenize_query(text)
         seen = set()
         indices = []
         values = []
@@ -121,16 +554,110 @@ class SimpleBM25:
             "b": self.b,
             "avgdl": self.avgdl,
             "n_docs": self.n_docs,
+            "total_length": self.total_length,
+            "next_index": self._next_index,  # never reuse indices of pruned/removed terms
             "vocab": self.vocab,         # token -> index
             "idf": {str(k): v for k, v in self.idf.items()},  # index -> idf (JSON keys must be strings)
+            "doc_freq": {str(k): v for k, v in self.doc_freq.items()},  # index -> df, for online updates
+            "pruned": sorted(self.pruned),  # indices masked by prune(), still counted in doc_freq
         }
         with open(path, "w", encoding="utf-8") as f:
             json.dump(model, f)
-        print(f"  BM25 model saved to {path} ({len(self.vocab)} terms)")
+        print(f"  BM25 model saved to {path} ({len(self.idf)} terms)")
+
+    def save_query(self, path: str):
+        """Save only what query encoding needs, for the chat route: vocab and
+        IDF of the scored terms. save() keeps everything else (raw statistics,
+        masked terms) for online updates."""
+        vocab = {token: idx for token, idx in self.vocab.items() if idx in self.idf}
+        model = {"vocab": vocab, "idf": {str(idx): self.idf[idx] for idx in vocab.values()}}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(model, f, separators=(",", ":"))
+        print(f"  BM25 query model saved to {path} ({len(vocab)} terms)")
+
+    def save_binary(self, path: str):
+        """Save model in the compact memory-mappable format (see module docstring)."""
+        terms = sorted((token.encode("utf-8"), idx) for token, idx in self.vocab.items())
+        offsets = np.zeros(len(terms) + 1, dtype="<u4")
+        np.cumsum([len(term) for term, _ in terms], out=offsets[1:])
+        indices = np.array([idx for _, idx in terms], dtype="<u4")
+        idf = np.zeros(self._next_index, dtype="<f8")
+        for idx, value in self.idf.items():
+            idf[idx] = value
+        doc_freq = np.zeros(self._next_index, dtype="<u4")
+        for idx, value in self.doc_freq.items():
+            doc_freq[idx] = value
+
+        header = json.dumps({
+            "k1": self.k1,
+            "b": self.b,
+            "avgdl": self.avgdl,
+            "n_docs": self.n_docs,
+            "total_length": self.total_length,
+            "n_terms": len(terms),
+            "index_size": len(idf),
+        }).encode("utf-8")
+        preamble = BINARY_MAGIC + struct.pack("<II", BINARY_VERSION, len(header)) + header
+        preamble += b"\0" * (_align8(len(preamble)) - len(preamble))
+        with open(path, "wb") as f:
+            f.write(preamble)
+            f.write(offsets.tobytes())
+            f.write(indices.tobytes())
+            f.write(b"\0" * (_align8(offsets.nbytes + indices.nbytes) - offsets.nbytes - indices.nbytes))
+            f.write(idf.tobytes())
+            f.write(doc_freq.tobytes())
+            f.write(b"".join(term for term, _ in terms))
+        print(f"  BM25 binary model saved to {path} ({len(self.idf)} terms)")
+
+    @classmethod
+    def _load_binary(cls, path: str) -> "SimpleBM25":
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        version, header_len = struct.unpack_from("<II", mapped, len(BINARY_MAGIC))
+        if version not in (1, 2, BINARY_VERSION):
+            raise ValueError(f"Unsupported BM25 binary model version {version}")
+        start = len(BINARY_MAGIC) + 8
+        header = json.loads(bytes(view[start:start + header_len]))
+        n_terms, index_size = header["n_terms"], header["index_size"]
+
+        def section(pos, count, dtype):
+            # Explicit little-endian dtypes: the file's byte order, not the host's.
+            array = np.frombuffer(mapped, dtype=dtype, count=count, offset=pos)
+            return array, pos + array.nbytes
+
+        pos = (_align8 if version >= 3 else _align4)(start + header_len)
+        offsets, pos = section(pos, n_terms + 1, "<u4")
+        indices, pos = section(pos, n_terms, "<u4")
+        if version >= 3:
+            idf, pos = section(_align8(pos), index_size, "<f8")
+        else:
+            idf, pos = section(pos, index_size, "<f4")
+        doc_freq = None
+        if version >= 2:
+            doc_freq, pos = section(pos, index_size, "<u4")
+        blob = view[pos:pos + int(offsets[n_terms])]
+
+        bm25 = cls(k1=header["k1"], b=header["b"])
+        bm25.avgdl = header["avgdl"]
+        bm25.n_docs = header["n_docs"]
+        bm25.total_length = header.get("total_length", round(bm25.avgdl * bm25.n_docs))
+        bm25.vocab = MappedVocab(blob, offsets, indices)
+        bm25.idf = MappedArray(idf)
+        if doc_freq is not None:
+            bm25.doc_freq = MappedArray(doc_freq)
+            # Masked terms: counted, but saved without an IDF.
+            bm25.pruned = set(np.flatnonzero((doc_freq > 0) & (idf == 0)).tolist())
+        bm25._next_index = index_size
+        bm25._mmap = mapped
+        return bm25
 
     @classmethod
     def load(cls, path: str) -> "SimpleBM25":
-        """Load model from JSON."""
+        """Load model from JSON, or memory-map it if it's a binary export."""
+        with open(path, "rb") as f:
+            if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+                return cls._load_binary(path)
         with open(path, "r", encoding="utf-8") as f:
             model = json.load(f)
         bm25 = cls(k1=model["k1"], b=model["b"])
@@ -138,5 +665,9 @@ class SimpleBM25:
         bm25.n_docs = model["n_docs"]
         bm25.vocab = model["vocab"]
         bm25.idf = {int(k): v for k, v in model["idf"].items()}
-        bm25._next_index = max(bm25.vocab.values()) + 1 if bm25.vocab else 0
+        # Models exported before online updates lack raw statistics
+        bm25.doc_freq = {int(k): v for k, v in model.get("doc_freq", {}).items()}
+        bm25.pruned = set(model.get("pruned", []))
+        bm25.total_length = model.get("total_length", round(bm25.avgdl * bm25.n_docs))
+        bm25._next_index = model.get("next_index", max(bm25.vocab.values()) + 1 if bm25.vocab else 0)
         return bm25
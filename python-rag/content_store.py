@@ -0,0 +1,164 @@
+"""
+Compressed, offset-indexed store of chunk texts, keyed by chunk ID.
+
+create-pinecone.py writes every kept chunk's text here on each run. With
+--text-store the text is left out of the vector metadata, so upserts and
+query responses only carry small filterable fields, and the chat route
+reads the text back from this file (personalsite/src/utils/chunkTexts.ts).
+
+File layout (integers little-endian):
+
+  blocks  compressed frames, one after another; each holds the UTF-8 texts
+          of consecutive chunks, about BLOCK_BYTES of them uncompressed
+  index   JSON: {"version": 1, "codec": "zstd" | "deflate",
+                 "blocks": [[offset, length], ...],
+                 "chunks": {chunk_id: [block, start, length], ...}}
+          where start/length are byte positions in the decompressed block
+  footer  u64 offset of the index, u32 its length, then MAGIC
+
+Looking a chunk up decompresses only its block. Packing many chunks per
+frame gives the compressor enough text to find repetition; at ~64 KB a
+block still decompresses in well under a millisecond.
+
+zstd needs the zstandard package (and Node >= 22.15 on the site side);
+deflate is plain zlib, readable everywhere. create-pinecone.py pins deflate
+(CHUNK_TEXTS_CODEC) for the file the site reads, since whether zstandard
+happens to be installed says nothing about the Node version it runs on.
+"""
+
+import json
+import mmap
+import os
+import struct
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b"RAGTXT1\n"
+FOOTER = struct.Struct("<QI8s")
+BLOCK_BYTES = 64 * 1024
+ZSTD_LEVEL = 12
+DEFLATE_LEVEL = 9
+
+
+def default_codec() -> str:
+    return "zstd" if zstandard is not None else "deflate"
+
+
+def _compressor(codec: str):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("The zstd codec needs the zstandard package (pip install zstandard)")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress
+    if codec == "deflate":
+        return lambda data: zlib.compress(data, DEFLATE_LEVEL)
+    raise ValueError(f"Unknown content store codec: {codec}")
+
+
+def _decompressor(codec: str):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Reading a zstd content store needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompress
+    if codec == "deflate":
+        return zlib.decompress
+    raise ValueError(f"Unknown content store codec: {codec}")
+
+
+class ContentStoreWriter:
+    """Streams chunk texts into a new store at path. Only the current block
+    is held in memory; the file replaces path atomically on close()."""
+
+    def __init__(self, path: str, codec: str | None = None, block_bytes: int = BLOCK_BYTES):
+        self.path = path
+        self.codec = codec or default_codec()
+        self.block_bytes = block_bytes
+        self._compress = _compressor(self.codec)
+        self.blocks: list[list[int]] = []
+        self.chunks: dict[str, list[int]] = {}
+        self.raw_bytes = 0
+        self._pending: list[bytes] = []
+        self._pending_bytes = 0
+        self._offset = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path + ".tmp", "wb")
+
+    def add(self, chunk_id: str, text: str):
+        if chunk_id in self.chunks:
+            return  # IDs hash the content, so it's the same text
+        data = text.encode("utf-8")
+        self.chunks[chunk_id] = [len(self.blocks), self._pending_bytes, len(data)]
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+        self.raw_bytes += len(data)
+        if self._pending_bytes >= self.block_bytes:
+            self._flush()
+
+    def _flush(self):
+        frame = self._compress(b"".join(self._pending))
+        self._file.write(frame)
+        self.blocks.append([self._offset, len(frame)])
+        self._offset += len(frame)
+        self._pending.clear()
+        self._pending_bytes = 0
+
+    def close(self) -> int:
+        """Write the index and footer and move the file into place; returns
+        the file size in bytes."""
+        if self._pending:
+            self._flush()
+        index = json.dumps({"version": 1, "codec": self.codec, "blocks": self.blocks, "chunks": self.chunks},
+                           separators=(",", ":")).encode("utf-8")
+        self._file.write(index)
+        self._file.write(FOOTER.pack(self._offset, len(index), MAGIC))
+        size = self._file.tell()
+        self._file.close()
+        os.replace(self.path + ".tmp", self.path)
+        return size
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.path + ".tmp"):
+            os.remove(self.path + ".tmp")
+
+
+class ContentStore:
+    """Read access to a store written by ContentStoreWriter."""
+
+    def __init__(self, path: str):
+        # Memory-mapped: only the index and the blocks looked up are paged in.
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        index_offset, index_length, magic = FOOTER.unpack_from(self._data, len(self._data) - FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a chunk text store")
+        index = json.loads(self._data[index_offset:index_offset + index_length])
+        self.codec = index["codec"]
+        self.blocks = index["blocks"]
+        self.chunks = index["chunks"]
+        self._decompress = _decompressor(self.codec)
+        self._block = (None, b"")  # Last decompressed block; lookups come in ID order
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def close(self):
+        self._data.close()
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.chunks
+
+    def get(self, chunk_id: str) -> str | None:
+        entry = self.chunks.get(chunk_id)
+        if entry is None:
+            return None
+        block, start, length = entry
+        if self._block[0] != block:
+            offset, size = self.blocks[block]
+            self._block = (block, self._decompress(self._data[offset:offset + size]))
+        return self._block[1][start:start + length].decode("utf-8")
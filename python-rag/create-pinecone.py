@@ -4,23 +4,34 @@
 import os
 import json
 import hashlib
-import tempfile
 import shutil
 import requests
 import stat
 import yaml
 import sys
 import argparse
+import tempfile
+import time
+from collections import deque
+from itertools import chain, islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
-from pinecone import Pinecone, ServerlessSpec
+import numpy as np
 from git import Repo
 from langchain_community.document_loaders import DirectoryLoader, TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Pinecone as PineconeStore
 from langchain_core.documents import Document
 from dotenv import load_dotenv, find_dotenv
 from bm25 import SimpleBM25
+from content_store import ContentStore, ContentStoreWriter
+from dedup import ChunkDeduplicator, merge_metadata
+from embedding_cache import EmbeddingCache, embed_with_cache
+from embedding_engine import MAX_INPUT_TOKENS, BatchedEmbedder, load_encoding
+from known_queries import export_query_embeddings, export_query_results, load_known_queries
+from metrics import RunReport
+from quantization import CODECS
+from vector_store import LocalVectorStore, PineconeVectorStore
 
 # Walk up from this file to find the repo-root .env (one canonical source
 # shared with Next.js). find_dotenv handles the case where the script is
@@ -35,8 +46,49 @@ GITHUB_USERNAME = os.environ.get("GITHUB_USERNAME")
 GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
 PINECONE_API_KEY = os.environ.get("PINECONE_API_KEY")
 INDEX_NAME = os.environ.get("PINECONE_INDEX_NAME")
-EMBED_DIM = 1536  # For OpenAI embeddings
+EMBED_MODEL = "text-embedding-3-small"
+EMBED_NATIVE_DIM = 1536     # Full output width of EMBED_MODEL
+EMBED_DIM = EMBED_NATIVE_DIM  # Stored width; text-embedding-3 can shorten its output (--dimensions)
+EMBED_DIM_CHOICES = (256, 512, 1024, 1536)
+EMBED_CACHE_DIR = ".embedding-cache"
+EMBED_CACHE_MAX_ENTRIES = 100_000
+EMBED_CACHE_CODEC = "float32"  # "int8" stores cached vectors ~4x smaller, at a small accuracy cost (quantization.py)
+EMBED_BATCH_TOKENS = 50_000  # Token budget per embeddings request
+EMBED_CONCURRENCY = 4        # Embedding requests in flight at once
+EMBED_PRICE_PER_MILLION = 0.02  # USD per 1M tokens for EMBED_MODEL, for the run report's cost estimate
+CHUNK_SIZING = "chars"       # "chars" or "tokens" (see TOKEN_SPLITTER_BUDGETS)
+PIPELINE_SLICE = 512         # Chunks embedded/encoded per pipeline step
+UPSERT_MAX_BYTES = 1_500_000 # Pinecone caps upsert requests at 2 MB; leave headroom
+UPSERT_MAX_VECTORS = 1000    # Pinecone's per-request vector limit
+UPSERT_MAX_IN_FLIGHT = 4     # Concurrent upsert requests
 BM25_MODEL_PATH = os.path.join("..", "personalsite", "src", "data", "bm25-model.json")
+BM25_BINARY_PATH = os.path.join("..", "personalsite", "src", "data", "bm25-model.bin")  # Compact, mmap-able export
+BM25_QUERY_PATH = os.path.join("..", "personalsite", "src", "data", "bm25-query.json")  # Vocab + IDF, what the route loads
+INDEX_POINTER_PATH = os.path.join("..", "personalsite", "src", "data", "rag-index.json")  # Namespace the chat route reads
+CHUNK_TEXTS_PATH = os.path.join("..", "personalsite", "src", "data", "chunk-texts.bin")  # Chunk text by ID (content_store.py)
+CHUNK_TEXTS_CODEC = "deflate"  # What the site reads; zstd needs Node 22.15+ (content_store.py)
+TEXT_STORE = False           # Leave chunk text out of vector metadata; the route reads CHUNK_TEXTS_PATH instead
+QUERY_EMBEDDINGS_PATH = os.path.join("..", "personalsite", "src", "data", "query-embeddings.json")  # Known query vectors
+QUERY_RESULTS_PATH = os.path.join("..", "personalsite", "src", "data", "query-results.json")  # Their retrieval results
+QUERY_RESULTS_TOP_K = 30     # Matches kept per known query (the route's topK)
+GITHUB_MIRROR_DIR = ".github-mirrors"  # Persistent bare, shallow clones updated with git fetch
+GITHUB_FETCH_WORKERS = 4
+GITHUB_FILE_EXTENSIONS = (".md", ".py", ".js", ".ts", ".txt")
+GITHUB_MAX_FILE_BYTES = 512_000
+GITHUB_PARTIAL_CLONE = True  # Skip downloading blobs over GITHUB_MAX_FILE_BYTES (--filter=blob:limit)
+LOADER_PROCESSES = min(4, os.cpu_count() or 1)  # Processes parsing YAML/markdown files
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MANIFEST_VERSION = 2
+BM25_BASELINE_PATH = "bm25-baseline.json"  # BM25 statistics at the last full encode, for drift
+BM25_DRIFT_THRESHOLD = 0.1   # Suggest --reset once stored sparse values are ~10% off
+VECTOR_BACKEND = "pinecone"   # "pinecone" or "local" (offline stand-in, see vector_store.py)
+LOCAL_INDEX_DIR = ".local-index"  # LocalVectorStore data plus its own manifest and BM25 model
+LOCAL_ANN_PQ_SUBVECTORS = 0  # PQ-compress the local IVF index (e.g. 96); 0 keeps full vectors
+LOCAL_VECTOR_CODEC = "float32"  # Local dense storage: float32, int8 or binary (--vector-codec)
+DEDUP_THRESHOLD = 0.9        # Estimated Jaccard similarity at which chunks count as near-duplicates
+PROFILE_DIR = "run-profiles"  # Where --profile writes per-stage profiles
+NAMESPACE_GC_GRACE = 3600    # Seconds a replaced namespace is kept for sites still deployed against it
+BUILD_VALIDATE_TIMEOUT = 120 # Seconds to wait for a rebuilt namespace's count and smoke query to settle
 
 # === HELPERS ===
 def compute_hash(content):
@@ -52,20 +104,94 @@ def save_tracking(data):
     with open(TRACKING_FILE, "w") as f:
         json.dump(data, f, indent=2)
 
+# === CHUNK MANIFEST ===
+# tracking.json doubles as the manifest of what is currently in the index
+# (since manifest v2 it also keeps each chunk's BM25 footprint, so removed
+# chunks can be taken out of the BM25 statistics without their text):
+#   {"manifest_version": 2, "sources": {"<repo-relative path>": ["<chunk id>", ...]},
+#    "bm25_footprints": {"<chunk id>": "<token count>:<term index>,<term index>,..."},
+#    "duplicates": {"<chunk id>": ["<id of a duplicate folded into it>", ...]}}
+# Chunk IDs are derived from the source path and the chunk content, so an
+# unchanged chunk keeps its ID across runs and the update only has to embed
+# and upsert new IDs and delete IDs that disappeared.
+
+# Loader bookkeeping that should not change a chunk's identity. file_path is
+# already encoded (normalized) in the ID prefix.
+_ID_EXCLUDED_METADATA = {"file_path", "source"}
+
+def source_key(metadata):
+    """Repo-relative, forward-slash path of the file a chunk came from, so IDs
+    don't depend on the working directory or OS the indexer runs on."""
+    path = metadata.get("file_path") or metadata.get("source") or "unknown"
+    rel = os.path.relpath(os.path.abspath(path), REPO_ROOT)
+    return rel.replace(os.sep, "/")
+
+def chunk_id(chunk):
+    """Stable vector ID: `<source path>#<hash of chunk text + metadata>`."""
+    metadata = {k: v for k, v in chunk.metadata.items() if k not in _ID_EXCLUDED_METADATA}
+    payload = chunk.page_content + "\x00" + json.dumps(metadata, sort_keys=True, default=str)
+    return f"{source_key(chunk.metadata)}#{compute_hash(payload)[:16]}"
+
+def iter_manifest(chunks):
+    """Assign stable IDs to chunks, yielding (id, chunk). Chunks with
+    identical IDs (same file, text and metadata) are only yielded once."""
+    seen = set()
+    for chunk in chunks:
+        cid = chunk_id(chunk)
+        if cid in seen:
+            continue
+        seen.add(cid)
+        yield cid, chunk
+
+def pack_footprint(footprint):
+    """[length, [term indices]] -> "length:i,j,k" (one line per chunk in tracking.json)."""
+    length, term_ids = footprint
+    return f"{length}:{','.join(map(str, term_ids))}"
+
+def unpack_footprint(packed):
+    length, _, term_ids = packed.partition(":")
+    return [int(length), [int(idx) for idx in term_ids.split(",") if idx]]
+
 # === GITHUB REPO FETCHING ===
-def get_user_repos(username, token):
+def get_user_repos(username, token, listing_cache=None):
+    """Clone URLs of the user's non-fork repos.
+
+    listing_cache (e.g. tracking_data["github_listing"]) keeps each page's
+    ETag and result; pages are requested with If-None-Match, and a 304
+    (which doesn't count against the rate limit) reuses the cached page.
+    """
     print("Fetching GitHub repositories...")
-    headers = {"Authorization": f"token {token}"}
+    listing_cache = listing_cache if listing_cache is not None else {}
     repos = []
     page = 1
+    unchanged = 0
     while True:
         url = f"https://api.github.com/users/{username}/repos?sort=pushed&per_page=100&page={page}"
+        headers = {"Authorization": f"token {token}"}
+        cached = listing_cache.get(url)
+        if cached:
+            headers["If-None-Match"] = cached["etag"]
         response = requests.get(url, headers=headers)
-        data = response.json()
-        if not data or "message" in data:
-            break
-        repos.extend(repo["clone_url"] for repo in data if not repo["fork"])
+        if response.status_code == 304 and cached:
+            unchanged += 1
+            page_repos, page_size = cached["repos"], cached["count"]
+        else:
+            data = response.json()
+            if isinstance(data, dict):
+                # An error (bad credentials, rate limit); an empty result would
+                # read as "no repos" and delete every indexed GitHub chunk.
+                raise RuntimeError(f"GitHub repo listing failed: {data.get('message', data)}")
+            if not data:
+                break
+            page_repos, page_size = [repo["clone_url"] for repo in data if not repo["fork"]], len(data)
+            if response.headers.get("ETag"):
+                listing_cache[url] = {"etag": response.headers["ETag"], "repos": page_repos, "count": page_size}
+        repos.extend(page_repos)
+        if page_size < 100:
+            break  # Last page; saves requesting an empty one
         page += 1
+    if unchanged:
+        print(f"  {unchanged} listing page(s) unchanged (304, not rate limited)")
     return repos
 
 # === PROJECTS JSON LOADING ===
@@ -138,26 +264,24 @@ def load_projects_json():
     return docs
 
 # === TEXT FILE LOADING ===
-def load_text_files():
+def load_text_files(processes=1):
+    """Load every local source (see DOCUMENT_SOURCES) into one list."""
+    return list(stream_documents(processes=processes))
+
+def load_plain_text_files():
     # Load regular text files (excluding projects_deep_dive.txt which is now sourced from projects.json)
     loader = DirectoryLoader(TEXT_DIRECTORY, glob="**/*.txt", loader_cls=TextLoader, exclude=["**/linkedin/**"])
     text_docs = loader.load()
     for doc in text_docs:
         doc.metadata.update({"source_type": "text", "file_path": doc.metadata["source"]})
+    return text_docs
 
-    # Load YAML files
-    yaml_docs = load_yaml_files()
-
-    # Load blog posts
-    blog_docs = load_blog_posts()
-
-    # Load projects from shared JSON
-    project_docs = load_projects_json()
-
-    # Load corpus files — Karthik's own opinionated prose, indexed per artifact
-    corpus_docs = load_corpus_files()
-
-    return text_docs + yaml_docs + blog_docs + project_docs + corpus_docs
+def map_files(parse, paths, executor=None):
+    """Run a per-file parser over paths, in the process pool if one is given.
+    Results come back in path order."""
+    if executor is None:
+        return [parse(path) for path in paths]
+    return list(executor.map(parse, paths))
 
 
 def parse_corpus_frontmatter(raw):
@@ -177,7 +301,7 @@ def parse_corpus_frontmatter(raw):
     return fm, body
 
 
-def load_corpus_files():
+def load_corpus_files(executor=None):
     """Load `rag-docs/corpus/*.md` files. Each file is a per-artifact corpus
     of Karthik's opinionated prose, with frontmatter declaring `applies_to`
     (artifact ids like `project:caladrius`, `work:Peraton Labs`,
@@ -189,18 +313,10 @@ def load_corpus_files():
     indexed once with all ids in `applies_to_ids`, and the FIRST id's kind
     determines `content_type` (most files apply to a single artifact)."""
     corpus_dir = os.path.join(TEXT_DIRECTORY, 'corpus')
-    docs = []
     if not os.path.isdir(corpus_dir):
-        return docs
-
-    kind_to_content_type = {
-        'project': 'project',
-        'work': 'professional',
-        'involvement': 'involvement',
-        'blog': 'blog_post',
-        'topic': 'opinion',
-    }
+        return []
 
+    paths = []
     for filename in os.listdir(corpus_dir):
         if not filename.endswith('.md'):
             continue
@@ -210,60 +326,70 @@ def load_corpus_files():
         # someone who asked about a project.
         if '_' not in filename:
             continue
-        full_path = os.path.join(corpus_dir, filename)
-        try:
-            with open(full_path, 'r', encoding='utf-8') as f:
-                raw = f.read()
-        except (IOError, OSError):
-            continue
+        paths.append(os.path.join(corpus_dir, filename))
 
-        fm, body = parse_corpus_frontmatter(raw)
-        if not body.strip():
-            continue
+    return [doc for doc in map_files(load_corpus_file, paths, executor) if doc is not None]
 
-        applies_to = fm.get('applies_to') or []
-        if not isinstance(applies_to, list):
-            applies_to = []
-        applies_to = [str(x) for x in applies_to if isinstance(x, str)]
-
-        topics = fm.get('topics') or []
-        if not isinstance(topics, list):
-            topics = []
-        topics = [str(x) for x in topics if isinstance(x, str)]
-
-        primary_id = applies_to[0] if applies_to else ''
-        kind = primary_id.split(':', 1)[0] if ':' in primary_id else 'opinion'
-        content_type = kind_to_content_type.get(kind, 'opinion')
-
-        metadata = {
-            'source_type': 'corpus',
-            'content_type': content_type,
-            'file_path': full_path,
-            'applies_to_ids': applies_to,
-            'topics': topics,
-        }
+CORPUS_KIND_TO_CONTENT_TYPE = {
+    'project': 'project',
+    'work': 'professional',
+    'involvement': 'involvement',
+    'blog': 'blog_post',
+    'topic': 'opinion',
+}
 
-        # Hook in artifact-specific metadata fields so existing retrieval
-        # filters and the directory-index lookup find these chunks. We mirror
-        # whatever the corresponding kind already uses elsewhere.
-        if primary_id.startswith('project:'):
-            metadata['project_title'] = primary_id.split(':', 1)[1]
-        elif primary_id.startswith('work:'):
-            metadata['company'] = primary_id.split(':', 1)[1]
-        elif primary_id.startswith('involvement:'):
-            slug = primary_id.split(':', 1)[1]
-            metadata['involvement_slug'] = slug
-            metadata['slug'] = slug
-        elif primary_id.startswith('blog:'):
-            metadata['slug'] = primary_id.split(':', 1)[1]
-
-        docs.append(Document(page_content=body, metadata=metadata))
+def load_corpus_file(full_path):
+    """Parse one corpus markdown file into a Document (None if it is empty or unreadable)."""
+    try:
+        with open(full_path, 'r', encoding='utf-8') as f:
+            raw = f.read()
+    except (IOError, OSError):
+        return None
 
-    return docs
+    fm, body = parse_corpus_frontmatter(raw)
+    if not body.strip():
+        return None
+
+    applies_to = fm.get('applies_to') or []
+    if not isinstance(applies_to, list):
+        applies_to = []
+    applies_to = [str(x) for x in applies_to if isinstance(x, str)]
+
+    topics = fm.get('topics') or []
+    if not isinstance(topics, list):
+        topics = []
+    topics = [str(x) for x in topics if isinstance(x, str)]
+
+    primary_id = applies_to[0] if applies_to else ''
+    kind = primary_id.split(':', 1)[0] if ':' in primary_id else 'opinion'
+    content_type = CORPUS_KIND_TO_CONTENT_TYPE.get(kind, 'opinion')
+
+    metadata = {
+        'source_type': 'corpus',
+        'content_type': content_type,
+        'file_path': full_path,
+        'applies_to_ids': applies_to,
+        'topics': topics,
+    }
 
-def load_yaml_files():
+    # Hook in artifact-specific metadata fields so existing retrieval
+    # filters and the directory-index lookup find these chunks. We mirror
+    # whatever the corresponding kind already uses elsewhere.
+    if primary_id.startswith('project:'):
+        metadata['project_title'] = primary_id.split(':', 1)[1]
+    elif primary_id.startswith('work:'):
+        metadata['company'] = primary_id.split(':', 1)[1]
+    elif primary_id.startswith('involvement:'):
+        slug = primary_id.split(':', 1)[1]
+        metadata['involvement_slug'] = slug
+        metadata['slug'] = slug
+    elif primary_id.startswith('blog:'):
+        metadata['slug'] = primary_id.split(':', 1)[1]
+
+    return Document(page_content=body, metadata=metadata)
+
+def load_yaml_files(executor=None):
     """Load and process YAML files from the rag-docs directory"""
-    yaml_docs = []
     yaml_files = []
     
     # Find all YAML files
@@ -272,19 +398,20 @@ def load_yaml_files():
             if file.endswith(('.yaml', '.yml')):
                 yaml_files.append(os.path.join(root, file))
     
-    for yaml_file in yaml_files:
-        try:
-            with open(yaml_file, 'r', encoding='utf-8') as f:
-                yaml_content = yaml.safe_load(f)
-            
-            # Convert YAML to searchable text chunks
-            docs = yaml_to_documents(yaml_content, yaml_file)
-            yaml_docs.extend(docs)
-            
-        except Exception as e:
-            print(f"Error processing YAML file {yaml_file}: {e}")
-    
-    return yaml_docs
+    return [doc for docs in map_files(load_yaml_file, yaml_files, executor) for doc in docs]
+
+def load_yaml_file(yaml_file):
+    """Parse one YAML file into Documents (CPU-heavy, so it can run in a worker process)."""
+    try:
+        with open(yaml_file, 'r', encoding='utf-8') as f:
+            yaml_content = yaml.safe_load(f)
+        
+        # Convert YAML to searchable text chunks
+        return yaml_to_documents(yaml_content, yaml_file)
+        
+    except Exception as e:
+        print(f"Error processing YAML file {yaml_file}: {e}")
+        return []
 
 def yaml_to_documents(yaml_data, file_path):
     """Convert YAML data structure to searchable document chunks"""
@@ -425,7 +552,7 @@ def yaml_to_documents(yaml_data, file_path):
     return documents
 
 # === BLOG POST LOADING ===
-def load_blog_posts():
+def load_blog_posts(executor=None):
     """Load and process blog posts from personalsite/blog/posts directory"""
     blog_docs = []
 
@@ -456,21 +583,25 @@ def load_blog_posts():
 
     print(f"Found {len(blog_files)} blog post(s)")
 
-    for blog_file in blog_files:
-        try:
-            with open(blog_file, 'r', encoding='utf-8') as f:
-                content = f.read()
+    for doc in map_files(load_blog_file, blog_files, executor):
+        if doc:
+            blog_docs.append(doc)
+            print(f"  Loaded: {doc.metadata.get('title', 'Untitled')}")
 
-            # Parse frontmatter and content
-            doc = parse_blog_markdown(content, blog_file)
-            if doc:
-                blog_docs.append(doc)
-                print(f"  Loaded: {doc.metadata.get('title', 'Untitled')}")
+    return blog_docs
 
-        except Exception as e:
-            print(f"Error processing blog file {blog_file}: {e}")
+def load_blog_file(blog_file):
+    """Read and parse one blog post (None if it can't be parsed)."""
+    try:
+        with open(blog_file, 'r', encoding='utf-8') as f:
+            content = f.read()
 
-    return blog_docs
+        # Parse frontmatter and content
+        return parse_blog_markdown(content, blog_file)
+
+    except Exception as e:
+        print(f"Error processing blog file {blog_file}: {e}")
+        return None
 
 def parse_blog_markdown(content, file_path):
     """Parse markdown blog post with frontmatter"""
@@ -527,255 +658,711 @@ Summary: {summary}
         }
     )
 
+# === PARALLEL DOCUMENT LOADING ===
+# (name, loader, parses files in the process pool). Documents are yielded
+# in this order, which fixes the chunk order and the order new BM25 terms
+# get their indices in.
+DOCUMENT_SOURCES = [
+    ("text", load_plain_text_files, False),
+    ("yaml", load_yaml_files, True),
+    ("blog", load_blog_posts, True),
+    ("projects", load_projects_json, False),
+    # Corpus files — Karthik's own opinionated prose, indexed per artifact
+    ("corpus", load_corpus_files, True),
+]
+
+def _run_source(loader, uses_pool, pool):
+    start = time.perf_counter()
+    docs = loader(executor=pool) if uses_pool else loader()
+    return docs, time.perf_counter() - start
+
+def stream_documents(processes=LOADER_PROCESSES, ordered=True, report=None):
+    """Run every source loader concurrently and yield Documents as they're ready.
+
+    Each source runs on its own thread; YAML and markdown parsing is spread
+    over a pool of `processes` worker processes (parsed inline when
+    processes <= 1). With ordered=True each source's documents are yielded
+    as soon as it and every source before it in DOCUMENT_SOURCES are done,
+    so the output is deterministic; ordered=False yields each source as soon
+    as it finishes. Prints per-source timing and document counts at the end
+    and records them as "load:<source>" stages in report (a RunReport).
+    """
+    pool = ProcessPoolExecutor(max_workers=processes) if processes > 1 else None
+    if pool is not None:
+        # Fork the workers now, before the loader threads exist.
+        pool.submit(os.getpid).result()
+
+    start = time.perf_counter()
+    timings = []
+    try:
+        with ThreadPoolExecutor(max_workers=len(DOCUMENT_SOURCES)) as threads:
+            futures = {
+                threads.submit(_run_source, loader, uses_pool, pool): name
+                for name, loader, uses_pool in DOCUMENT_SOURCES
+            }
+            for future in (futures if ordered else as_completed(futures)):
+                docs, seconds = future.result()
+                timings.append((futures[future], len(docs), seconds))
+                if report is not None:
+                    report.record(f"load:{futures[future]}", seconds, items=len(docs))
+                yield from docs
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {sum(count for _, count, _ in timings)} documents in {elapsed:.2f}s "
+          f"({processes if pool else 1} parse process(es)):")
+    for name, count, seconds in timings:
+        print(f"  {name:<10} {count:>5} docs  {seconds:>6.2f}s")
+
 # === HANDLE REMOVE PERMISSIONS ===
 def handle_remove_readonly(func, path, exc_info):
     os.chmod(path, stat.S_IWRITE)
     func(path)
 
-# === GITHUB LOADING WITH HASH DEDUPLICATION ===
-def load_github_repos(repo_urls, tracking_data):
-    temp_dir = tempfile.mkdtemp()
-    new_docs = []
-    new_tracking = {}
-
-    for repo_url in repo_urls:
-        repo_name = repo_url.rstrip("/").split("/")[-1]
-        repo_path = os.path.join(temp_dir, repo_name)
+# === GITHUB LOADING WITH BLOB SHA CHANGE DETECTION ===
+# Each repo is kept as a bare, depth-1 (and by default blobless-above-a-size)
+# mirror under GITHUB_MIRROR_DIR. Later runs `git fetch` the default branch
+# into MIRROR_REF instead of re-cloning. Files are never checked out: the
+# tree listing gives every file's git blob SHA, so a file only has to be read
+# (from the local object store) when its blob SHA differs from tracking.json.
+MIRROR_REF = "refs/indexer/head"
+
+def github_repo_name(repo_url):
+    return repo_url.rstrip("/").split("/")[-1].removesuffix(".git")
+
+def github_file_path(repo_name, path):
+    return os.path.join("github", repo_name, path)
+
+def sync_mirror(repo_url, repo_name):
+    """Clone the repo into the mirror cache if needed, fetch its default
+    branch tip and return (repo, commit_sha)."""
+    path = os.path.join(GITHUB_MIRROR_DIR, repo_name)
+    if os.path.isdir(path):
         try:
-            Repo.clone_from(repo_url, repo_path)
+            repo = Repo(path)
+            repo.git.fetch("--depth=1", "origin", f"+HEAD:{MIRROR_REF}")
+            return repo, repo.git.rev_parse(MIRROR_REF)
         except Exception as e:
-            print(f"Failed to clone {repo_url}: {e}")
+            print(f"  Mirror of {repo_name} unusable ({e}), re-cloning")
+            shutil.rmtree(path, onerror=handle_remove_readonly)
+
+    options = {"bare": True, "depth": 1}
+    if GITHUB_PARTIAL_CLONE:
+        options["filter"] = f"blob:limit={GITHUB_MAX_FILE_BYTES}"
+    repo = Repo.clone_from(repo_url, path, **options)
+    repo.git.fetch("--depth=1", "origin", f"+HEAD:{MIRROR_REF}")
+    return repo, repo.git.rev_parse(MIRROR_REF)
+
+def list_blobs(repo):
+    """{path: blob_sha} for indexable files at MIRROR_REF, skipping blobs the
+    partial clone filtered out (they are over GITHUB_MAX_FILE_BYTES)."""
+    missing = set()
+    if GITHUB_PARTIAL_CLONE:
+        for line in repo.git.rev_list("--objects", "--missing=print", MIRROR_REF).splitlines():
+            if line.startswith("?"):
+                missing.add(line[1:])
+    blobs = {}
+    for line in repo.git.ls_tree("-r", MIRROR_REF).splitlines():
+        meta, path = line.split("\t", 1)
+        _, obj_type, sha = meta.split()
+        if obj_type == "blob" and path.endswith(GITHUB_FILE_EXTENSIONS) and sha not in missing:
+            blobs[path] = sha
+    return blobs
+
+def load_github_repo(repo_url, previous, can_skip=None):
+    """Sync one repo's mirror and load its indexable files.
+
+    A file whose blob SHA matches tracking.json is not read if
+    can_skip(file_path) allows it; the caller carries its chunks over from
+    the manifest instead. Without can_skip every file is read. If the fetch
+    fails, the previously tracked files that can be skipped are kept.
+    Returns (repo_name, docs, tracking_entry, skipped file paths)."""
+    repo_name = github_repo_name(repo_url)
+    previous_files = previous.get("files", {})
+    try:
+        repo, commit = sync_mirror(repo_url, repo_name)
+    except Exception as e:
+        print(f"Failed to fetch {repo_url}: {e}")
+        kept = {path: sha for path, sha in previous_files.items()
+                if can_skip is not None and can_skip(github_file_path(repo_name, path))}
+        if len(kept) < len(previous_files):
+            print(f"  {repo_name}: {len(previous_files) - len(kept)} file(s) left out until it can be fetched")
+        return repo_name, [], {**previous, "files": kept}, [github_file_path(repo_name, path) for path in kept]
+
+    # Same commit, same tree: the tracked listing is still current.
+    blobs = previous_files if previous.get("commit") == commit else list_blobs(repo)
+    docs, skipped = [], []
+    for path, sha in blobs.items():
+        file_path = github_file_path(repo_name, path)
+        if previous_files.get(path) == sha and can_skip is not None and can_skip(file_path):
+            skipped.append(file_path)
             continue
-
-        loader = DirectoryLoader(
-            repo_path,
-            glob="**/*.{md,py,js,ts,txt}",
-            loader_cls=TextLoader,
-            silent_errors=True
+        binsha = bytes.fromhex(sha)
+        if repo.odb.info(binsha).size > GITHUB_MAX_FILE_BYTES:
+            continue
+        try:
+            content = repo.odb.stream(binsha).read().decode("utf-8")
+        except UnicodeDecodeError:
+            continue
+        docs.append(Document(page_content=content, metadata={
+            "source_type": "github",
+            "repo_name": repo_name,
+            "file_path": file_path,
+        }))
+    print(f"  {repo_name}: {len(docs)} loaded, {len(skipped)} unchanged of {len(blobs)} file(s) at {commit[:8]}")
+    return repo_name, docs, {"commit": commit, "files": blobs}, skipped
+
+def load_github_repos(repo_urls, tracking_data, can_skip=None):
+    """Fetch repos concurrently (GITHUB_FETCH_WORKERS at a time) through the
+    mirror cache. tracking_data maps repo name -> {"commit", "files": {path: blob_sha}}.
+    Returns (docs, new_tracking, skipped file paths); see load_github_repo."""
+    os.makedirs(GITHUB_MIRROR_DIR, exist_ok=True)
+    new_docs = []
+    new_tracking = {}
+    skipped = []
+    with ThreadPoolExecutor(max_workers=GITHUB_FETCH_WORKERS) as pool:
+        results = pool.map(
+            lambda url: load_github_repo(url, tracking_data.get(github_repo_name(url), {}), can_skip),
+            repo_urls,
         )
-        docs = loader.load()
-
-        new_tracking[repo_name] = {}
-        for doc in docs:
-            content = doc.page_content
-            file_path = doc.metadata["source"]
-            hash_val = compute_hash(content)
-
-            if repo_name not in tracking_data or tracking_data[repo_name].get(file_path) != hash_val:
-                doc.metadata.update({
-                    "source_type": "github",
-                    "repo_name": repo_name,
-                    "file_path": file_path
-                })
-                new_docs.append(doc)
-                new_tracking[repo_name][file_path] = hash_val
-
-    shutil.rmtree(temp_dir, onerror=handle_remove_readonly)
-    return new_docs, new_tracking
+        for repo_name, docs, entry, repo_skipped in results:
+            new_docs.extend(docs)
+            new_tracking[repo_name] = entry
+            skipped.extend(repo_skipped)
+    return new_docs, new_tracking, skipped
 
 # === CHUNKING ===
-def chunk_documents(documents):
-    """Smart chunking based on document type"""
-    chunks = []
-
+# Splitter settings per source_type. One splitter per type is built on first
+# use and reused for every document of that type.
+SPLITTER_SETTINGS = {
+    # Larger chunks for blog posts to maintain narrative flow
+    # Use section breaks and paragraphs as boundaries
+    'blog': dict(
+        chunk_size=1200,
+        chunk_overlap=200,
+        separators=["\n## ", "\n### ", "\n\n", "\n", ". ", " ", ""]
+    ),
+    # Corpus files are organized by `## <Sub-topic>` headings — Karthik's
+    # takes grouped thematically. Split on those boundaries so each
+    # chunk is one sub-topic of opinion (the natural unit of his
+    # voice on a given subject), with leading sub-topic header
+    # preserved as context.
+    'corpus': dict(
+        chunk_size=1000,
+        chunk_overlap=150,
+        separators=["\n## ", "\n### ", "\n\n", "\n", ". ", " ", ""]
+    ),
+    # Keep structured data intact (experience, projects, etc.)
+    'yaml': dict(
+        chunk_size=600,
+        chunk_overlap=50,
+        separators=["\n\n", "\n", " ", ""]
+    ),
+    # Keep each project as a single chunk when possible
+    'json': dict(
+        chunk_size=1200,
+        chunk_overlap=100,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    ),
+    # Code-aware chunking
+    'github': dict(
+        chunk_size=800,
+        chunk_overlap=100,
+        separators=["\n\nclass ", "\n\ndef ", "\n\n", "\n", " ", ""]
+    ),
+}
+# Text files in rag-docs/ are opinion/bio/faq markdown organized
+# by `##` and `###` section headers. We MUST split on header
+# boundaries first so a section header stays attached to the
+# paragraph underneath it (otherwise retrieval can return a 90
+# char chunk that is just the header, with the actual content
+# orphaned into a neighbor chunk the query never surfaces).
+#
+# Generous chunk_size + overlap keeps short opinions whole and
+# lets long ones carry enough leading context to be findable.
+DEFAULT_SPLITTER_SETTINGS = dict(
+    chunk_size=1200,
+    chunk_overlap=200,
+    separators=["\n## ", "\n### ", "\n\n", "\n", ". ", " ", ""]
+)
+
+# Token mode: (chunk_size, chunk_overlap) in embedding-model tokens, with the
+# same separators as above. Roughly the character sizes at ~4 chars/token for
+# prose, with overlap trimmed to ~10% since overlap tokens are embedded twice.
+TOKEN_SPLITTER_BUDGETS = {
+    'blog': (300, 30),
+    'corpus': (250, 25),
+    'yaml': (150, 10),
+    'json': (300, 20),
+    'github': (250, 25),
+}
+DEFAULT_TOKEN_BUDGET = (300, 30)
+
+_splitters = {}
+_encoding = None
+
+def count_tokens(text):
+    """Tokens of text for EMBED_MODEL (len/4 estimate if tiktoken can't load)."""
+    global _encoding
+    if _encoding is None:
+        _encoding = load_encoding(EMBED_MODEL) or False
+    if _encoding is False:
+        return max(1, len(text) // 4)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+def get_splitter(source_type, sizing=CHUNK_SIZING):
+    splitter = _splitters.get((sizing, source_type))
+    if splitter is None:
+        settings = dict(SPLITTER_SETTINGS.get(source_type, DEFAULT_SPLITTER_SETTINGS))
+        if sizing == "tokens":
+            chunk_size, chunk_overlap = TOKEN_SPLITTER_BUDGETS.get(source_type, DEFAULT_TOKEN_BUDGET)
+            settings.update(chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=count_tokens)
+        splitter = _splitters[(sizing, source_type)] = RecursiveCharacterTextSplitter(**settings)
+    return splitter
+
+def iter_chunks(documents, sizing=CHUNK_SIZING, stats=None, report=None):
+    """Smart chunking based on document type, yielding chunks lazily so
+    documents can stream through without the corpus being held in memory.
+
+    If stats (see new_chunk_stats) is given, each chunk's token count and
+    the tokens duplicated by overlap are recorded in it. Splitting time is
+    added to report's "chunk" stage."""
+    report = report or RunReport()
     for doc in documents:
-        source_type = doc.metadata.get('source_type', 'unknown')
-
-        if source_type == 'blog':
-            # Larger chunks for blog posts to maintain narrative flow
-            # Use section breaks and paragraphs as boundaries
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1200,
-                chunk_overlap=200,
-                separators=["\n## ", "\n### ", "\n\n", "\n", ". ", " ", ""]
-            )
-        elif source_type == 'corpus':
-            # Corpus files are organized by `## <Sub-topic>` headings — Karthik's
-            # takes grouped thematically. Split on those boundaries so each
-            # chunk is one sub-topic of opinion (the natural unit of his
-            # voice on a given subject), with leading sub-topic header
-            # preserved as context.
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=150,
-                separators=["\n## ", "\n### ", "\n\n", "\n", ". ", " ", ""]
-            )
-        elif source_type == 'yaml':
-            # Keep structured data intact (experience, projects, etc.)
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=600,
-                chunk_overlap=50,
-                separators=["\n\n", "\n", " ", ""]
-            )
-        elif source_type == 'json':
-            # Keep each project as a single chunk when possible
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1200,
-                chunk_overlap=100,
-                separators=["\n\n", "\n", ". ", " ", ""]
-            )
-        elif source_type == 'github':
-            # Code-aware chunking
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=800,
-                chunk_overlap=100,
-                separators=["\n\nclass ", "\n\ndef ", "\n\n", "\n", " ", ""]
-            )
-        else:
-            # Text files in rag-docs/ are opinion/bio/faq markdown organized
-            # by `##` and `###` section headers. We MUST split on header
-            # boundaries first so a section header stays attached to the
-            # paragraph underneath it (otherwise retrieval can return a 90
-            # char chunk that is just the header, with the actual content
-            # orphaned into a neighbor chunk the query never surfaces).
-            #
-            # Generous chunk_size + overlap keeps short opinions whole and
-            # lets long ones carry enough leading context to be findable.
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1200,
-                chunk_overlap=200,
-                separators=["\n## ", "\n### ", "\n\n", "\n", ". ", " ", ""]
-            )
-
-        doc_chunks = splitter.split_documents([doc])
-        chunks.extend(doc_chunks)
-
-    return chunks
-
-# === PINECONE MANAGEMENT ===
-def ensure_hybrid_index():
-    """Ensure the Pinecone index uses dotproduct metric for hybrid search.
-    Recreates the index if it exists with a different metric."""
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-
-    # Check if index exists and its metric
-    existing_indexes = pc.list_indexes()
-    index_exists = False
-    needs_recreate = False
-
-    for idx_info in existing_indexes:
-        if idx_info.name == INDEX_NAME:
-            index_exists = True
-            if idx_info.metric != "dotproduct":
-                print(f"  Index '{INDEX_NAME}' uses '{idx_info.metric}' metric, need 'dotproduct' for hybrid search")
-                needs_recreate = True
-            break
-
-    if needs_recreate:
-        print(f"  Deleting index '{INDEX_NAME}' to recreate with dotproduct metric...")
-        pc.delete_index(INDEX_NAME)
-        index_exists = False
-        # Wait for deletion
-        import time
-        time.sleep(5)
-
-    if not index_exists:
-        print(f"  Creating index '{INDEX_NAME}' with dotproduct metric for hybrid search...")
-        pc.create_index(
-            name=INDEX_NAME,
-            dimension=EMBED_DIM,
-            metric="dotproduct",
-            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-        )
-        # Wait for index to be ready
-        import time
-        while not pc.describe_index(INDEX_NAME).status.get("ready", False):
-            print("  Waiting for index to be ready...")
+        with report.stage("chunk") as step:
+            splitter = get_splitter(doc.metadata.get('source_type', 'unknown'), sizing)
+            doc_chunks = splitter.split_documents([doc])
+            step["items"] = len(doc_chunks)
+        if stats is not None:
+            tokens = [count_tokens(chunk.page_content) for chunk in doc_chunks]
+            stats["tokens"].extend(tokens)
+            stats["overlap_tokens"] += max(0, sum(tokens) - count_tokens(doc.page_content))
+        yield from doc_chunks
+
+def chunk_documents(documents, sizing=CHUNK_SIZING):
+    """Smart chunking based on document type"""
+    return list(iter_chunks(documents, sizing))
+
+def new_chunk_stats():
+    return {"tokens": [], "overlap_tokens": 0}
+
+def print_chunk_report(stats, sizing=CHUNK_SIZING):
+    """Tokens-per-chunk distribution and overlap tokens for one run."""
+    tokens = np.array(stats["tokens"])
+    if not tokens.size:
+        return
+    total = int(tokens.sum())
+    p50, p90, p99 = np.percentile(tokens, [50, 90, 99]).astype(int)
+    exact = "" if _encoding else " (estimated, tiktoken unavailable)"
+    print(f"Chunk tokens{exact}, {sizing} sizing: {tokens.size} chunks, {total:,} tokens total; "
+          f"min {tokens.min()}, p50 {p50}, p90 {p90}, p99 {p99}, max {tokens.max()}")
+    print(f"  Overlap: {stats['overlap_tokens']:,} tokens ({stats['overlap_tokens'] / total:.1%} of embedded tokens)")
+    over_limit = int((tokens > MAX_INPUT_TOKENS).sum())
+    if over_limit:
+        print(f"  Warning: {over_limit} chunk(s) exceed the {MAX_INPUT_TOKENS}-token embedding input limit and will be truncated")
+
+# === VECTOR STORE ===
+def embed_dimensions():
+    """The `dimensions` to request from the embeddings API (None for full width)."""
+    return EMBED_DIM if EMBED_DIM != EMBED_NATIVE_DIM else None
+
+def pinecone_index_name(dimension):
+    """A serverless index has one fixed width, so shortened embeddings live in
+    their own index next to the full-width one."""
+    return INDEX_NAME if dimension == EMBED_NATIVE_DIM else f"{INDEX_NAME}-{dimension}"
+
+def open_vector_store(backend=VECTOR_BACKEND, namespace="", dimension=None, codec=None):
+    """The index chunks are written to: the Pinecone serverless index, or the
+    offline LocalVectorStore in LOCAL_INDEX_DIR (see vector_store.py).
+    dimension defaults to EMBED_DIM; codec (local only) to the one the
+    namespace was written with."""
+    dimension = dimension or EMBED_DIM
+    if backend == "local":
+        return LocalVectorStore(LOCAL_INDEX_DIR, dimension, ann_pq_subvectors=LOCAL_ANN_PQ_SUBVECTORS,
+                                namespace=namespace, codec=codec)
+    return PineconeVectorStore(PINECONE_API_KEY, pinecone_index_name(dimension), dimension,
+                               pool_threads=UPSERT_MAX_IN_FLIGHT, namespace=namespace)
+
+def delete_vectors(store, ids):
+    """Delete specific vectors (e.g. chunks whose source changed or vanished)"""
+    print(f"Deleting {len(ids)} stale vectors...")
+    store.delete(ids)
+    print(f"  Deleted {len(ids)} stale vectors")
+
+# === BLUE/GREEN REBUILDS ===
+# A rebuild (--reset) never touches the namespace the chat route reads. It
+# fills a fresh namespace, validates it, then flips INDEX_POINTER_PATH, which
+# the site bundles at build time, so the route switches namespaces in the
+# same deploy that ships the matching BM25 model. The old namespace is
+# deleted by a later run once NAMESPACE_GC_GRACE has passed.
+# Every run that changes the index (a rebuild or an incremental upload or
+# delete) also stamps the pointer with a new build_id, which invalidates
+# anything derived from the previous contents (QUERY_RESULTS_PATH).
+def load_index_pointer(path=None):
+    """The active index record ({"namespace": ""} before the first rebuild)."""
+    path = path or INDEX_POINTER_PATH
+    if not os.path.exists(path):
+        return {"namespace": ""}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_index_pointer(pointer):
+    tmp_path = INDEX_POINTER_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(pointer, f, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, INDEX_POINTER_PATH)
+
+def new_build_id():
+    return time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+
+def wait_for_count(store, expected, deadline):
+    """Poll store.count() until it is expected (Pinecone counts are eventually
+    consistent); raises once time.monotonic() passes deadline."""
+    while (count := store.count()) != expected:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Namespace '{store.namespace}' holds {count} vectors, expected {expected}")
+        print(f"  Waiting for the vector count to settle ({count}/{expected})...")
+        time.sleep(2)
+    return count
+
+def validate_build(store, expected, probe, timeout=BUILD_VALIDATE_TIMEOUT):
+    """Check a rebuilt namespace before it goes live: it must hold exactly
+    `expected` vectors, and a smoke query with probe (one uploaded record)
+    must return that record. Pinecone counts and queries are eventually
+    consistent, so both are polled for up to timeout seconds."""
+    deadline = time.monotonic() + timeout
+    count = wait_for_count(store, expected, deadline)
+    if probe is not None:
+        while probe["id"] not in [m["id"] for m in store.query(probe["values"], probe["sparse_values"], top_k=10)]:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Smoke query on namespace '{store.namespace}' did not return {probe['id']}")
+            print("  Waiting for the smoke query to find its chunk...")
             time.sleep(2)
-        print(f"  Index '{INDEX_NAME}' created and ready")
-    else:
-        print(f"  Index '{INDEX_NAME}' already uses dotproduct metric")
-
-def delete_all_vectors():
-    """Delete all vectors from the Pinecone index"""
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-
-    # First ensure the index uses the right metric for hybrid search
-    ensure_hybrid_index()
-
-    index = pc.Index(INDEX_NAME)
-
-    print("Deleting all existing vectors from Pinecone index...")
-
-    try:
-        stats = index.describe_index_stats()
-        total_vectors = stats.total_vector_count
-
-        if total_vectors == 0:
-            print("  Index is already empty")
-            return
-
-        print(f"  Found {total_vectors} vectors to delete")
-        index.delete(delete_all=True)
-        print(f"  Successfully deleted all vectors from index '{INDEX_NAME}'")
-
-    except Exception as e:
-        print(f"  Error deleting vectors: {e}")
-        raise
-
-# === VECTORSTORE UPLOAD ===
-def upload_to_pinecone(chunks):
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-
-    # Create embeddings for all chunks
-    texts = [doc.page_content for doc in chunks]
-    metadatas = [doc.metadata for doc in chunks]
-
-    # Get dense embeddings
-    print("Generating dense embeddings...")
-    embeds = embeddings.embed_documents(texts)
+    print(f"  Namespace '{store.namespace}' validated: {count} vectors, smoke query OK")
+
+def collect_retired_namespaces(store, retired, active, grace=NAMESPACE_GC_GRACE):
+    """Delete namespaces retired (replaced by a rebuild) at least grace
+    seconds ago. retired maps namespace -> retirement time; returns the ones
+    still kept."""
+    now = time.time()
+    kept = {}
+    for namespace, retired_at in retired.items():
+        if namespace == active:
+            continue
+        if now - retired_at < grace:
+            kept[namespace] = retired_at
+            continue
+        print(f"Deleting retired namespace '{namespace or '(default)'}'...")
+        store.with_namespace(namespace).delete_all()
+    return kept
+
+# === BM25 ===
+def open_bm25(incremental, previous_ids, previous_footprints):
+    """Choose how this run's BM25 statistics are built. Returns (bm25, online):
+
+    online=True  - the exported model; only added chunks are fed to it and
+                   removed ones are taken out by their manifest footprints.
+    online=False - an empty model that every chunk is fed to. In incremental
+                   mode it reuses the exported vocab so term indices stay
+                   stable for the sparse vectors of chunks we don't re-upload.
+                   Their sparse values were scored with the previous IDF;
+                   run --reset to re-encode everything when the corpus has
+                   shifted a lot.
+    """
+    previous = SimpleBM25.load(BM25_MODEL_PATH) if incremental and os.path.exists(BM25_MODEL_PATH) else None
+    if previous is not None:
+        if previous.n_docs and not previous.doc_freq:
+            print("Exported BM25 model has no document frequencies - refitting.")
+        elif previous.n_docs != len(previous_ids) or any(cid not in previous_footprints for cid in previous_ids):
+            print("BM25 model is out of sync with the chunk manifest - refitting.")
+        else:
+            return previous, True
 
-    # Fit BM25 and generate sparse vectors
-    print("Fitting BM25 model...")
     bm25 = SimpleBM25(k1=1.2, b=0.75)
-    bm25.fit(texts)
+    if previous is not None:
+        bm25.inherit_vocab(previous)
+    return bm25, False
+
+def scan_chunks(chunks, bm25, previous_ids, add_all, dedup=None, report=None, texts=None, spill=None):
+    """First pass over the streamed chunks: assign IDs and feed BM25
+    statistics in PIPELINE_SLICE batches, without keeping any chunk text.
+
+    Every chunk is added to bm25 when add_all, otherwise only new ones.
+    With a ChunkDeduplicator, chunks whose text duplicates an earlier chunk
+    are left out entirely; duplicates maps each canonical chunk's ID to the
+    (id, metadata) of the chunks folded into it.
+    Dedup checks and BM25 updates are timed as report's "dedup" and
+    "bm25_add" stages. Every kept chunk's text is added to texts (a
+    ContentStoreWriter) and its [id, metadata] written to spill (a text
+    file, one JSON line per chunk), if given; with both, pass 2 reads the
+    chunks it uploads back instead of loading and chunking the corpus again.
+    Returns (ids, sources, new_ids, footprints of the added chunks, duplicates).
+    """
+    report = report or RunReport()
+    ids, sources, new_ids, footprints, duplicates = [], {}, [], {}, {}
+    pending_ids, pending_texts = [], []
+
+    def add_pending():
+        with report.stage("bm25_add", items=len(pending_texts)):
+            for cid, footprint in zip(pending_ids, bm25.add_documents(pending_texts)):
+                footprints[cid] = pack_footprint(footprint)
+        pending_ids.clear()
+        pending_texts.clear()
+
+    for cid, chunk in iter_manifest(chunks):
+        canonical = None
+        if dedup is not None:
+            with report.stage("dedup", items=1):
+                canonical = dedup.check(cid, chunk.page_content)
+        if canonical is not None:
+            duplicates.setdefault(canonical, []).append((cid, chunk.metadata))
+            continue
+        ids.append(cid)
+        sources.setdefault(source_key(chunk.metadata), []).append(cid)
+        if texts is not None:
+            with report.stage("text_store", items=1):
+                texts.add(cid, chunk.page_content)
+        if spill is not None:
+            spill.write(json.dumps([cid, chunk.metadata], default=str) + "\n")
+        is_new = cid not in previous_ids
+        if is_new:
+            new_ids.append(cid)
+        if add_all or is_new:
+            pending_ids.append(cid)
+            pending_texts.append(chunk.page_content)
+            if len(pending_texts) >= PIPELINE_SLICE:
+                add_pending()
+    if pending_texts:
+        add_pending()
+    return ids, sources, new_ids, footprints, duplicates
+
+def print_dedup_report(dedup, duplicates, remerged):
+    folded = dedup.exact_duplicates + dedup.near_duplicates
+    near = f"{dedup.near_duplicates} near at >= {dedup.threshold:.0%} similarity" if dedup.threshold is not None else "near off"
+    print(f"Dedup: {folded} duplicate chunk(s) folded into {len(duplicates)} kept chunk(s) "
+          f"({dedup.exact_duplicates} exact, {near})")
+    if remerged:
+        print(f"   {len(remerged)} unchanged chunk(s) re-uploaded because their merged metadata changed")
+
+def finish_bm25(bm25, stale_footprints, prune_options=None):
+    """Take removed chunks out of the statistics and prune."""
+    if stale_footprints:
+        bm25.remove_documents(footprints=[unpack_footprint(fp) for fp in stale_footprints])
+    pruned = bm25.prune(**(prune_options or {}))
+    print(f"  BM25: {bm25.n_docs} docs, {len(bm25.idf)} terms"
+          f"{f', {pruned} pruned' if pruned else ''}, avgdl={bm25.avgdl:.1f}")
+
+def export_bm25(bm25):
+    """Write the model for later update runs and the chat route. Only called
+    once the vectors it encoded are live, so the route never pairs a
+    rebuilt namespace's vocabulary with the namespace it still reads."""
     bm25.save(BM25_MODEL_PATH)
+    bm25.save_binary(BM25_BINARY_PATH)
+    bm25.save_query(BM25_QUERY_PATH)
+
+def save_bm25_baseline(bm25):
+    with open(BM25_BASELINE_PATH, "w", encoding="utf-8") as f:
+        json.dump(bm25.stats_snapshot(), f)
+
+def report_bm25_drift(bm25):
+    """Print how far the stored sparse vectors have drifted from the current
+    BM25 statistics since the last full encode (--reset)."""
+    if not os.path.exists(BM25_BASELINE_PATH):
+        return
+    with open(BM25_BASELINE_PATH, "r", encoding="utf-8") as f:
+        drift = bm25.drift(json.load(f))
+    print(f"BM25 drift since last full encode: {drift:.1%}")
+    if drift > BM25_DRIFT_THRESHOLD:
+        print(f"   Above {BM25_DRIFT_THRESHOLD:.0%}: stored sparse vectors are out of date, "
+              "run with --reset to re-encode them")
 
-    print("Generating sparse vectors...")
-    sparse_vectors = [bm25.encode_document(text) for text in texts]
+# === VECTORSTORE UPLOAD ===
+def pack_upsert_batches(records, max_bytes=UPSERT_MAX_BYTES, max_vectors=UPSERT_MAX_VECTORS):
+    """Group vector records into upsert requests bounded by JSON payload size
+    (chunk text and metadata vary a lot in size, so a fixed count doesn't)."""
+    batch, batch_bytes = [], 0
+    for record in records:
+        record_bytes = len(json.dumps(record, default=lambda values: values.tolist()))  # ndarray vectors
+        if batch and (batch_bytes + record_bytes > max_bytes or len(batch) >= max_vectors):
+            yield batch, batch_bytes
+            batch, batch_bytes = [], 0
+        batch.append(record)
+        batch_bytes += record_bytes
+    if batch:
+        yield batch, batch_bytes
+
+def upload_to_pinecone(id_chunks, total, bm25, store, embed_cache=None, embed_concurrency=EMBED_CONCURRENCY,
+                       report=None, include_text=True, sparse_prune=None):
+    """Embed, sparse-encode and upsert chunks into store as a streaming pipeline.
+
+    id_chunks is an iterable of (id, chunk) pairs (total of them), consumed
+    lazily in slices of PIPELINE_SLICE: while the upserts for one slice are
+    in flight on the index's thread pool, the next slice is being chunked
+    and embedded. At most UPSERT_MAX_IN_FLIGHT requests are outstanding, so
+    only a couple of slices' worth of chunks and vectors are ever held in memory.
+
+    Embedding, sparse encoding and upserting (packing, sending and waiting on
+    requests) are timed as report stages, with token, cost and payload counters.
+    With include_text=False the chunk text stays out of the metadata (it is
+    in the content store). sparse_prune thins each sparse vector (see
+    bm25.sparsify).
+    Returns the first uploaded record (for a smoke query), or None.
+    """
+    report = report or RunReport()
+    embeddings = BatchedEmbedder(EMBED_MODEL, dimensions=embed_dimensions(), max_batch_tokens=EMBED_BATCH_TOKENS,
+                                 max_concurrency=embed_concurrency)
+
+    in_flight = deque()
+    probe = None
+    requests_sent = 0
+    bytes_sent = 0
+    uploaded = 0
 
-    # Prepare data for Pinecone
-    index = pc.Index(INDEX_NAME)
-    batch_size = 100
+    print(f"Uploading {total} chunks to the index (hybrid: dense + sparse), "
+          f"{PIPELINE_SLICE} chunks per slice, up to {UPSERT_MAX_IN_FLIGHT} upserts in flight...")
 
-    print(f"Uploading {len(chunks)} chunks to Pinecone (hybrid: dense + sparse) in batches of {batch_size}...")
+    id_chunks = iter(id_chunks)
+    while True:
+        slice_pairs = list(islice(id_chunks, PIPELINE_SLICE))
+        if not slice_pairs:
+            break
+        slice_ids = [cid for cid, _ in slice_pairs]
+        slice_chunks = [chunk for _, chunk in slice_pairs]
+        texts = [doc.page_content for doc in slice_chunks]
 
-    for i in range(0, len(chunks), batch_size):
-        batch_texts = texts[i:i + batch_size]
-        batch_embeds = embeds[i:i + batch_size]
-        batch_metadatas = metadatas[i:i + batch_size]
-        batch_sparse = sparse_vectors[i:i + batch_size]
+        # Dense embeddings (cached vectors are reused, only misses hit the API)
+        with report.stage("embed", items=len(texts)):
+            embeds = embed_with_cache(texts, embeddings, embed_cache)
+        with report.stage("sparse_encode", items=len(texts)):
+            sparse_vectors = bm25.encode_documents(texts, **(sparse_prune or {}))
 
         # Create vector records with both dense and sparse values
-        vectors_to_upsert = []
-        for j, (text, vector, metadata, sparse) in enumerate(zip(batch_texts, batch_embeds, batch_metadatas, batch_sparse)):
-            vector_id = f"vec_{i + j}"
-            metadata_with_text = metadata.copy()
-            metadata_with_text["text"] = text
-            vectors_to_upsert.append({
+        records = []
+        for vector_id, doc, vector, sparse in zip(slice_ids, slice_chunks, embeds, sparse_vectors):
+            metadata = doc.metadata.copy()
+            if include_text:
+                metadata["text"] = doc.page_content
+            records.append({
                 "id": vector_id,
                 "values": vector,
                 "sparse_values": sparse,
-                "metadata": metadata_with_text,
+                "metadata": metadata,
             })
-
-        # Upsert to Pinecone
-        index.upsert(vectors=vectors_to_upsert)
-
-        print(f"Uploaded batch {i // batch_size + 1}/{(len(chunks) - 1) // batch_size + 1}")
-
-    print(f"Successfully uploaded {len(chunks)} hybrid chunks to Pinecone.")
+        if probe is None and records:
+            probe = records[0]
+
+        with report.stage("upsert", items=len(records)):
+            for batch, batch_bytes in pack_upsert_batches(records):
+                # Bound memory: wait for the oldest request before sending another
+                while len(in_flight) >= UPSERT_MAX_IN_FLIGHT:
+                    in_flight.popleft().get()
+                in_flight.append(store.upsert_async(batch))
+                requests_sent += 1
+                bytes_sent += batch_bytes
+
+        uploaded += len(slice_chunks)
+        print(f"Queued {uploaded}/{total} chunks "
+              f"({requests_sent} upsert requests, {bytes_sent / 1e6:.1f} MB)")
+
+    with report.stage("upsert"):
+        while in_flight:
+            in_flight.popleft().get()
+
+    if embed_cache is not None:
+        embed_cache.save()
+        report.count("embed_cache_hits", embed_cache.hits)
+        report.count("embed_cache_misses", embed_cache.misses)
+    report.count("embedding_tokens", embeddings.total_tokens)
+    report.count("embedding_api_calls", embeddings.api_calls)
+    report.count("embedding_cost_usd", embeddings.total_tokens * EMBED_PRICE_PER_MILLION / 1e6)
+    report.count("upsert_requests", requests_sent)
+    report.count("upsert_bytes", bytes_sent)
+    report.count("upsert_vectors", uploaded)
+
+    print(f"Successfully uploaded {uploaded} hybrid chunks to the index "
+          f"in {requests_sent} requests ({bytes_sent / 1e6:.1f} MB).")
+    return probe
+
+# === KNOWN QUERIES ===
+def export_known_queries(bm25, store=None, build_id=None, use_embed_cache=True, report=None):
+    """Embed and BM25-encode the chat suggestions and bench-chat defaults into
+    QUERY_EMBEDDINGS_PATH (see known_queries.py), so the route can skip the
+    embeddings call for them. Cached query vectors cost nothing to re-export.
+
+    With a store and the index's build_id, the queries are also run against
+    it (hybrid, like the route) and the matches written to QUERY_RESULTS_PATH,
+    so the route answers their retrieval without calling Pinecone at all."""
+    report = report or RunReport()
+    queries = load_known_queries()
+    if not queries:
+        return
+    with report.stage("known_queries", items=len(queries)):
+        embedder = BatchedEmbedder(EMBED_MODEL, dimensions=embed_dimensions(), max_batch_tokens=EMBED_BATCH_TOKENS)
+        cache = EmbeddingCache(EMBED_CACHE_DIR, EMBED_MODEL, EMBED_DIM, EMBED_CACHE_MAX_ENTRIES,
+                               EMBED_CACHE_CODEC) if use_embed_cache else None
+        vectors = embed_with_cache(queries, embedder, cache)
+        if cache is not None:
+            cache.save()
+        size = export_query_embeddings(QUERY_EMBEDDINGS_PATH, queries, vectors, bm25, EMBED_MODEL, EMBED_DIM)
+    report.count("embedding_tokens", embedder.total_tokens)
+    report.count("embedding_api_calls", embedder.api_calls)
+    report.count("embedding_cost_usd", embedder.total_tokens * EMBED_PRICE_PER_MILLION / 1e6)
+    print(f"Exported {len(queries)} known query vectors to {QUERY_EMBEDDINGS_PATH} ({size / 1e3:.0f} KB)")
+    if store is None or build_id is None:
+        return
+    with report.stage("known_query_results", items=len(queries)):
+        results = [store.query(vector, bm25.encode_query(text), top_k=QUERY_RESULTS_TOP_K)
+                   for text, vector in zip(queries, vectors)]
+        size = export_query_results(QUERY_RESULTS_PATH, queries, results, build_id, store.namespace,
+                                    QUERY_RESULTS_TOP_K)
+    print(f"Exported their retrieval results for build {build_id} to {QUERY_RESULTS_PATH} ({size / 1e3:.0f} KB)")
+
+# === RUN REPORT ===
+def close_run_report(report, path=None):
+    """Write stage profiles, print the stage summary and save the JSON report."""
+    report.write_profiles()
+    report.print_summary()
+    if path:
+        report.save(path)
 
 # === MAIN ===
-def main(reset=False, skip_confirm=False):
+def main(reset=False, skip_confirm=False, use_embed_cache=True, embed_concurrency=EMBED_CONCURRENCY,
+         bm25_prune=None, loader_processes=LOADER_PROCESSES, chunk_sizing=CHUNK_SIZING,
+         dedup_threshold=DEDUP_THRESHOLD, backend=VECTOR_BACKEND, report_path=None,
+         profile_stages=(), profiler="cprofile", text_store=TEXT_STORE, embed_dim=EMBED_DIM,
+         vector_codec=LOCAL_VECTOR_CODEC, sparse_prune=None):
     """
     Main function to load documents and upload to Pinecone
 
     Args:
-        reset (bool): If True, delete all existing vectors before uploading
+        reset (bool): If True, rebuild every vector into a fresh namespace and switch
+            the chat route over to it once it is validated
+        use_embed_cache (bool): If True, reuse embeddings from EMBED_CACHE_DIR
+        embed_concurrency (int): Max embedding requests in flight at once
+        bm25_prune (dict): BM25 vocabulary pruning options (min_df, max_df, max_vocab, min_idf)
+        loader_processes (int): Worker processes for parsing source files (<= 1 parses inline)
+        chunk_sizing (str): "chars" or "tokens" - what splitter chunk sizes are measured in
+        dedup_threshold (float): Similarity at which chunks are folded together as
+            near-duplicates (None turns chunk dedup off)
+        backend (str): "pinecone", or "local" to index into LOCAL_INDEX_DIR without network
+        report_path (str): Write the JSON run report (per-stage timings, memory, tokens,
+            cost, upsert payload) here; the summary is printed either way
+        profile_stages (list): Stage names to profile into PROFILE_DIR
+        profiler (str): "cprofile" or "pyinstrument" (optional dependency)
+        text_store (bool): Upload chunks without their text; the chat route reads it from
+            CHUNK_TEXTS_PATH, which is written on every run either way
+        embed_dim (int): Embedding width (one of EMBED_DIM_CHOICES); changing it rebuilds
+            the index, into its own Pinecone index when shortened
+        vector_codec (str): Dense storage codec of the local backend: "float32", "int8" or
+            "binary" (see quantization.py); changing it rebuilds the local index
+        sparse_prune (dict): Per-document sparse vector pruning (max_terms, mass, levels; see
+            bm25.sparsify), applied to the chunks encoded in this run
     """
+    global TRACKING_FILE, BM25_MODEL_PATH, BM25_BINARY_PATH, BM25_BASELINE_PATH, INDEX_POINTER_PATH, CHUNK_TEXTS_PATH
+    global BM25_QUERY_PATH, QUERY_EMBEDDINGS_PATH, QUERY_RESULTS_PATH, EMBED_DIM, LOCAL_VECTOR_CODEC
     # Parse command-line arguments if called from command line
     parser = argparse.ArgumentParser(
         description='Upload documents to Pinecone for RAG system',
@@ -783,34 +1370,232 @@ def main(reset=False, skip_confirm=False):
         epilog="""
 Examples:
   python create-pinecone.py              # Normal update mode (incremental)
-  python create-pinecone.py --reset      # Delete all vectors and re-upload everything
+  python create-pinecone.py --reset      # Rebuild everything into a new namespace, then switch to it
   python create-pinecone.py -r           # Same as --reset (shorthand)
         """
     )
     parser.add_argument(
         '--reset', '-r',
         action='store_true',
-        help='Delete all existing vectors before uploading (fresh start)'
+        help='Re-upload everything into a fresh namespace and switch the chat route to it '
+             'once validated (the live namespace keeps serving until then)'
     )
     parser.add_argument(
         '--yes', '-y',
         action='store_true',
         help='Skip confirmation prompts (for CI/CD usage)'
     )
+    parser.add_argument(
+        '--no-embed-cache',
+        action='store_true',
+        help=f'Re-embed every chunk instead of reusing vectors cached in {EMBED_CACHE_DIR}/'
+    )
+    parser.add_argument(
+        '--embed-concurrency',
+        type=int,
+        default=embed_concurrency,
+        help=f'Max embedding requests in flight at once (default: {EMBED_CONCURRENCY})'
+    )
+    parser.add_argument(
+        '--loader-processes',
+        type=int,
+        default=loader_processes,
+        help=f'Worker processes for parsing YAML/markdown sources (default: {LOADER_PROCESSES}; 1 parses inline)'
+    )
+    parser.add_argument(
+        '--chunk-sizing',
+        choices=['chars', 'tokens'],
+        default=chunk_sizing,
+        help=f'Measure chunk size/overlap in characters or embedding tokens (default: {CHUNK_SIZING}). '
+             'Switching changes every chunk, so everything is re-embedded once'
+    )
+    parser.add_argument(
+        '--backend',
+        choices=['pinecone', 'local'],
+        default=backend,
+        help=f'Index to write to (default: {VECTOR_BACKEND}). "local" builds an offline '
+             f'stand-in in {LOCAL_INDEX_DIR}/ with its own manifest and BM25 model'
+    )
+    parser.add_argument(
+        '--dedup-threshold',
+        type=float,
+        default=dedup_threshold,
+        help=f'Fold chunks whose estimated word-shingle Jaccard similarity is at least this '
+             f'into one vector (default: {DEDUP_THRESHOLD}; exact duplicates are always folded)'
+    )
+    parser.add_argument(
+        '--no-dedup',
+        action='store_true',
+        help='Embed and store duplicate chunks separately'
+    )
+    parser.add_argument(
+        '--text-store',
+        action='store_true',
+        help=f'Keep chunk text out of the vector metadata; the chat route reads it from '
+             f'{os.path.basename(CHUNK_TEXTS_PATH)}. Chunks uploaded before the switch keep their text'
+    )
+    parser.add_argument(
+        '--bm25-min-df',
+        type=int,
+        default=1,
+        help='Drop BM25 terms that appear in fewer than N chunks (default: 1, keep all)'
+    )
+    parser.add_argument(
+        '--bm25-max-df',
+        type=float,
+        default=1.0,
+        help='Drop BM25 terms that appear in more than this fraction of chunks (default: 1.0)'
+    )
+    parser.add_argument(
+        '--bm25-max-vocab',
+        type=int,
+        default=None,
+        help='Keep only the N most frequent BM25 terms (default: no limit)'
+    )
+    parser.add_argument(
+        '--bm25-min-idf',
+        type=float,
+        default=0.0,
+        help='Drop BM25 terms whose IDF is below this floor (default: 0.0)'
+    )
+    parser.add_argument(
+        '--sparse-max-terms',
+        type=int,
+        default=None,
+        help='Keep only the N highest-scoring terms of each chunk\'s sparse vector (default: all)'
+    )
+    parser.add_argument(
+        '--sparse-mass',
+        type=float,
+        default=1.0,
+        help='Keep the fewest terms carrying this fraction of each chunk\'s BM25 mass (default: 1.0, all)'
+    )
+    parser.add_argument(
+        '--sparse-levels',
+        type=int,
+        default=0,
+        help='Quantize sparse values to N levels per chunk (default: 0, exact). The sparse options '
+             'only apply to chunks encoded in this run; add --reset to re-encode everything. '
+             'See bench-bm25.py --sparse-report'
+    )
+    parser.add_argument(
+        '--dimensions',
+        type=int,
+        choices=EMBED_DIM_CHOICES,
+        default=embed_dim,
+        help=f'Embedding width (default: {EMBED_DIM}). Shorter vectors cut storage, upsert bytes '
+             f'and query latency; compare their recall first with bench-retrieval.py --dimensions. '
+             f'Changing it triggers a full rebuild'
+    )
+    parser.add_argument(
+        '--vector-codec',
+        choices=CODECS,
+        default=vector_codec,
+        help=f'How the local backend stores dense vectors (default: {LOCAL_VECTOR_CODEC}): int8 is ~4x '
+             f'smaller, binary ~32x smaller to scan with int8 rescoring. See bench-quantization.py'
+    )
+    parser.add_argument(
+        '--report',
+        metavar='PATH',
+        default=report_path,
+        help='Write a JSON run report with per-stage wall/CPU time, peak memory, throughput, '
+             'embedding tokens and cost, and upsert payload sizes'
+    )
+    parser.add_argument(
+        '--profile',
+        metavar='STAGE',
+        action='append',
+        default=list(profile_stages),
+        help=f'Profile a stage (e.g. chunk, dedup, bm25_add, embed, sparse_encode, upsert) '
+             f'into {PROFILE_DIR}/; repeatable'
+    )
+    parser.add_argument(
+        '--profiler',
+        choices=['cprofile', 'pyinstrument'],
+        default=profiler,
+        help='Profiler used by --profile (default: cprofile)'
+    )
 
     # Only parse args if running as main script
     if __name__ == "__main__":
         args = parser.parse_args()
         reset = args.reset or reset
         skip_confirm = args.yes or skip_confirm
+        use_embed_cache = use_embed_cache and not args.no_embed_cache
+        embed_concurrency = args.embed_concurrency
+        loader_processes = args.loader_processes
+        chunk_sizing = args.chunk_sizing
+        dedup_threshold = None if args.no_dedup else args.dedup_threshold
+        backend = args.backend
+        report_path = args.report
+        profile_stages = args.profile
+        profiler = args.profiler
+        text_store = args.text_store or text_store
+        embed_dim = args.dimensions
+        vector_codec = args.vector_codec
+        bm25_prune = {
+            "min_df": args.bm25_min_df,
+            "max_df": args.bm25_max_df,
+            "max_vocab": args.bm25_max_vocab,
+            "min_idf": args.bm25_min_idf,
+        }
+        sparse_prune = {
+            "max_terms": args.sparse_max_terms,
+            "mass": args.sparse_mass,
+            "levels": args.sparse_levels,
+        }
 
     print("=" * 60)
     print("Pinecone RAG Document Upload")
     print("=" * 60)
 
+    if backend == "local":
+        # The local index keeps its own manifest and BM25 model so it never
+        # touches the ones that describe the Pinecone index and the chat route.
+        print(f"Backend: local index in {LOCAL_INDEX_DIR}/")
+        TRACKING_FILE = os.path.join(LOCAL_INDEX_DIR, "tracking.json")
+        BM25_MODEL_PATH = os.path.join(LOCAL_INDEX_DIR, "bm25-model.json")
+        BM25_BINARY_PATH = os.path.join(LOCAL_INDEX_DIR, "bm25-model.bin")
+        BM25_QUERY_PATH = os.path.join(LOCAL_INDEX_DIR, "bm25-query.json")
+        BM25_BASELINE_PATH = os.path.join(LOCAL_INDEX_DIR, "bm25-baseline.json")
+        INDEX_POINTER_PATH = os.path.join(LOCAL_INDEX_DIR, "rag-index.json")
+        CHUNK_TEXTS_PATH = os.path.join(LOCAL_INDEX_DIR, "chunk-texts.bin")
+        QUERY_EMBEDDINGS_PATH = os.path.join(LOCAL_INDEX_DIR, "query-embeddings.json")
+        QUERY_RESULTS_PATH = os.path.join(LOCAL_INDEX_DIR, "query-results.json")
+        os.makedirs(LOCAL_INDEX_DIR, exist_ok=True)
+    EMBED_DIM = embed_dim
+    LOCAL_VECTOR_CODEC = vector_codec
+    pointer = load_index_pointer()
+    live_dim = pointer.get("dimension", EMBED_NATIVE_DIM)
+    store = open_vector_store(backend, pointer["namespace"], live_dim)
+    live_codec = store.codec if backend == "local" else None
+    # Nothing deployed reads the local index, so it needs no grace period.
+    gc_grace = 0 if backend == "local" else NAMESPACE_GC_GRACE
+    report = RunReport(profile_stages, profiler, PROFILE_DIR)
+
+    print("Loading tracking data...")
+    tracking_data = load_tracking()
+    previous_sources = tracking_data.get("sources")
+    retired = collect_retired_namespaces(store, tracking_data.get("retired_namespaces", {}), store.namespace, gc_grace)
+
+    if not reset and previous_sources is None:
+        # Vectors written before the manifest existed have positional IDs we
+        # can't diff against, so the first run has to start from scratch.
+        print("\nNo chunk manifest found in tracking.json - falling back to a full rebuild.")
+        reset = True
+    elif not reset and live_dim != EMBED_DIM:
+        print(f"\nThe index holds {live_dim}-dim vectors and {EMBED_DIM} were asked for - "
+              "falling back to a full rebuild.")
+        reset = True
+    elif not reset and backend == "local" and live_codec != LOCAL_VECTOR_CODEC:
+        print(f"\nThe local index stores {live_codec} vectors and {LOCAL_VECTOR_CODEC} were asked for - "
+              "falling back to a full rebuild.")
+        reset = True
+
     if reset:
-        print("\nWARNING: RESET MODE - All existing vectors will be deleted!")
-        print("   This will clear your entire Pinecone index.")
+        print("\nRESET MODE - every chunk will be re-embedded into a new namespace.")
+        print(f"   The chat route keeps reading namespace '{store.namespace or '(default)'}' until the "
+              "new one is validated; the old one is deleted afterwards.")
 
         # Ask for confirmation (skip in CI with --yes)
         if not skip_confirm:
@@ -820,42 +1605,265 @@ Examples:
                 return
 
         print()
-        delete_all_vectors()
+        live_store = store
+        build_id = new_build_id()
+        store = open_vector_store(backend, f"build-{build_id}", codec=LOCAL_VECTOR_CODEC)
+        print(f"Building namespace '{store.namespace}'...")
+        store.ensure_index()
         print()
+        previous_sources = {}
     else:
         print("\nRunning in UPDATE mode (incremental)")
+        print("   Only added/changed chunks are embedded; removed chunks are deleted")
         print("   Use --reset flag to delete all vectors first\n")
 
-    print("Loading tracking data...")
-    tracking_data = load_tracking()
-
-    print("Loading local text files...")
-    text_docs = load_text_files()
-
-    # print("Fetching and loading GitHub repositories...")
-    # repo_urls = get_user_repos(GITHUB_USERNAME, GITHUB_TOKEN)
-    # github_docs, new_tracking = load_github_repos(repo_urls, tracking_data)
-
-    # all_docs = text_docs + github_docs
-    all_docs = text_docs
-    print(f"Total new/updated documents: {len(all_docs)}")
-
-    print("Splitting documents into chunks...")
-    chunks = chunk_documents(all_docs)
+    # A rebuild's namespace is deleted unless it is validated and switched to.
+    try:
+        previous_ids = {cid for source_ids in previous_sources.values() for cid in source_ids}
+        previous_footprints = tracking_data.get("bm25_footprints", {}) if not reset else {}
+        previous_merged = tracking_data.get("duplicates", {}) if not reset else {}
+
+        # BM25 statistics are corpus-wide. In update mode they are adjusted for
+        # just the added/removed chunks; otherwise every chunk is counted.
+        bm25, online = open_bm25(not reset, previous_ids, previous_footprints)
+
+        # A GitHub file whose blob SHA is unchanged isn't read when its chunks
+        # can be carried over as they are: their IDs and footprints come from
+        # the manifest and their texts from the last chunk text store. That
+        # needs online BM25 statistics (a refit counts every chunk's text).
+        # Dedup only sees streamed chunks, so files with chunks that had
+        # duplicates folded into them are always read.
+        previous_texts = None
+        if online and os.path.exists(CHUNK_TEXTS_PATH):
+            try:
+                previous_texts = ContentStore(CHUNK_TEXTS_PATH)
+            except Exception as e:
+                print(f"Can't read {CHUNK_TEXTS_PATH} ({e}) - every GitHub file will be loaded.")
+
+        def can_skip(file_path):
+            cids = previous_sources.get(source_key({"file_path": file_path}))
+            return bool(cids) and all(cid in previous_texts and cid not in previous_merged for cid in cids)
+
+        carried_sources = {}
+
+        def load_chunks(stats=None):
+            # Documents stream from the loaders straight into the chunker.
+            text_docs = stream_documents(processes=loader_processes, report=report)
+
+            github_docs = []
+            if GITHUB_USERNAME:
+                print("Fetching and loading GitHub repositories...")
+                previous_github = tracking_data.get("github", {})
+                with report.stage("load:github") as step:
+                    try:
+                        repo_urls = get_user_repos(GITHUB_USERNAME, GITHUB_TOKEN,
+                                                   tracking_data.setdefault("github_listing", {}))
+                    except Exception as e:
+                        print(f"  {e} - keeping the previously indexed repos")
+                        repo_urls = [f"https://github.com/{GITHUB_USERNAME}/{name}.git" for name in previous_github]
+                    github_docs, tracking_data["github"], skipped = load_github_repos(
+                        repo_urls, previous_github, can_skip if previous_texts is not None else None)
+                    step["items"] = len(github_docs)
+                for file_path in skipped:
+                    key = source_key({"file_path": file_path})
+                    carried_sources[key] = previous_sources[key]
+            else:
+                print("GITHUB_USERNAME is not set - skipping GitHub repositories.")
+
+            return iter_chunks(chain(text_docs, github_docs), chunk_sizing, stats, report)
+        report.settings = {
+            "backend": backend, "mode": "reset" if reset else "update", "bm25_online": online,
+            "chunk_sizing": chunk_sizing, "dedup_threshold": dedup_threshold, "bm25_prune": bm25_prune,
+            "sparse_prune": sparse_prune,
+            "embed_model": EMBED_MODEL, "embed_dim": EMBED_DIM, "embed_cache": use_embed_cache,
+            "embed_cache_codec": EMBED_CACHE_CODEC, "vector_codec": LOCAL_VECTOR_CODEC if backend == "local" else None,
+            "embed_concurrency": embed_concurrency,
+            "loader_processes": loader_processes, "pipeline_slice": PIPELINE_SLICE, "text_store": text_store,
+        }
 
-    if chunks:
-        print("Uploading to Pinecone...")
-        upload_to_pinecone(chunks)
+        # Pass 1: stream every chunk to assign IDs and build BM25 statistics.
+        # Only IDs and footprints are kept, never the chunk text.
+        print("Scanning documents and chunks...")
+        chunk_stats = new_chunk_stats()
+        dedup = ChunkDeduplicator(dedup_threshold) if dedup_threshold is not None else None
+        # Written on every run, so the route can read any chunk's text whichever
+        # way its vector was uploaded.
+        texts = ContentStoreWriter(CHUNK_TEXTS_PATH, CHUNK_TEXTS_CODEC)
+        # Kept chunks' metadata, for pass 2 to pair with their stored texts.
+        spill = tempfile.TemporaryFile("w+", encoding="utf-8")
+        try:
+            with report.stage("scan") as step:
+                ids, sources, new_ids, added_footprints, duplicates = scan_chunks(
+                    load_chunks(chunk_stats), bm25, previous_ids, add_all=not online, dedup=dedup,
+                    report=report, texts=texts, spill=spill)
+                step["items"] = len(chunk_stats["tokens"])
+            for key, cids in carried_sources.items():
+                sources[key] = cids
+                ids.extend(cids)
+                for cid in cids:
+                    texts.add(cid, previous_texts.get(cid))
+        except BaseException:
+            texts.abort()
+            spill.close()
+            raise
+        if previous_texts is not None:
+            previous_texts.close()  # Before the new store replaces the file
+        text_store_bytes = texts.close()
+        print(f"Chunk texts: {len(texts.chunks)} chunks, {texts.raw_bytes / 1e6:.2f} MB -> "
+              f"{text_store_bytes / 1e6:.2f} MB ({texts.codec}) in {CHUNK_TEXTS_PATH}")
+        report.count("text_store_raw_bytes", texts.raw_bytes)
+        report.count("text_store_bytes", text_store_bytes)
+        print_chunk_report(chunk_stats, chunk_sizing)
+        stale_ids = sorted(previous_ids - set(ids))
+
+        # A kept chunk's stored metadata includes what was merged in from its
+        # duplicates, so it is re-uploaded whenever that set changes.
+        merged = {cid: [dup_id for dup_id, _ in dups] for cid, dups in duplicates.items()}
+        new_id_set = set(new_ids)
+        remerged = [cid for cid in ids
+                    if cid not in new_id_set and merged.get(cid, []) != previous_merged.get(cid, [])]
+        if dedup is not None:
+            print_dedup_report(dedup, duplicates, remerged)
+        carried = sum(len(cids) for cids in carried_sources.values())
+        print(f"Chunks: {len(ids)} total, {len(new_ids)} new/changed, {len(stale_ids)} removed"
+              f"{f', {carried} carried over from unchanged GitHub files' if carried else ''}")
+        report.count("chunks_scanned", len(chunk_stats["tokens"]))
+        report.count("chunk_tokens", sum(chunk_stats["tokens"]))
+        report.count("chunks_kept", len(ids))
+        report.count("chunks_new", len(new_ids))
+        report.count("chunks_removed", len(stale_ids))
+        report.count("chunks_carried", carried)
+        report.count("chunks_folded", len(chunk_stats["tokens"]) + carried - len(ids))
+
+        if not new_ids and not stale_ids and not remerged:
+            spill.close()
+            print("Index is already up to date.")
+            # The known queries may still have changed; encode them with the
+            # exported model (this run's statistics weren't saved).
+            # The index is unchanged, so results stay stamped with its build ID.
+            if os.path.exists(BM25_MODEL_PATH):
+                bm25 = SimpleBM25.load(BM25_MODEL_PATH)
+                if not os.path.exists(BM25_QUERY_PATH):
+                    bm25.save_query(BM25_QUERY_PATH)  # Models exported before the route's query-only file
+                export_known_queries(bm25, store, load_index_pointer().get("build_id"), use_embed_cache, report)
+            close_run_report(report, report_path)
+            return
 
-        # print("Updating tracking file...")
-        # tracking_data.update(new_tracking)
-        # save_tracking(tracking_data)
+        print("Updating BM25 model...")
+        with report.stage("bm25_finish"):
+            finish_bm25(bm25, [previous_footprints[cid] for cid in stale_ids] if online else [], bm25_prune)
+        if online:
+            footprints = {cid: previous_footprints[cid] for cid in ids if cid in previous_ids}
+            footprints.update(added_footprints)
+        else:
+            footprints = added_footprints
+
+        # Pass 2: embed/upsert just the new chunks (plus kept chunks whose merged
+        # duplicate metadata changed). Pass 1 left every kept chunk's text in the
+        # content store and its metadata in the spill, so the sources are not
+        # loaded and chunked a second time.
+        upload_ids = new_ids + remerged
+        probe = None
+        if upload_ids:
+            embed_cache = EmbeddingCache(EMBED_CACHE_DIR, EMBED_MODEL, EMBED_DIM, EMBED_CACHE_MAX_ENTRIES,
+                                         EMBED_CACHE_CODEC) if use_embed_cache else None
+            upload_set = set(upload_ids)
+
+            def new_chunks():
+                chunk_texts = ContentStore(CHUNK_TEXTS_PATH)
+                spill.seek(0)
+                for line in spill:
+                    cid, metadata = json.loads(line)
+                    if cid in upload_set:
+                        if cid in duplicates:
+                            metadata = merge_metadata(metadata, [meta for _, meta in duplicates[cid]])
+                        yield cid, Document(page_content=chunk_texts.get(cid), metadata=metadata)
+
+            print("Uploading to Pinecone...")
+            with report.stage("upload", items=len(upload_ids)):
+                probe = upload_to_pinecone(new_chunks(), len(upload_ids), bm25, store,
+                                   embed_cache=embed_cache, embed_concurrency=embed_concurrency, report=report,
+                                   include_text=not text_store, sparse_prune=sparse_prune)
+        spill.close()
+
+        if stale_ids:
+            with report.stage("delete", items=len(stale_ids)):
+                delete_vectors(store, stale_ids)
+        with report.stage("store_save"):
+            store.save()
+
+        vector_count = sum(len(src_ids) for src_ids in sources.values())
+        if reset:
+            print("Validating the rebuilt namespace...")
+            with report.stage("validate"):
+                validate_build(store, vector_count, probe)
+            pointer = {
+                "namespace": store.namespace,
+                "build_id": build_id,
+                "dimension": EMBED_DIM,
+                "vectors": vector_count,
+                "activated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            }
+            if backend == "pinecone":
+                pointer["index"] = store.name
+            save_index_pointer(pointer)
+            print(f"Switched {INDEX_POINTER_PATH} to namespace '{store.namespace}' (build {build_id})")
+    except BaseException:
+        if reset:
+            # Whatever failed (loading, an upload, validation), the pointer
+            # still names the live namespace; drop the half-built one.
+            print(f"Rebuild failed - the chat route stays on '{live_store.namespace or '(default)'}'; "
+                  f"deleting namespace '{store.namespace}'.")
+            try:
+                store.delete_all()
+            except Exception as e:
+                print(f"  Could not delete '{store.namespace}' ({e}) - delete it by hand.")
+        raise
 
-        print("\n" + "=" * 60)
-        print("Upload complete!")
-        print("=" * 60)
+    export_bm25(bm25)
+    if reset:
+        if live_store.namespace != store.namespace:
+            retired[live_store.namespace] = time.time()
+        layout_changed = live_dim != EMBED_DIM or (backend == "local" and live_codec != LOCAL_VECTOR_CODEC)
+        if layout_changed and backend == "pinecone":
+            # The retired namespaces live in the old index, which goes away as a whole.
+            print(f"Index '{live_store.name}' is no longer used once this deploy is live - "
+                  "delete it from the Pinecone console then.")
+            retired = {}
+        elif layout_changed:
+            # Namespaces in the old layout can only be opened with its settings.
+            retired = collect_retired_namespaces(live_store, retired, store.namespace, gc_grace)
+        retired = collect_retired_namespaces(store, retired, store.namespace, gc_grace)
     else:
-        print("No new content to upload.")
+        build_id = new_build_id()
+        save_index_pointer({**load_index_pointer(), "build_id": build_id, "vectors": vector_count})
+        print(f"Stamped {INDEX_POINTER_PATH} with build {build_id}")
+        # Let the updated vectors settle so the known query results below
+        # reflect this build; if they don't, build_id keeps stale ones unused.
+        try:
+            wait_for_count(store, vector_count, time.monotonic() + BUILD_VALIDATE_TIMEOUT)
+        except RuntimeError as e:
+            print(f"Warning: {e} - skipping the known query results")
+            build_id = None
+
+    if reset:
+        # Every stored vector was just encoded with these statistics.
+        save_bm25_baseline(bm25)
+    report_bm25_drift(bm25)
+    export_known_queries(bm25, store, build_id, use_embed_cache, report)
+
+    print("Updating tracking file...")
+    tracking_data["manifest_version"] = MANIFEST_VERSION
+    tracking_data["sources"] = sources
+    tracking_data["bm25_footprints"] = footprints
+    tracking_data["duplicates"] = {cid: dup_ids for cid, dup_ids in merged.items() if dup_ids}
+    tracking_data["retired_namespaces"] = retired
+    save_tracking(tracking_data)
+    close_run_report(report, report_path)
+
+    print("\n" + "=" * 60)
+    print("Upload complete!")
+    print("=" * 60)
 
 if __name__ == "__main__":
     main()
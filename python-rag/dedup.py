@@ -0,0 +1,117 @@
+"""
+Chunk-level content deduplication for the RAG indexer.
+
+Two checks, in order:
+
+  exact  - sha256 of the whitespace-normalized chunk text
+  near   - MinHash signatures of word shingles, bucketed with LSH; a
+           candidate pair is a duplicate when the signatures' estimated
+           Jaccard similarity is at least `threshold`
+
+Chunks are checked in stream order and the first one seen is kept as the
+canonical copy, so a deterministic input order gives deterministic output.
+Signatures use fixed seeds and CRC32 shingle hashes, so they are stable
+across processes and runs.
+"""
+
+import hashlib
+import zlib
+
+import numpy as np
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def normalized_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def lsh_bands(num_perm: int, threshold: float) -> tuple[int, int]:
+    """(bands, rows) with bands * rows <= num_perm whose S-curve midpoint
+    (1 / bands) ** (1 / rows) is closest to threshold, erring low so true
+    duplicates above the threshold are rarely missed."""
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        midpoint = (1 / bands) ** (1 / rows)
+        score = abs(midpoint - threshold) + (0.05 if midpoint > threshold else 0.0)
+        if best is None or score < best[0]:
+            best = (score, bands, rows)
+    return best[1], best[2]
+
+
+class ChunkDeduplicator:
+    def __init__(self, threshold: float | None = 0.9, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        """threshold=None disables near-duplicate detection (exact only)."""
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: h(x) = ((a * x + b) mod 2^64) >> 32, a odd
+        self._a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self.bands, self.rows = lsh_bands(num_perm, threshold) if threshold is not None else (0, 0)
+        self._exact: dict[str, str] = {}              # text hash -> canonical key
+        self._buckets: list[dict[bytes, list[str]]] = [{} for _ in range(self.bands)]
+        self._signatures: dict[str, np.ndarray] = {}  # canonical key -> signature
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        words = text.lower().split()
+        k = self.shingle_size
+        shingles = [" ".join(words[i:i + k]) for i in range(max(len(words) - k + 1, 1))]
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        with np.errstate(over="ignore"):
+            permuted = (hashes[:, None] * self._a[None, :] + self._b[None, :]) >> np.uint64(32)
+        return (permuted & _MASK32).min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def check(self, key: str, text: str) -> str | None:
+        """Return the canonical key that text duplicates, or register it under
+        key as a new canonical chunk and return None."""
+        text_hash = normalized_hash(text)
+        canonical = self._exact.get(text_hash)
+        if canonical is not None:
+            self.exact_duplicates += 1
+            return canonical
+        self._exact[text_hash] = key
+        if self.threshold is None:
+            return None
+
+        signature = self.signature(text)
+        band_keys = self._band_keys(signature)
+        candidates = []
+        for buckets, band_key in zip(self._buckets, band_keys):
+            candidates.extend(buckets.get(band_key, ()))
+        for candidate in dict.fromkeys(candidates):
+            similarity = float((self._signatures[candidate] == signature).mean())
+            if similarity >= self.threshold:
+                self.near_duplicates += 1
+                self._exact[text_hash] = candidate
+                return candidate
+
+        self._signatures[key] = signature
+        for buckets, band_key in zip(self._buckets, band_keys):
+            buckets.setdefault(band_key, []).append(key)
+        return None
+
+
+def merge_metadata(canonical: dict, duplicates: list[dict]) -> dict:
+    """Metadata for a canonical chunk that stands in for duplicates: list
+    fields (applies_to_ids, topics, ...) become the union in first-seen
+    order, and the duplicates' source files are listed in duplicate_sources."""
+    merged = dict(canonical)
+    sources = []
+    for duplicate in duplicates:
+        for key, value in duplicate.items():
+            if isinstance(value, list) and isinstance(merged.get(key, []), list):
+                merged[key] = list(dict.fromkeys([*merged.get(key, []), *value]))
+        source = duplicate.get("file_path") or duplicate.get("source")
+        if source and source not in sources:
+            sources.append(source)
+    if sources:
+        merged["duplicate_sources"] = sources
+    return merged
@@ -0,0 +1,162 @@
+"""
+Persistent on-disk embedding cache for the RAG indexer.
+
+Vectors are keyed by (model name, dimension, sha256 of the chunk text). Each
+(model, dimension) pair gets its own directory (per codec, for a quantized
+cache) holding:
+
+  vectors.*    - one row per cached text in the cache's codec, memory-mapped
+                 on read (quantization.VectorFile: vectors.f32 for float32,
+                 vectors.i8 + vectors.scale.f32 for int8)
+  index.json   - sha256 -> [row, last_used_run], plus the run counter
+
+An int8 cache is ~4x smaller, and hands back the dequantized vectors, so
+what gets upserted differs from the API's output by the quantization error
+(see bench-quantization.py). Rows are only ever appended; eviction (least
+recently used first, once the cache grows past max_entries) rewrites the
+matrix compactly on save().
+Anything with an `embed_documents(texts) -> list[list[float]]` method can be
+used as the embedder, so the cache can be exercised offline with a fake one.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from quantization import VectorFile, roundtrip
+
+VECTORS_PREFIX = "vectors"
+INDEX_FILE = "index.json"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, directory: str, model: str, dimension: int, max_entries: int = 100_000,
+                 codec: str = "float32"):
+        self.model = model
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.codec = codec
+        name = f"{model.replace('/', '_')}-{dimension}" + (f"-{codec}" if codec != "float32" else "")
+        self.path = os.path.join(directory, name)
+        self.entries: dict[str, list[int]] = {}  # sha256 -> [row, last_used_run]
+        self.vectors = VectorFile(os.path.join(self.path, VECTORS_PREFIX), dimension, codec)
+        self.run = 0
+        self.hits = 0
+        self.misses = 0
+        self._load()
+        # Every instantiation is a new "run" for LRU purposes.
+        self.run += 1
+
+    @property
+    def rows(self) -> int:
+        return self.vectors.rows
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.path, INDEX_FILE)
+
+    def _load(self):
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if (index.get("model") != self.model or index.get("dimension") != self.dimension
+                or index.get("codec", "float32") != self.codec):
+            return
+        self.entries = index["entries"]
+        self.vectors.rows = index["rows"]
+        self.run = index.get("run", 0)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, text: str) -> np.ndarray | None:
+        entry = self.entries.get(text_hash(text))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry[1] = self.run
+        return self.vectors[entry[0]]
+
+    def put_many(self, texts: list[str], vectors) -> None:
+        """Append vectors for texts that aren't cached yet."""
+        new_rows = []
+        for text, vector in zip(texts, vectors):
+            key = text_hash(text)
+            if key in self.entries:
+                self.entries[key][1] = self.run
+                continue
+            row = np.asarray(vector, dtype=np.float32)
+            if row.shape != (self.dimension,):
+                raise ValueError(f"Expected a {self.dimension}-dim vector, got shape {row.shape}")
+            self.entries[key] = [self.rows + len(new_rows), self.run]
+            new_rows.append(row)
+        if new_rows:
+            self.vectors.append(np.stack(new_rows))
+
+    def save(self) -> None:
+        """Evict least recently used entries over max_entries, compact the
+        vector file if it holds dead rows, and write the index."""
+        if len(self.entries) > self.max_entries:
+            by_recency = sorted(self.entries.items(), key=lambda item: item[1][1], reverse=True)
+            self.entries = dict(by_recency[: self.max_entries])
+        if len(self.entries) < self.rows:
+            self._compact()
+        if not self.entries and not os.path.isdir(self.path):
+            return
+        os.makedirs(self.path, exist_ok=True)
+        index = {
+            "model": self.model,
+            "dimension": self.dimension,
+            "codec": self.codec,
+            "rows": self.rows,
+            "run": self.run,
+            "entries": self.entries,
+        }
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _compact(self):
+        ordered = sorted(self.entries.items(), key=lambda item: item[1][0])
+        self.vectors.compact([entry[0] for _, entry in ordered])
+        for new_row, (_, entry) in enumerate(ordered):
+            entry[0] = new_row
+
+
+def embed_with_cache(texts: list[str], embedder, cache: EmbeddingCache | None) -> np.ndarray:
+    """Embed texts into a float32 (len(texts), dimension) matrix, only sending
+    cache misses to the embedder. Duplicate texts within the batch are
+    embedded once. A packed matrix holds a vector in about an eighth of
+    the memory of a list of Python floats."""
+    if cache is None:
+        return np.asarray(embedder.embed_documents(texts), dtype=np.float32)
+
+    results = np.empty((len(texts), cache.dimension), dtype=np.float32)
+    missing: dict[str, list[int]] = {}
+    for i, text in enumerate(texts):
+        cached = cache.get(text)
+        if cached is None:
+            missing.setdefault(text, []).append(i)
+        else:
+            results[i] = cached
+
+    if missing:
+        miss_texts = list(missing)
+        vectors = np.asarray(embedder.embed_documents(miss_texts), dtype=np.float32)
+        cache.put_many(miss_texts, vectors)
+        # Round through the cache's codec so a miss returns exactly what a later hit will.
+        for text, vector in zip(miss_texts, roundtrip(vectors, cache.codec)):
+            results[missing[text]] = vector
+
+    print(f"  Embedding cache: {len(texts) - sum(len(v) for v in missing.values())} hits, "
+          f"{len(missing)} texts sent to the embedding API")
+    return results
@@ -0,0 +1,206 @@
+"""
+Concurrent, rate-limit-aware batched embedding for the RAG indexer.
+
+Texts are packed into request batches by token count (tiktoken), the batches
+are sent through a thread pool with a concurrency cap, and 429/5xx/connection
+errors are retried with exponential backoff (honoring Retry-After). Every
+batch's latency is recorded so a run can report throughput.
+
+The OpenAI client reads OPENAI_BASE_URL, so the engine can be pointed at a
+local stub server (see bench-embeddings.py) instead of the real API.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import openai
+
+# OpenAI limits: 8191 tokens per input, 2048 inputs and 300k tokens per request.
+MAX_INPUT_TOKENS = 8191
+MAX_BATCH_INPUTS = 2048
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+def load_encoding(model: str):
+    """tiktoken encoding for the model, or None if it can't be loaded
+    (tiktoken downloads BPE files on first use, which fails offline)."""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def shorten_embeddings(vectors, dimension: int) -> np.ndarray:
+    """First `dimension` components of each vector, re-normalized to unit
+    length. This is how the text-embedding-3 models shorten their output for
+    the `dimensions` parameter, so full-width vectors (e.g. from the cache)
+    can be evaluated at a smaller width without new API calls."""
+    vectors = np.asarray(vectors, dtype=np.float32)[..., :dimension]
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+
+def _retry_after(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class BatchedEmbedder:
+    """Drop-in replacement for OpenAIEmbeddings.embed_documents with token-based
+    batching, bounded concurrency and backoff."""
+
+    def __init__(
+        self,
+        model: str,
+        dimensions: int | None = None,
+        max_batch_tokens: int = 50_000,
+        max_concurrency: int = 4,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        client=None,
+    ):
+        self.model = model
+        self.dimensions = dimensions
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Retries are handled here so they can be coordinated across threads.
+        self.client = client or openai.OpenAI(max_retries=0)
+        self.encoding = load_encoding(model)
+        self.batch_stats: list[dict] = []
+        self.total_tokens = 0
+        self.api_calls = 0
+        self._lock = threading.Lock()
+        self._pause_until = 0.0
+
+    def count_tokens(self, text: str) -> int:
+        if self.encoding is None:
+            return max(1, len(text) // 4)  # Rough estimate when tiktoken is unavailable
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str) -> tuple[str, int]:
+        """(text, token_count) with text cut to MAX_INPUT_TOKENS, which the API
+        rejects inputs over. Without tiktoken the cut is by the same rough
+        4-characters-per-token estimate as count_tokens."""
+        if self.encoding is None:
+            text = text[:MAX_INPUT_TOKENS * 4]
+            return text, max(1, len(text) // 4)
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= MAX_INPUT_TOKENS:
+            return text, len(tokens)
+        return self.encoding.decode(tokens[:MAX_INPUT_TOKENS]), MAX_INPUT_TOKENS
+
+    def pack_batches(self, token_counts: list[int]) -> list[tuple[list[int], int]]:
+        """Greedily group input positions into batches under the token budget.
+        Returns [(positions, token_count), ...] in input order."""
+        batches = []
+        current, current_tokens = [], 0
+        for i, tokens in enumerate(token_counts):
+            if current and (current_tokens + tokens > self.max_batch_tokens or len(current) >= MAX_BATCH_INPUTS):
+                batches.append((current, current_tokens))
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append((current, current_tokens))
+        return batches
+
+    def _wait_for_cooldown(self):
+        while True:
+            with self._lock:
+                delay = self._pause_until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def _embed_batch(self, batch_number: int, batch_texts: list[str], tokens: int) -> list[list[float]]:
+        kwargs = {"model": self.model, "input": batch_texts}
+        if self.dimensions:
+            kwargs["dimensions"] = self.dimensions
+
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_cooldown()
+            try:
+                with self._lock:
+                    self.api_calls += 1
+                response = self.client.embeddings.create(**kwargs)
+                break
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                # A 429 means every worker is over the limit, not just this one.
+                with self._lock:
+                    self._pause_until = max(self._pause_until, time.monotonic() + delay)
+                print(f"  Embedding batch {batch_number} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+
+        elapsed = time.perf_counter() - start
+        usage = getattr(response, "usage", None)
+        used_tokens = getattr(usage, "total_tokens", None) or tokens
+        with self._lock:
+            self.total_tokens += used_tokens
+            self.batch_stats.append({
+                "batch": batch_number,
+                "inputs": len(batch_texts),
+                "tokens": used_tokens,
+                "seconds": round(elapsed, 4),
+                "attempts": attempt + 1,
+            })
+        print(f"  Embedded batch {batch_number}: {len(batch_texts)} texts, {used_tokens} tokens "
+              f"in {elapsed:.2f}s ({used_tokens / max(elapsed, 1e-9):,.0f} tok/s)")
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        inputs = [self.truncate(text) for text in texts]
+        truncated = sum(1 for text, (fitted, _) in zip(texts, inputs) if len(fitted) < len(text))
+        if truncated:
+            print(f"  Truncated {truncated} text(s) to the {MAX_INPUT_TOKENS}-token input limit")
+        texts = [fitted for fitted, _ in inputs]
+        batches = self.pack_batches([tokens for _, tokens in inputs])
+        print(f"  Embedding {len(texts)} texts in {len(batches)} batch(es), "
+              f"concurrency {min(self.max_concurrency, len(batches))}")
+
+        start = time.perf_counter()
+        results: list[list[float] | None] = [None] * len(texts)
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+            futures = [
+                (positions, pool.submit(self._embed_batch, n + 1, [texts[i] for i in positions], tokens))
+                for n, (positions, tokens) in enumerate(batches)
+            ]
+            for positions, future in futures:
+                for i, vector in zip(positions, future.result()):
+                    results[i] = vector
+
+        elapsed = time.perf_counter() - start
+        tokens = sum(tokens for _, tokens in batches)
+        print(f"  Embedded {len(texts)} texts (~{tokens} tokens) in {elapsed:.2f}s: "
+              f"{len(texts) / max(elapsed, 1e-9):,.1f} texts/s, {tokens / max(elapsed, 1e-9):,.0f} tok/s")
+        return results
@@ -0,0 +1,128 @@
+"""
+Queries known at index time (the chat suggestions and the bench-chat.mjs
+defaults), exported with their dense and sparse query vectors so the chat
+route can skip the embeddings round-trip when a visitor sends one of them.
+
+The export is keyed by normalize_query(text), a port of
+normalizeSuggestedQuestion in personalsite/src/data/chatSuggestions.ts. Both
+sides carry NORMALIZATION; the route ignores an export whose version
+doesn't match its own, so a change to one normalizer can't silently miss
+(or mismatch) lookups.
+
+Export format (JSON):
+
+  {"version": 1, "normalization": NORMALIZATION, "model": ..., "dimension": ...,
+   "queries": {key: {"text": ..., "dense": <base64 little-endian float32>,
+                     "sparse": {"indices": [...], "values": [...]}}}}
+
+The sparse vectors are encoded with the BM25 model written in the same run,
+so they always match the vocabulary the site ships with.
+
+export_query_results writes the retrieval results for the same queries,
+taken from the index right after it was built:
+
+  {"version": 1, "normalization": NORMALIZATION, "build_id": ..., "namespace": ...,
+   "top_k": ..., "queries": {key: [{"id": ..., "score": ..., "metadata": {...}}, ...]}}
+
+They are only valid for the index build they came from: the route uses them
+only while build_id matches the one in rag-index.json, which every run that
+changes the index rewrites.
+"""
+
+import base64
+import json
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+NORMALIZATION = "suggested-question-v1"
+
+# (file, regex for the block listing the queries, regex for one query in it)
+KNOWN_QUERY_SOURCES = [
+    (os.path.join("..", "personalsite", "src", "data", "chatSuggestions.ts"),
+     r"CHAT_SUGGESTIONS[^=]*=\s*\[(.*?)\n\];", r'text:\s*"((?:[^"\\]|\\.)*)"'),
+    (os.path.join("..", "personalsite", "bench-chat.mjs"),
+     r"DEFAULT_QUERIES\s*=\s*\[(.*?)\];", r'"((?:[^"\\]|\\.)*)"'),
+]
+
+
+def normalize_query(text: str) -> str:
+    """Lookup key for a query; keep in sync with normalizeSuggestedQuestion."""
+    text = unicodedata.normalize("NFKC", text)
+    text = re.sub("[‘’]", "'", text).strip()
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"[?.!]+$", "", text)
+    return text.lower()
+
+
+def load_known_queries(sources=KNOWN_QUERY_SOURCES) -> list[str]:
+    """Query texts from the site sources, first spelling of each key wins."""
+    queries = {}
+    for path, block_pattern, item_pattern in sources:
+        if not os.path.exists(path):
+            print(f"  Known queries: {path} not found, skipping")
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            block = re.search(block_pattern, f.read(), re.S)
+        if block is None:
+            print(f"  Known queries: no query list found in {path}")
+            continue
+        for match in re.finditer(item_pattern, block.group(1)):
+            text = json.loads(f'"{match.group(1)}"')
+            queries.setdefault(normalize_query(text), text)
+    return list(queries.values())
+
+
+def pack_vector(vector) -> str:
+    return base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+
+
+def unpack_vector(packed: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(packed), dtype="<f4")
+
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def export_query_embeddings(path, queries, dense_vectors, bm25, model, dimension):
+    """Write the query export for queries and their dense vectors; returns its size in bytes."""
+    export = {
+        "version": 1,
+        "normalization": NORMALIZATION,
+        "model": model,
+        "dimension": dimension,
+        "queries": {
+            normalize_query(text): {"text": text, "dense": pack_vector(vector), "sparse": bm25.encode_query(text)}
+            for text, vector in zip(queries, dense_vectors)
+        },
+    }
+    return _write_json(path, export)
+
+
+def export_query_results(path, queries, results, build_id, namespace, top_k):
+    """Write the retrieval results (one match list per query) for index build
+    build_id; returns the file size in bytes. Chunk text is left out of the
+    metadata: the route reads it from the chunk text store like any match."""
+    export = {
+        "version": 1,
+        "normalization": NORMALIZATION,
+        "build_id": build_id,
+        "namespace": namespace,
+        "top_k": top_k,
+        "queries": {
+            normalize_query(text): [
+                {"id": m["id"], "score": round(float(m["score"]), 6),
+                 "metadata": {k: v for k, v in (m["metadata"] or {}).items() if k != "text"}}
+                for m in matches
+            ]
+            for text, matches in zip(queries, results)
+        },
+    }
+    return _write_json(path, export)
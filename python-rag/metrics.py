@@ -0,0 +1,197 @@
+"""
+Run metrics for the RAG indexer.
+
+RunReport collects, per named stage:
+
+  wall_s, cpu_s  - summed over every time the stage ran; streamed stages
+                   (chunking, dedup, embedding, ...) are entered once per
+                   document or slice, so this is their total cost.
+                   Durations recorded from other threads (the per-source
+                   "load:<name>" stages) have wall time only
+  calls, items   - how often the stage ran and how many items it handled
+  items_per_s    - items / wall_s
+  peak_rss_mb    - the process's peak resident set size when the stage last
+                   finished (a high-water mark, so it only ever grows)
+
+Stages can nest: "scan" is the whole first pass and includes the time of
+"chunk", "dedup" and "bm25_add". Alongside the stages it keeps free-form
+counters (tokens, bytes, API calls, cost) and writes everything as one JSON
+run report that CI keeps per run, so runs can be compared.
+
+Stages named in profile_stages also run under a profiler: cProfile (stats
+written as <stage>.prof, readable with pstats or snakeviz) or pyinstrument
+(<stage>.html, optional dependency).
+"""
+
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class RunReport:
+    def __init__(self, profile_stages=(), profiler: str = "cprofile", profile_dir: str = "."):
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.settings: dict = {}
+        self.stages: dict[str, dict] = {}
+        self.counters: dict[str, float] = {}
+        self.profile_stages = set(profile_stages)
+        if profiler == "pyinstrument" and self.profile_stages:
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                print("pyinstrument is not installed - profiling with cProfile instead")
+                profiler = "cprofile"
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self._profilers: dict = {}
+        self.profile_paths: list[str] = []
+        self._profiling = False
+
+    def _stage(self, name: str) -> dict:
+        return self.stages.setdefault(name, {"wall_s": 0.0, "calls": 0, "items": 0})
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0):
+        """Time a block as (part of) stage name. The yielded dict's "items"
+        can be raised inside the block when the count isn't known upfront."""
+        record = {"items": items}
+        # Only one profiler can be active at a time, so a profiled stage
+        # nested in another profiled stage is covered by the outer one.
+        profiler = None
+        if name in self.profile_stages and not self._profiling:
+            profiler = self._start_profiler(name)
+            self._profiling = True
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if profiler is not None:
+                self._stop_profiler(name, profiler)
+                self._profiling = False
+            self.record(name, wall, cpu, record["items"])
+
+    def record(self, name: str, wall_s: float, cpu_s: float | None = None, items: int = 0):
+        """Add a duration measured elsewhere (e.g. on a loader thread) to a
+        stage. Without cpu_s the stage reports wall time only: process CPU
+        time can't be attributed to one thread."""
+        stage = self._stage(name)
+        stage["wall_s"] += wall_s
+        if cpu_s is not None:
+            stage["cpu_s"] = stage.get("cpu_s", 0.0) + cpu_s
+        stage["calls"] += 1
+        stage["items"] += items
+        stage["peak_rss_mb"] = peak_rss_mb()
+
+    def count(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def _start_profiler(self, name: str):
+        if self.profiler == "pyinstrument":
+            from pyinstrument import Profiler
+
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+        import cProfile
+
+        # cProfile accumulates across enable()/disable(), so a streamed stage
+        # keeps one profiler for all of its calls.
+        profiler = self._profilers.setdefault(name, cProfile.Profile())
+        profiler.enable()
+        return profiler
+
+    def _stop_profiler(self, name: str, profiler):
+        if self.profiler == "pyinstrument":
+            from pyinstrument.session import Session
+
+            session = profiler.stop()
+            previous = self._profilers.get(name)
+            self._profilers[name] = Session.combine(previous, session) if previous else session
+        else:
+            profiler.disable()
+
+    def write_profiles(self) -> list[str]:
+        """Dump each profiled stage into profile_dir; returns the paths."""
+        if not self._profilers:
+            return []
+        os.makedirs(self.profile_dir, exist_ok=True)
+        paths = []
+        for name, profiler in self._profilers.items():
+            if self.profiler == "pyinstrument":
+                from pyinstrument.renderers import HTMLRenderer
+
+                path = os.path.join(self.profile_dir, f"{name}.html")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(HTMLRenderer().render(profiler))
+            else:
+                path = os.path.join(self.profile_dir, f"{name}.prof")
+                profiler.dump_stats(path)
+            paths.append(path)
+        self.profile_paths = paths
+        return paths
+
+    def to_dict(self) -> dict:
+        stages = {}
+        for name, stage in self.stages.items():
+            stage = dict(stage)
+            stage["wall_s"] = round(stage["wall_s"], 4)
+            if "cpu_s" in stage:
+                stage["cpu_s"] = round(stage["cpu_s"], 4)
+            if stage["items"] and stage["wall_s"]:
+                stage["items_per_s"] = round(stage["items"] / stage["wall_s"], 1)
+            stages[name] = stage
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "duration_s": round(time.perf_counter() - self._start, 3),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "peak_rss_mb": peak_rss_mb(),
+            "settings": self.settings,
+            "stages": stages,
+            "counters": {name: round(value, 6) for name, value in self.counters.items()},
+            "profiles": self.profile_paths,
+        }
+
+    def print_summary(self):
+        report = self.to_dict()
+        print(f"\nRun metrics ({report['duration_s']:.2f}s total"
+              + (f", peak RSS {report['peak_rss_mb']:.0f} MB" if report["peak_rss_mb"] is not None else "") + "):")
+        print(f"  {'stage':<14} {'wall s':>8} {'cpu s':>8} {'calls':>6} {'items':>8} {'items/s':>10}")
+        for name, stage in report["stages"].items():
+            rate = f"{stage['items_per_s']:,.0f}" if "items_per_s" in stage else ""
+            cpu = f"{stage['cpu_s']:.2f}" if "cpu_s" in stage else "-"
+            print(f"  {name:<14} {stage['wall_s']:>8.2f} {cpu:>8} {stage['calls']:>6} "
+                  f"{stage['items']:>8} {rate:>10}")
+        for name, value in report["counters"].items():
+            print(f"  {name}: {value:,}" if float(value).is_integer() else f"  {name}: {value:.6f}")
+        for path in self.profile_paths:
+            print(f"  Profile: {path}")
+
+    def save(self, path: str):
+        """Write the JSON run report."""
+        report = self.to_dict()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Run report written to {path}")
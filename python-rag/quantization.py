@@ -0,0 +1,209 @@
+"""
+Quantized dense vector storage for the embedding cache and LocalVectorStore.
+
+CODECS, for a d-dimensional vector:
+
+  float32  4d bytes      exact
+  int8     d + 4 bytes   each component rounded to one of 255 steps of a
+                         per-vector scale (max |x| / 127); ~4x smaller,
+                         dotproducts within a fraction of a percent
+  binary   d / 8 bytes   the component signs, 8 to a byte; ~32x smaller to
+                         scan. Signs alone rank too coarsely, so a search
+                         takes the rows whose signs agree most with the
+                         query's (XOR + popcount) and rescores them against
+                         an int8 copy kept next to the bits on disk
+
+Queries stay float32: rows are scored against the unquantized query, which
+loses much less than quantizing both sides.
+
+VectorFile is an append-only matrix in one codec, memory-mapped on read:
+<prefix>.f32 for float32, <prefix>.i8 plus <prefix>.scale.f32 for int8, and
+binary adds <prefix>.b1. A binary scan only pages in the bits; int8 rows are
+read for the candidates alone. The owner records the row count alongside
+its own index, and appends start from that count: rows a crashed run wrote
+without saving its index are overwritten rather than misnumbered.
+"""
+
+import os
+
+import numpy as np
+
+CODECS = ("float32", "int8", "binary")
+INT8_LEVELS = 127
+SCAN_BLOCK_ROWS = 256  # Rows decoded at a time by full scans; small enough to stay in cache
+
+
+def encode_int8(vectors) -> tuple[np.ndarray, np.ndarray]:
+    """(codes, scales) with codes * scales[:, None] ~= vectors."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.abs(vectors).max(axis=1) / INT8_LEVELS
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -INT8_LEVELS, INT8_LEVELS).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def decode_int8(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return codes.astype(np.float32) * scales[:, None]
+
+
+def encode_binary(vectors) -> np.ndarray:
+    return np.packbits(np.atleast_2d(np.asarray(vectors)) > 0, axis=1)
+
+
+def roundtrip(vectors, codec: str) -> np.ndarray:
+    """vectors as they read back after being stored with codec."""
+    if codec == "float32":
+        return np.asarray(vectors, dtype=np.float32)
+    return decode_int8(*encode_int8(vectors))
+
+
+class VectorFile:
+    def __init__(self, prefix: str, dimension: int, codec: str = "float32", rows: int = 0):
+        """rows is how many vectors the files already hold (the owner's index
+        records it; the files themselves carry no header)."""
+        if codec not in CODECS:
+            raise ValueError(f"Unknown vector codec: {codec} (expected one of {', '.join(CODECS)})")
+        self.prefix = prefix
+        self.dimension = dimension
+        self.codec = codec
+        self.rows = rows
+        self._maps: dict[str, np.ndarray] = {}
+
+    def _parts(self) -> list[tuple[str, type, int]]:
+        """(file suffix, dtype, values per row) of each file the codec writes."""
+        if self.codec == "float32":
+            return [(".f32", np.float32, self.dimension)]
+        parts = [(".i8", np.int8, self.dimension), (".scale.f32", np.float32, 1)]
+        if self.codec == "binary":
+            parts.append((".b1", np.uint8, (self.dimension + 7) // 8))
+        return parts
+
+    @property
+    def paths(self) -> list[str]:
+        return [self.prefix + suffix for suffix, _, _ in self._parts()]
+
+    @property
+    def bytes_per_vector(self) -> int:
+        """Bytes stored per vector, over all of the codec's files."""
+        return sum(np.dtype(dtype).itemsize * width for _, dtype, width in self._parts())
+
+    @property
+    def scan_bytes_per_vector(self) -> int:
+        """Bytes a full scan reads per vector (the binary bits only)."""
+        if self.codec == "binary":
+            return (self.dimension + 7) // 8
+        return self.bytes_per_vector
+
+    def _map(self, suffix: str) -> np.ndarray:
+        """Memory-map one of the files, re-mapping if rows were appended."""
+        matrix = self._maps.get(suffix)
+        if matrix is None or matrix.shape[0] != self.rows:
+            dtype, width = next((dtype, width) for s, dtype, width in self._parts() if s == suffix)
+            if self.rows == 0:
+                matrix = np.empty((0, width), dtype=dtype)
+            else:
+                matrix = np.memmap(self.prefix + suffix, dtype=dtype, mode="r", shape=(self.rows, width))
+            self._maps[suffix] = matrix
+        return matrix
+
+    def _encode(self, vectors: np.ndarray) -> dict[str, np.ndarray]:
+        if self.codec == "float32":
+            return {".f32": vectors}
+        codes, scales = encode_int8(vectors)
+        parts = {".i8": codes, ".scale.f32": scales}
+        if self.codec == "binary":
+            parts[".b1"] = encode_binary(vectors)
+        return parts
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __getitem__(self, rows) -> np.ndarray:
+        """Decoded float32 rows: an int gives one vector, a slice or index
+        array a matrix."""
+        if isinstance(rows, (int, np.integer)):
+            return self[[rows]][0]
+        if self.codec == "float32":
+            return np.array(self._map(".f32")[rows])
+        return decode_int8(self._map(".i8")[rows], self._map(".scale.f32")[rows, 0])
+
+    def decode(self) -> np.ndarray:
+        return self[:]
+
+    def append(self, vectors):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dim vectors, got shape {vectors.shape}")
+        if not len(vectors):
+            return
+        directory = os.path.dirname(self.prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Drop the current mappings before growing the files underneath them.
+        self._maps.clear()
+        for suffix, data in self._encode(vectors).items():
+            data = np.ascontiguousarray(data)
+            path = self.prefix + suffix
+            # Write from the last row the owner recorded, not the end of the
+            # file: rows appended by a run that died before saving its index
+            # are unaccounted for and get overwritten.
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                f.seek(self.rows * (data.nbytes // len(data)))
+                f.truncate()
+                f.write(data.tobytes())
+        self.rows += len(vectors)
+
+    def dot(self, query, rows=None) -> np.ndarray:
+        """Dotproduct of a float32 query with every stored vector, or with
+        the given rows. int8 (and binary, via its int8 copy) is decoded a
+        block at a time, so a full scan never holds a float32 copy."""
+        query = np.asarray(query, dtype=np.float32)
+        if self.codec == "float32":
+            matrix = self._map(".f32")
+            return (matrix if rows is None else np.asarray(matrix[rows])) @ query
+        codes, scales = self._map(".i8"), self._map(".scale.f32")[:, 0]
+        if rows is not None:
+            return (codes[rows] @ query) * scales[rows]
+        out = np.empty(self.rows, dtype=np.float32)
+        block = np.empty((SCAN_BLOCK_ROWS, self.dimension), dtype=np.float32)
+        for start in range(0, self.rows, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, self.rows)
+            # Decode into one reused float32 buffer so the product runs in BLAS.
+            decoded = block[:end - start]
+            np.copyto(decoded, codes[start:end], casting="unsafe")
+            out[start:end] = (decoded @ query) * scales[start:end]
+        return out
+
+    def sign_search(self, query, limit: int) -> np.ndarray:
+        """Rows (unordered) of the `limit` vectors whose component signs
+        agree most with the query's; binary codec only."""
+        if self.codec != "binary":
+            raise ValueError("sign_search needs the binary codec")
+        bits = self._map(".b1")
+        query_bits = encode_binary(query)[0]
+        disagree = np.empty(self.rows, dtype=np.int32)
+        for start in range(0, self.rows, SCAN_BLOCK_ROWS):
+            block = bits[start:start + SCAN_BLOCK_ROWS]
+            disagree[start:start + len(block)] = np.bitwise_count(block ^ query_bits).sum(axis=1)
+        if self.rows <= limit:
+            return np.arange(self.rows)
+        return np.argpartition(disagree, limit - 1)[:limit]
+
+    def compact(self, keep):
+        """Rewrite the files with only the rows in keep, in that order."""
+        parts = {suffix: np.ascontiguousarray(self._map(suffix)[keep]) for suffix, _, _ in self._parts()}
+        # Release the mappings before replacing the files (required on Windows).
+        self._maps.clear()
+        for suffix, data in parts.items():
+            tmp_path = self.prefix + suffix + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data.tobytes())
+            os.replace(tmp_path, self.prefix + suffix)
+        self.rows = len(keep)
+
+    def delete(self):
+        self._maps.clear()
+        for path in self.paths:
+            if os.path.exists(path):
+                os.remove(path)
+        self.rows = 0
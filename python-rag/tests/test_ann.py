@@ -0,0 +1,112 @@
+"""
+Offline tests for the IVF index: recall against brute force, incremental
+adds, compaction and persistence.
+
+Run from python-rag/:
+  uv run python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann import IVFIndex  # noqa: E402
+from vector_store import LocalVectorStore  # noqa: E402
+
+DIM = 64
+TOP_K = 10
+PQ_LIMIT = 5 * TOP_K  # Rows PQ keeps for exact re-scoring
+
+
+def clustered(n, topics=40, spread=1.0, seed=0):
+    """Unit vectors scattered around random topic centers, like embeddings
+    of a corpus about a few dozen subjects."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, DIM)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    vectors = centers[rng.integers(0, topics, n)] + rng.standard_normal((n, DIM)).astype(np.float32) * spread / np.sqrt(DIM)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall(index, vectors, queries, nprobe, limit):
+    """Mean fraction of each query's exact top-k that the index returns
+    after the candidates are re-scored exactly, as the store does."""
+    hits = []
+    for query in queries:
+        exact = np.argsort(-(vectors @ query))[:TOP_K]
+        rows = index.search(query, nprobe, limit)
+        found = rows[np.argsort(-(vectors[rows] @ query))[:TOP_K]]
+        hits.append(len(set(exact) & set(found)) / TOP_K)
+    return float(np.mean(hits))
+
+
+class IVFIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.vectors = clustered(4000)
+        self.queries = clustered(50, seed=1)
+
+    def test_recall_against_brute_force(self):
+        for pq_subvectors, limit, floor in ((0, TOP_K, 0.9), (16, PQ_LIMIT, 0.85)):
+            with self.subTest(pq_subvectors=pq_subvectors):
+                index = IVFIndex(DIM, nlist=32, pq_subvectors=pq_subvectors)
+                index.train(self.vectors)
+                self.assertEqual(len(index), len(self.vectors))
+                self.assertGreaterEqual(recall(index, self.vectors, self.queries, nprobe=8, limit=limit), floor)
+                if pq_subvectors:
+                    self.assertEqual(len(index.search(self.queries[0], 8, limit)), limit)
+                else:
+                    # Probing every list scans everything, so IVF-Flat is then exact.
+                    self.assertEqual(recall(index, self.vectors, self.queries, nprobe=32, limit=limit), 1.0)
+
+    def test_more_probes_do_not_lose_recall(self):
+        index = IVFIndex(DIM, nlist=32)
+        index.train(self.vectors)
+        recalls = [recall(index, self.vectors, self.queries, nprobe, TOP_K) for nprobe in (1, 4, 16)]
+        self.assertEqual(recalls, sorted(recalls))
+
+    def test_added_rows_are_found_without_retraining(self):
+        index = IVFIndex(DIM, nlist=32, pq_subvectors=16)
+        index.train(self.vectors[:3000])
+        index.add(self.vectors[3000:])
+        self.assertEqual(index.trained_rows, 3000)
+        self.assertEqual(len(index), len(self.vectors))
+        self.assertGreaterEqual(recall(index, self.vectors, self.queries, nprobe=8, limit=PQ_LIMIT), 0.85)
+
+    def test_keep_and_reload_preserve_the_rows(self):
+        index = IVFIndex(DIM, nlist=32, pq_subvectors=16)
+        index.train(self.vectors)
+        keep = np.arange(0, len(self.vectors), 2)
+        index.keep(keep)
+        path = os.path.join(self.tmp.name, "ivf.npz")
+        index.save(path)
+        loaded = IVFIndex.load(path)
+
+        kept = self.vectors[keep]
+        for query in self.queries[:10]:
+            rows = loaded.search(query, 8, PQ_LIMIT)
+            np.testing.assert_array_equal(np.sort(rows), np.sort(index.search(query, 8, PQ_LIMIT)))
+            self.assertLess(rows.max(), len(kept))
+        self.assertGreaterEqual(recall(loaded, kept, self.queries, nprobe=8, limit=PQ_LIMIT), 0.8)
+
+    def test_store_queries_through_the_index(self):
+        store = LocalVectorStore(self.tmp.name, DIM, ann_nlist=32, ann_min_rows=1000)
+        store.upsert([{"id": f"chunk-{i}", "values": vector, "metadata": {}} for i, vector in enumerate(self.vectors)])
+        store.save()
+        store = LocalVectorStore(self.tmp.name, DIM, ann_nlist=32, ann_min_rows=1000)
+        hits = []
+        for query in self.queries:
+            exact = [r["id"] for r in store.query(query, top_k=TOP_K, exact=True)]
+            found = [r["id"] for r in store.query(query, top_k=TOP_K)]
+            hits.append(len(set(exact) & set(found)) / TOP_K)
+        self.assertGreaterEqual(np.mean(hits), 0.9)
+
+
+if __name__ == "__main__":
+    unittest.main()
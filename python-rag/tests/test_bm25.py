@@ -0,0 +1,209 @@
+"""
+Offline tests for SimpleBM25 and its model exports.
+
+Run from python-rag/:
+  uv run python -m unittest discover tests
+"""
+
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bm25 import STOPWORDS, SimpleBM25, tokenize, tokenize_query  # noqa: E402
+
+CORPUS = [
+    "Hybrid search combines dense embeddings with sparse BM25 vectors.",
+    "Pinecone stores the vectors; the chat route queries them.",
+    "BM25 weights terms by inverse document frequency and term saturation.",
+    "The indexer chunks markdown, fits BM25 and uploads every chunk.",
+    "Résumé entries and GitHub READMEs are chunked the same way.",
+    "Dense embeddings come from the OpenAI embeddings endpoint.",
+]
+QUERIES = ["bm25 sparse vectors", "github readme chunks", "embeddings endpoint"]
+WORDS = ("the index search vector sparse dense chunk query term rank score model react python "
+         "pinecone embedding cache the of and a to is résumé C++ it's 2024 v2.0 x").split()
+
+EDGE_CASES = [
+    "",
+    "   ",
+    "C++ / C# & F#: don't-stop_believing!",
+    "naïve café résumé — über straße",
+    "İstanbul KELVIN \u212a sign",
+    "tabs\tand\nnewlines\r\nand\xa0nbsp\u2003em\x1fsep",
+    "x y z a1 b2 42 3.14 v2.0.1 e-mail foo@bar.com",
+    "zero\u200bwidth \x1cfile\x1dsep \x85nel \u2028line",
+    "emoji 🚀 rocket ✨ sparkles",
+]
+
+
+def random_corpus(n, seed=0):
+    """Chunk-like texts over a small vocabulary (so terms repeat within and
+    across documents), with rare per-document terms mixed in."""
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(5, 40)) + [f"rare{rng.randint(0, n)}"])
+            for _ in range(n)]
+
+
+def loop_fit(corpus):
+    """Statistics as the original per-token loop computed them:
+    (vocab, doc_freq, idf, avgdl)."""
+    vocab, doc_freq, total = {}, {}, 0
+    for text in corpus:
+        tokens = tokenize(text)
+        total += len(tokens)
+        for token in dict.fromkeys(tokens):
+            idx = vocab.setdefault(token, len(vocab))
+            doc_freq[idx] = doc_freq.get(idx, 0) + 1
+    n = len(corpus)
+    idf = {idx: math.log((n - df + 0.5) / (df + 0.5) + 1.0) for idx, df in doc_freq.items()}
+    return vocab, doc_freq, idf, total / max(n, 1)
+
+
+class VectorizedFitTest(unittest.TestCase):
+    def test_fit_matches_the_per_token_loop(self):
+        corpus = random_corpus(300)
+        bm25 = SimpleBM25().fit(corpus)
+        vocab, doc_freq, idf, avgdl = loop_fit(corpus)
+        self.assertEqual(bm25.vocab, vocab)
+        self.assertEqual(bm25.doc_freq, doc_freq)
+        self.assertEqual(bm25.idf, idf)
+        self.assertEqual(bm25.avgdl, avgdl)
+
+    def test_encode_documents_matches_encode_document(self):
+        corpus = random_corpus(200)
+        bm25 = SimpleBM25().fit(corpus)
+        # Fitted texts reuse the fit's term counts; the others are tokenized afresh.
+        texts = corpus[:50] + random_corpus(50, seed=1) + ["", "the of and"]
+        for options in ({}, {"max_terms": 3}, {"mass": 0.8, "levels": 4}):
+            with self.subTest(options=options):
+                self.assertEqual(bm25.encode_documents(texts, **options),
+                                 [bm25.encode_document(text, **options) for text in texts])
+
+
+def reference_tokenize(text):
+    """The original regex tokenizer, which tokenize must match exactly."""
+    return [t for t in re.sub(r"[^a-z0-9\s]", " ", text.lower()).split() if len(t) > 1 and t not in STOPWORDS]
+
+
+def random_unicode(n, seed=0):
+    """Random strings mixing ASCII with arbitrary BMP characters."""
+    rng = random.Random(seed)
+    alphabet = "abcXYZ019 _-.\t\n"
+    return ["".join(rng.choice(alphabet) if rng.random() < 0.7 else chr(rng.randint(0x80, 0xFFFF))
+                    for _ in range(rng.randint(0, 40)))
+            for _ in range(n)]
+
+
+class TokenizerTest(unittest.TestCase):
+    def test_matches_the_regex_tokenizer(self):
+        for text in CORPUS + QUERIES + EDGE_CASES + random_corpus(50) + random_unicode(2000):
+            with self.subTest(text=text):
+                self.assertEqual(tokenize(text), reference_tokenize(text))
+
+    def test_query_tokens_are_memoized(self):
+        tokenize_query.cache_clear()
+        for text in EDGE_CASES + QUERIES:
+            with self.subTest(text=text):
+                self.assertEqual(tokenize_query(text), tuple(reference_tokenize(text)))
+        self.assertEqual(tokenize_query.cache_info().hits, 0)
+        for text in QUERIES:
+            self.assertIs(tokenize_query(text), tokenize_query(text))
+        self.assertEqual(tokenize_query.cache_info().hits, 2 * len(QUERIES))
+
+
+def by_token(bm25, table):
+    """A per-index table keyed by token instead, so models whose term
+    indices were assigned in a different order can be compared."""
+    tokens = {idx: token for token, idx in bm25.vocab.items()}
+    return {tokens[int(idx)]: value for idx, value in table.items()}
+
+
+class OnlineUpdateTest(unittest.TestCase):
+    def assert_matches_refit(self, online, corpus, **prune_options):
+        refit = SimpleBM25().fit(corpus)
+        refit.prune(**prune_options)
+        online.prune(**prune_options)
+        self.assertEqual(online.n_docs, refit.n_docs)
+        self.assertEqual(online.total_length, refit.total_length)
+        self.assertAlmostEqual(online.avgdl, refit.avgdl, places=12)
+        self.assertEqual(by_token(online, online.doc_freq), by_token(refit, refit.doc_freq))
+        self.assertEqual(by_token(online, online.idf), by_token(refit, refit.idf))
+        online_snapshot, refit_snapshot = online.stats_snapshot(), refit.stats_snapshot()
+        self.assertEqual(by_token(online, online_snapshot["doc_freq"]), by_token(refit, refit_snapshot["doc_freq"]))
+        self.assertAlmostEqual(online_snapshot["avgdl"], refit_snapshot["avgdl"], places=12)
+        self.assertEqual(online_snapshot["n_docs"], refit_snapshot["n_docs"])
+
+    def test_add_and_remove_match_a_full_refit(self):
+        corpus = random_corpus(200)
+        added, removed = random_corpus(40, seed=1), corpus[:30]
+        online = SimpleBM25().fit(corpus)
+        online.add_documents(added)
+        online.remove_documents(removed)
+        self.assert_matches_refit(online, corpus[30:] + added)
+
+    def test_removal_by_footprint_matches_removal_by_text(self):
+        corpus = random_corpus(100)
+        footprints = SimpleBM25().fit(corpus).footprints(corpus[:20])
+        by_text, by_footprint = SimpleBM25().fit(corpus), SimpleBM25().fit(corpus)
+        by_text.remove_documents(corpus[:20])
+        by_footprint.remove_documents(footprints=footprints)
+        self.assertEqual(by_footprint.doc_freq, by_text.doc_freq)
+        self.assertEqual(by_footprint.idf, by_text.idf)
+        self.assert_matches_refit(by_footprint, corpus[20:])
+
+    def test_pruned_terms_keep_their_counts_through_updates(self):
+        corpus = random_corpus(200)
+        online = SimpleBM25().fit(corpus, min_df=3)
+        online.add_documents(random_corpus(60, seed=2))
+        online.remove_documents(corpus[:50])
+        self.assert_matches_refit(online, corpus[50:] + random_corpus(60, seed=2), min_df=3)
+
+    def test_drift_is_zero_until_the_statistics_change(self):
+        corpus = random_corpus(200)
+        bm25 = SimpleBM25().fit(corpus)
+        snapshot = bm25.stats_snapshot()
+        self.assertEqual(bm25.drift(snapshot), 0.0)
+        bm25.add_documents(random_corpus(100, seed=3))
+        self.assertGreater(bm25.drift(snapshot), 0.0)
+
+
+class BinaryModelTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.bm25 = SimpleBM25().fit(CORPUS)
+        self.bm25.prune(min_df=2)
+
+    def export(self):
+        json_path = os.path.join(self.tmp.name, "bm25-model.json")
+        binary_path = os.path.join(self.tmp.name, "bm25-model.bin")
+        self.bm25.save(json_path)
+        self.bm25.save_binary(binary_path)
+        return SimpleBM25.load(json_path), SimpleBM25.load(binary_path)
+
+    def test_binary_model_encodes_like_the_json_model(self):
+        from_json, from_binary = self.export()
+        self.assertEqual(dict(from_binary.vocab), from_json.vocab)
+        self.assertEqual(dict(from_binary.idf), from_json.idf)
+        self.assertEqual(dict(from_binary.doc_freq), from_json.doc_freq)
+        self.assertEqual(from_binary.pruned, from_json.pruned)
+        for query in QUERIES:
+            self.assertEqual(from_binary.encode_query(query), from_json.encode_query(query))
+        self.assertEqual(from_binary.encode_documents(CORPUS), from_json.encode_documents(CORPUS))
+
+    def test_binary_model_can_be_updated_online(self):
+        from_json, from_binary = self.export()
+        for model in (from_json, from_binary):
+            model.add_documents(["Sparse vectors for a new document about Pinecone."])
+        self.assertEqual(from_binary.idf, from_json.idf)
+        self.assertEqual(from_binary.doc_freq, from_json.doc_freq)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""
+Offline tests for chunk deduplication: exact hashes, MinHash/LSH near
+duplicates and merged metadata.
+
+Run from python-rag/:
+  uv run python -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup import ChunkDeduplicator, merge_metadata  # noqa: E402
+
+WORDS = ("chunk index search vector sparse dense query term rank score model react python "
+         "pinecone embedding cache route build deploy portfolio project resume blog").split()
+
+
+def random_text(n_words, seed):
+    rng = random.Random(seed)
+    return " ".join(rng.choices(WORDS, k=n_words))
+
+
+def edited(text, n_edits, seed):
+    """text with n_edits words replaced, spread over its length."""
+    rng = random.Random(seed)
+    words = text.split()
+    for i in rng.sample(range(len(words)), n_edits):
+        words[i] = f"edit{i}"
+    return " ".join(words)
+
+
+def shingle_jaccard(a, b, k=3):
+    def shingles(text):
+        words = text.lower().split()
+        return {" ".join(words[i:i + k]) for i in range(max(len(words) - k + 1, 1))}
+    a, b = shingles(a), shingles(b)
+    return len(a & b) / len(a | b)
+
+
+class ChunkDeduplicatorTest(unittest.TestCase):
+    def test_whitespace_variants_are_exact_duplicates(self):
+        for threshold in (None, 0.9):
+            with self.subTest(threshold=threshold):
+                dedup = ChunkDeduplicator(threshold=threshold)
+                self.assertIsNone(dedup.check("a", "Hybrid  search\ncombines dense and sparse."))
+                self.assertEqual(dedup.check("b", "  Hybrid search combines\tdense and sparse. "), "a")
+                self.assertEqual((dedup.exact_duplicates, dedup.near_duplicates), (1, 0))
+
+    def test_near_duplicates_are_caught_above_the_threshold(self):
+        dedup = ChunkDeduplicator(threshold=0.8)
+        originals = [random_text(200, seed) for seed in range(20)]
+        for i, text in enumerate(originals):
+            self.assertIsNone(dedup.check(f"doc-{i}", text))
+        for i, text in enumerate(originals):
+            copy = edited(text, 2, seed=i)
+            self.assertGreater(shingle_jaccard(text, copy), 0.9)
+            with self.subTest(doc=i):
+                self.assertEqual(dedup.check(f"copy-{i}", copy), f"doc-{i}")
+        self.assertEqual((dedup.exact_duplicates, dedup.near_duplicates), (0, len(originals)))
+
+    def test_distinct_chunks_are_kept(self):
+        dedup = ChunkDeduplicator(threshold=0.8)
+        text = random_text(200, seed=0)
+        rewritten = edited(text, 60, seed=1)
+        self.assertLess(shingle_jaccard(text, rewritten), 0.5)
+        self.assertIsNone(dedup.check("a", text))
+        self.assertIsNone(dedup.check("b", rewritten))
+        self.assertIsNone(dedup.check("c", random_text(200, seed=2)))
+        self.assertEqual(dedup.near_duplicates, 0)
+
+    def test_exact_only_mode_keeps_near_duplicates(self):
+        dedup = ChunkDeduplicator(threshold=None)
+        text = random_text(200, seed=0)
+        self.assertIsNone(dedup.check("a", text))
+        self.assertIsNone(dedup.check("b", edited(text, 1, seed=0)))
+        self.assertEqual(dedup.check("c", text), "a")
+        self.assertEqual((dedup.exact_duplicates, dedup.near_duplicates), (1, 0))
+
+    def test_signatures_estimate_jaccard_and_are_stable(self):
+        text = random_text(300, seed=0)
+        dedup, again = ChunkDeduplicator(), ChunkDeduplicator()
+        self.assertEqual(dedup.signature(text).tobytes(), again.signature(text).tobytes())
+        for n_edits in (5, 20, 60):
+            with self.subTest(edits=n_edits):
+                copy = edited(text, n_edits, seed=n_edits)
+                estimate = float((dedup.signature(text) == dedup.signature(copy)).mean())
+                self.assertAlmostEqual(estimate, shingle_jaccard(text, copy), delta=0.15)
+
+
+class MergeMetadataTest(unittest.TestCase):
+    def test_lists_union_and_sources_are_recorded(self):
+        canonical = {"file_path": "a.md", "topics": ["rag", "search"], "title": "A"}
+        duplicates = [
+            {"file_path": "b.md", "topics": ["search", "ml"], "title": "B", "applies_to_ids": ["p1"]},
+            {"source": "c.md", "topics": ["rag"]},
+            {"file_path": "b.md"},
+        ]
+        merged = merge_metadata(canonical, duplicates)
+        self.assertEqual(merged["topics"], ["rag", "search", "ml"])
+        self.assertEqual(merged["applies_to_ids"], ["p1"])
+        self.assertEqual(merged["title"], "A")
+        self.assertEqual(merged["file_path"], "a.md")
+        self.assertEqual(merged["duplicate_sources"], ["b.md", "c.md"])
+        self.assertEqual(canonical["topics"], ["rag", "search"])
+
+    def test_no_duplicates_leave_the_metadata_alone(self):
+        canonical = {"file_path": "a.md", "topics": ["rag"]}
+        self.assertEqual(merge_metadata(canonical, []), canonical)
+
+
+if __name__ == "__main__":
+    unittest.main()
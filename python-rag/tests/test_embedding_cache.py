@@ -0,0 +1,88 @@
+"""
+Offline tests for the embedding cache, with a fake embedder.
+
+Run from python-rag/:
+  uv run python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_cache import EmbeddingCache, embed_with_cache  # noqa: E402
+
+DIM = 8
+
+
+class FakeEmbedder:
+    """Deterministic vectors per text, counting the texts it was asked for."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.extend(texts)
+        return [vector_for(text).tolist() for text in texts]
+
+
+def vector_for(text):
+    rng = np.random.default_rng(list(text.encode("utf-8")))
+    return rng.standard_normal(DIM).astype(np.float32)
+
+
+class EmbeddingCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def open(self, codec="float32"):
+        return EmbeddingCache(self.tmp.name, "fake-model", DIM, codec=codec)
+
+    def test_hits_survive_a_reload(self):
+        embedder = FakeEmbedder()
+        cache = self.open()
+        embed_with_cache(["a", "b", "a"], embedder, cache)
+        cache.save()
+        self.assertEqual(embedder.calls, ["a", "b"])
+
+        vectors = embed_with_cache(["b", "a"], embedder, self.open())
+        self.assertEqual(embedder.calls, ["a", "b"])
+        np.testing.assert_array_equal(vectors, [vector_for("b"), vector_for("a")])
+
+    def test_interrupted_run_does_not_misnumber_rows(self):
+        for codec in ("float32", "int8", "binary"):
+            with self.subTest(codec=codec):
+                cache = self.open(codec)
+                cache.put_many(["a"], [vector_for("a")])
+                cache.save()
+                # A run that dies after embedding, before save() writes the index.
+                self.open(codec).put_many(["b"], [vector_for("b")])
+                cache = self.open(codec)
+                cache.put_many(["c"], [vector_for("c")])
+                cache.save()
+
+                cache = self.open(codec)
+                self.assertIsNone(cache.get("b"))
+                for text in ("a", "c"):
+                    np.testing.assert_allclose(cache.get(text), vector_for(text), atol=0.05)
+
+    def test_eviction_compacts_to_the_most_recent(self):
+        embedder = FakeEmbedder()
+        for text in ("a", "b", "c"):
+            cache = EmbeddingCache(self.tmp.name, "fake-model", DIM, max_entries=2)
+            embed_with_cache([text], embedder, cache)
+            cache.save()
+        cache = EmbeddingCache(self.tmp.name, "fake-model", DIM, max_entries=2)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.rows, 2)
+        self.assertIsNone(cache.get("a"))
+        np.testing.assert_array_equal(cache.get("c"), vector_for("c"))
+
+
+if __name__ == "__main__":
+    unittest.main()
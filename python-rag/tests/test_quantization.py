@@ -0,0 +1,130 @@
+"""
+Offline tests for the quantized vector codecs and VectorFile.
+
+Run from python-rag/:
+  uv run python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantization import CODECS, INT8_LEVELS, SCAN_BLOCK_ROWS, VectorFile, decode_int8, encode_int8, roundtrip  # noqa: E402
+
+DIM = 40  # Not a multiple of 8, so the last byte of each binary row is padded
+
+
+def vectors(n, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+class CodecTest(unittest.TestCase):
+    def test_int8_roundtrip_is_within_half_a_step(self):
+        data = vectors(100)
+        data[0] = 0.0
+        codes, scales = encode_int8(data)
+        self.assertEqual(codes.dtype, np.int8)
+        self.assertEqual(np.abs(codes).max(), INT8_LEVELS)
+        decoded = decode_int8(codes, scales)
+        error = np.abs(decoded - data).max(axis=1)
+        self.assertTrue(np.all(error <= scales / 2 + 1e-6))
+        np.testing.assert_array_equal(decoded[0], 0.0)
+        np.testing.assert_array_equal(roundtrip(data, "int8"), decoded)
+        np.testing.assert_array_equal(roundtrip(data, "binary"), decoded)
+        np.testing.assert_array_equal(roundtrip(data, "float32"), data)
+
+
+class VectorFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def open(self, codec, rows=0):
+        return VectorFile(os.path.join(self.tmp.name, "vectors"), DIM, codec=codec, rows=rows)
+
+    def test_codecs_read_back_and_score_like_float32(self):
+        # More rows than a scan block, so the blocked paths run more than once.
+        data = vectors(2 * SCAN_BLOCK_ROWS + 17)
+        query = vectors(1, seed=1)[0]
+        rows = np.array([5, 300, 2, 520])
+        for codec in CODECS:
+            with self.subTest(codec=codec):
+                stored = self.open(codec)
+                stored.append(data[:100])
+                stored.append(data[100:])
+                stored = self.open(codec, rows=len(data))
+                expected = roundtrip(data, codec)
+                np.testing.assert_array_equal(stored.decode(), expected)
+                np.testing.assert_array_equal(stored[7], expected[7])
+                np.testing.assert_array_equal(stored[rows], expected[rows])
+                np.testing.assert_allclose(stored.dot(query), expected @ query, rtol=1e-5, atol=1e-4)
+                np.testing.assert_allclose(stored.dot(query, rows), expected[rows] @ query, rtol=1e-5, atol=1e-4)
+                # Each component is off by at most half a step, which bounds
+                # how far an int8 score can drift from the float32 one.
+                _, scales = encode_int8(data)
+                bound = scales / 2 * np.abs(query).sum() if codec != "float32" else 0.0
+                self.assertTrue(np.all(np.abs(stored.dot(query) - data @ query) <= bound + 1e-4))
+                stored.delete()
+
+    def test_sign_search_returns_the_fewest_disagreeing_signs(self):
+        data = vectors(3 * SCAN_BLOCK_ROWS)
+        stored = self.open("binary")
+        stored.append(data)
+        for seed in range(5):
+            query = vectors(1, seed=seed + 1)[0]
+            disagree = ((data > 0) != (query > 0)).sum(axis=1)
+            for limit in (1, 10, 100):
+                with self.subTest(seed=seed, limit=limit):
+                    rows = stored.sign_search(query, limit)
+                    self.assertEqual(len(rows), limit)
+                    self.assertEqual(len(set(rows.tolist())), limit)
+                    # Any rows tied at the cutoff may be returned, so compare distances.
+                    np.testing.assert_array_equal(np.sort(disagree[rows]), np.sort(disagree)[:limit])
+        np.testing.assert_array_equal(np.sort(stored.sign_search(data[0], len(data) + 5)), np.arange(len(data)))
+        with self.assertRaises(ValueError):
+            self.open("int8").sign_search(data[0], 1)
+
+    def test_compact_keeps_rows_in_order(self):
+        data = vectors(50)
+        keep = np.array([40, 3, 17, 0])
+        for codec in CODECS:
+            with self.subTest(codec=codec):
+                stored = self.open(codec)
+                stored.append(data)
+                stored.compact(keep)
+                self.assertEqual(len(stored), len(keep))
+                np.testing.assert_array_equal(self.open(codec, rows=len(keep)).decode(), roundtrip(data[keep], codec))
+                for path in stored.paths:
+                    self.assertFalse(os.path.exists(path + ".tmp"))
+                stored.delete()
+                self.assertEqual(len(stored), 0)
+                self.assertFalse(any(os.path.exists(path) for path in stored.paths))
+
+    def test_appends_start_from_the_recorded_row_count(self):
+        data = vectors(3)
+        for codec in CODECS:
+            with self.subTest(codec=codec):
+                stored = self.open(codec)
+                stored.append(data[:2])
+                # Reopened as holding one row, as if the second were never saved.
+                stored = self.open(codec, rows=1)
+                stored.append(data[2])
+                np.testing.assert_array_equal(self.open(codec, rows=2).decode(), roundtrip(data[[0, 2]], codec))
+                for path in stored.paths:
+                    self.assertEqual(os.path.getsize(path) % 2, 0)
+                stored.delete()
+
+    def test_wrong_dimension_and_codec_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.open("float32").append(np.zeros((1, DIM + 1)))
+        with self.assertRaises(ValueError):
+            self.open("float16")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+Offline tests for LocalVectorStore: hybrid scoring, metadata filters and
+dead rows.
+
+Run from python-rag/:
+  uv run python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_store import LocalVectorStore, matches_filter  # noqa: E402
+
+DIM = 16
+
+
+def records(n, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+    return [{
+        "id": f"chunk-{i}",
+        "values": vectors[i],
+        "sparse_values": {"indices": [i % 5, 10 + i % 3], "values": [0.5, 0.25]},
+        "metadata": {"content_type": ["project", "blog"][i % 2], "year": 2020 + i % 4, "topics": [f"t{i % 3}", "all"]},
+    } for i in range(n)]
+
+
+class LocalVectorStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def open(self, **options):
+        return LocalVectorStore(self.tmp.name, DIM, **options)
+
+    def test_score_is_dense_plus_sparse_dotproduct(self):
+        store = self.open()
+        data = records(20)
+        store.upsert(data)
+        query = np.random.default_rng(1).standard_normal(DIM).astype(np.float32)
+        sparse = {"indices": [1, 11], "values": [2.0, 4.0]}
+
+        results = store.query(query, sparse, top_k=20)
+        expected = {}
+        for record in data:
+            weights = dict(zip(record["sparse_values"]["indices"], record["sparse_values"]["values"]))
+            expected[record["id"]] = float(record["values"] @ query) + 2.0 * weights.get(1, 0) + 4.0 * weights.get(11, 0)
+        self.assertEqual([r["id"] for r in results], sorted(expected, key=expected.get, reverse=True))
+        for result in results:
+            self.assertAlmostEqual(result["score"], expected[result["id"]], places=4)
+
+    def test_filters_follow_pinecone_syntax(self):
+        metadata = {"content_type": "project", "year": 2022, "topics": ["rag", "search"]}
+        cases = [
+            ({"content_type": "project"}, True),
+            ({"content_type": {"$ne": "project"}}, False),
+            ({"topics": {"$in": ["search", "ml"]}}, True),
+            ({"topics": {"$nin": ["rag"]}}, False),
+            ({"year": {"$gte": 2022, "$lt": 2023}}, True),
+            ({"topics": {"$gt": "a"}}, False),  # Range operators never match lists
+            ({"company": {"$exists": False}}, True),
+            ({"$or": [{"year": 2020}, {"topics": "rag"}]}, True),
+            ({"$and": [{"year": 2022}, {"content_type": "blog"}]}, False),
+        ]
+        for filter, expected in cases:
+            with self.subTest(filter=filter):
+                self.assertEqual(matches_filter(metadata, filter), expected)
+
+    def test_filtered_query_returns_best_matching_rows(self):
+        store = self.open()
+        data = records(40)
+        store.upsert(data)
+        query = data[3]["values"]
+        filter = {"$and": [{"content_type": "blog"}, {"topics": {"$in": ["t0"]}}]}
+
+        results = store.query(query, top_k=5, filter=filter)
+        matching = [r for r in data if matches_filter(r["metadata"], filter)]
+        expected = sorted(matching, key=lambda r: float(r["values"] @ query), reverse=True)[:5]
+        self.assertEqual([r["id"] for r in results], [r["id"] for r in expected])
+
+    def test_upserts_replace_and_deletes_hide_rows_across_a_reload(self):
+        store = self.open()
+        data = records(10)
+        store.upsert(data)
+        store.upsert([{**data[0], "metadata": {"content_type": "replaced"}}])
+        store.delete(["chunk-1"])
+        query = data[1]["values"]
+
+        for store in (store, self._saved(store)):
+            results = store.query(query, top_k=10)
+            ids = [r["id"] for r in results]
+            self.assertEqual(len(ids), 9)
+            self.assertNotIn("chunk-1", ids)
+            self.assertEqual(store.query(data[0]["values"], top_k=1, filter={"content_type": "replaced"})[0]["id"],
+                             "chunk-0")
+
+    def _saved(self, store):
+        store.save()
+        return self.open()
+
+    def test_dead_candidates_fall_back_to_a_full_scan(self):
+        # A binary store takes candidates from its sign scan; deleting the
+        # rows it finds must not shorten the result, with or without a filter.
+        store = self.open(codec="binary")
+        data = records(200)
+        store.upsert(data)
+        query = data[7]["values"]
+        first = store.query(query, top_k=3, candidates=1)
+        store.delete([r["id"] for r in first])
+
+        for filter in (None, {"content_type": "project"}):
+            with self.subTest(filter=filter):
+                results = store.query(query, top_k=3, candidates=1, filter=filter)
+                exact = store.query(query, top_k=3, filter=filter, exact=True)
+                self.assertEqual(len(results), 3)
+                self.assertEqual([r["id"] for r in results], [r["id"] for r in exact])
+
+
+if __name__ == "__main__":
+    unittest.main()
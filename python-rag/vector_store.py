@@ -0,0 +1,510 @@
+"""
+Vector store backends for the RAG indexer.
+
+  PineconeVectorStore - the serverless index the chat route queries
+  LocalVectorStore    - an on-disk stand-in with the same hybrid scoring, for
+                        development, CI and load tests without credentials
+
+Both take records shaped like Pinecone upserts:
+
+  {"id": str, "values": [float, ...],
+   "sparse_values": {"indices": [int, ...], "values": [float, ...]},
+   "metadata": {...}}
+
+and answer query() with [{"id", "score", "metadata"}, ...], best first. The
+score is the dotproduct of the dense vectors plus the dotproduct of the
+sparse vectors, which is what Pinecone computes for a dotproduct index
+queried with both. Filters use Pinecone's metadata filter syntax.
+
+Every store reads and writes one namespace ("" is the default one);
+with_namespace() gives a store for another namespace of the same index, and
+delete_all() removes the namespace. Rebuilds fill a fresh namespace while
+the chat route keeps reading the old one (see create-pinecone.py).
+
+LocalVectorStore keeps each namespace's data in one directory (the default
+namespace in the store directory itself, others in subdirectories of it):
+
+  dense.*             - dense matrix, one row per upserted record, memory-mapped,
+                        in the store's codec (quantization.py): dense.f32, or
+                        dense.i8 + dense.scale.f32 for int8, plus dense.b1 for binary
+  sparse_indptr.i64   - CSR row offsets into the two arrays below
+  sparse_indices.u32  - sparse term indices, row after row
+  sparse_values.f32   - sparse term weights
+  index.json          - row -> id and metadata
+  ann.npz             - IVF(-PQ) index over the dense rows (ann.py), once
+                        the store holds ANN_MIN_ROWS vectors
+
+Dense rows are appended as records arrive; upserting an existing id or
+deleting one only marks its old row dead (a boolean array of live rows is
+kept alongside), and save() compacts dead rows away and writes the sparse
+and index files.
+
+Below ANN_MIN_ROWS every query is scored exactly. Above it, query() scores
+exactly only a candidate set: the rows the IVF index returns for the dense
+vector (nprobe lists, re-ranked from PQ codes when enabled) plus the
+best-scoring rows for the sparse vector, found through term postings. The
+union is ranked by the exact hybrid score, so a chunk that only matches on
+BM25 terms is still found.
+
+With the binary codec the candidate set comes from a scan of the packed
+sign bits instead of an IVF index (at 1/32 of the float32 bytes, a full scan
+stays cheap), and candidates are scored against the int8 copy.
+"""
+
+import copy
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+from pinecone import Pinecone, ServerlessSpec
+
+from ann import IVFIndex
+from quantization import VectorFile
+
+DENSE_PREFIX = "dense"
+SPARSE_INDPTR_FILE = "sparse_indptr.i64"
+SPARSE_INDICES_FILE = "sparse_indices.u32"
+SPARSE_VALUES_FILE = "sparse_values.f32"
+INDEX_FILE = "index.json"
+ANN_FILE = "ann.npz"
+ANN_MIN_ROWS = 20_000     # Brute force is a few ms below this; build the IVF index above it
+ANN_NPROBE = 16           # IVF lists scanned per query (recall/latency knob)
+ANN_CANDIDATES = 10       # Dense and sparse candidates re-scored exactly, per requested result
+ANN_RETRAIN_GROWTH = 2.0  # Retrain centroids once the store has grown this much since training
+
+
+# === METADATA FILTERS ===
+def _matches_condition(value, operator, operand):
+    # List-valued metadata (applies_to_ids, topics) matches when any element does.
+    values = value if isinstance(value, list) else [value]
+    if operator == "$eq":
+        return operand in values
+    if operator == "$ne":
+        return operand not in values
+    if operator == "$in":
+        return any(v in operand for v in values)
+    if operator == "$nin":
+        return not any(v in operand for v in values)
+    if operator == "$exists":
+        return (value is not None) == operand
+    if value is None or isinstance(value, list):
+        return False
+    if operator == "$gt":
+        return value > operand
+    if operator == "$gte":
+        return value >= operand
+    if operator == "$lt":
+        return value < operand
+    if operator == "$lte":
+        return value <= operand
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+
+def matches_filter(metadata: dict, filter: dict | None) -> bool:
+    """Evaluate a Pinecone metadata filter ({"content_type": "project"},
+    {"applies_to_ids": {"$in": [...]}}, {"$and": [...]}, ...) locally."""
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            if not all(_matches_condition(metadata.get(key), op, operand) for op, operand in condition.items()):
+                return False
+        elif not _matches_condition(metadata.get(key), "$eq", condition):
+            return False
+    return True
+
+
+# === PINECONE ===
+class PineconeVectorStore:
+    def __init__(self, api_key: str, index_name: str, dimension: int, pool_threads: int = 1, namespace: str = ""):
+        self.name = index_name
+        self.dimension = dimension
+        self.namespace = namespace
+        self._pc = Pinecone(api_key=api_key)
+        self._pool_threads = pool_threads
+        self._index = None
+
+    def with_namespace(self, namespace: str) -> "PineconeVectorStore":
+        store = copy.copy(self)
+        store.namespace = namespace
+        return store
+
+    def namespaces(self) -> set[str]:
+        return set(self.index.describe_index_stats().namespaces)
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = self._pc.Index(self.name, pool_threads=self._pool_threads)
+        return self._index
+
+    def ensure_index(self):
+        """Create the index (dotproduct metric, for hybrid search) if it
+        doesn't exist. An existing index with another width or metric is an
+        error: it is shared by every namespace, including the one the chat
+        route is reading, so it is never deleted here."""
+        for idx_info in self._pc.list_indexes():
+            if idx_info.name == self.name:
+                if idx_info.dimension != self.dimension:
+                    # Serverless indexes can't change width; create_index below
+                    # would need a new name anyway.
+                    raise ValueError(f"Index '{self.name}' holds {idx_info.dimension}-dim vectors, "
+                                     f"expected {self.dimension}")
+                if idx_info.metric != "dotproduct":
+                    raise ValueError(f"Index '{self.name}' uses the '{idx_info.metric}' metric; hybrid search "
+                                     "needs 'dotproduct'. Point PINECONE_INDEX_NAME at a new index "
+                                     "(or delete this one from the Pinecone console) and run with --reset")
+                print(f"  Index '{self.name}' already uses dotproduct metric")
+                return
+
+        print(f"  Creating index '{self.name}' with dotproduct metric for hybrid search...")
+        self._pc.create_index(
+            name=self.name,
+            dimension=self.dimension,
+            metric="dotproduct",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+        )
+        # Wait for index to be ready
+        while not self._pc.describe_index(self.name).status.get("ready", False):
+            print("  Waiting for index to be ready...")
+            time.sleep(2)
+        print(f"  Index '{self.name}' created and ready")
+
+    def count(self) -> int:
+        namespace = self.index.describe_index_stats().namespaces.get(self.namespace)
+        return namespace.vector_count if namespace else 0
+
+    def upsert_async(self, records: list[dict]):
+        """Send an upsert on the index's thread pool; .get() waits for it."""
+        records = [{**record, "values": np.asarray(record["values"], dtype=np.float32).tolist()} for record in records]
+        return self.index.upsert(vectors=records, namespace=self.namespace, async_req=True, show_progress=False)
+
+    def delete(self, ids: list[str]):
+        batch_size = 1000  # Pinecone's per-request limit for delete by ID
+        for i in range(0, len(ids), batch_size):
+            self.index.delete(ids=ids[i:i + batch_size], namespace=self.namespace)
+
+    def delete_all(self):
+        # Pinecone drops a namespace once its last vector is deleted, and
+        # answers 404 for one that doesn't exist.
+        if self.namespace in self.namespaces():
+            self.index.delete(delete_all=True, namespace=self.namespace)
+
+    def query(self, vector, sparse_vector=None, top_k=10, filter=None) -> list[dict]:
+        response = self.index.query(
+            vector=np.asarray(vector, dtype=np.float32).tolist(),
+            sparse_vector=sparse_vector if sparse_vector and sparse_vector["indices"] else None,
+            top_k=top_k,
+            filter=filter,
+            namespace=self.namespace,
+            include_metadata=True,
+        )
+        return [{"id": m.id, "score": m.score, "metadata": m.metadata} for m in response.matches]
+
+    def save(self):
+        pass
+
+
+# === LOCAL ===
+class _Completed:
+    """Stand-in for an async request handle whose work is already done."""
+
+    def get(self):
+        return None
+
+
+class LocalVectorStore:
+    def __init__(self, directory: str, dimension: int, ann_nlist: int | None = None,
+                 ann_pq_subvectors: int = 0, ann_min_rows: int = ANN_MIN_ROWS, namespace: str = "",
+                 codec: str | None = None):
+        """ann_nlist and ann_pq_subvectors configure the IVF index (see
+        ann.IVFIndex); they take effect when it is (re)trained. codec is the
+        dense storage codec (quantization.CODECS); None takes the one the
+        namespace was written with, float32 for a new one."""
+        self.directory = directory
+        self.namespace = namespace
+        self.path = os.path.join(directory, namespace) if namespace else directory
+        self.dimension = dimension
+        self.ann_nlist = ann_nlist
+        self.ann_pq_subvectors = ann_pq_subvectors
+        self.ann_min_rows = ann_min_rows
+        self.codec = codec
+        self.ann: IVFIndex | None = None
+        self.ids: list[str | None] = []          # row -> id, None once the row is dead
+        self.metadata: list[dict | None] = []
+        self.rows_by_id: dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)   # row -> still live
+        self._sparse: list[tuple[np.ndarray, np.ndarray]] = []
+        self._csr: tuple[np.ndarray, np.ndarray, np.ndarray] | None = None
+        self._postings: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray] | None = None
+        self._load()
+        self.codec = self.codec or "float32"
+        # Holds every row written, dead ones included, until save() compacts.
+        self.vectors = VectorFile(self._file(DENSE_PREFIX), dimension, self.codec, rows=len(self.ids))
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def with_namespace(self, namespace: str) -> "LocalVectorStore":
+        return LocalVectorStore(self.directory, self.dimension, self.ann_nlist, self.ann_pq_subvectors,
+                                self.ann_min_rows, namespace=namespace, codec=self.codec)
+
+    def namespaces(self) -> set[str]:
+        if not os.path.isdir(self.directory):
+            return set()
+        names = {name for name in os.listdir(self.directory)
+                 if os.path.exists(os.path.join(self.directory, name, INDEX_FILE))}
+        if os.path.exists(os.path.join(self.directory, INDEX_FILE)):
+            names.add("")
+        return names
+
+    def _load(self):
+        if not os.path.exists(self._file(INDEX_FILE)):
+            return
+        with open(self._file(INDEX_FILE), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("dimension") != self.dimension:
+            raise ValueError(f"Local index in {self.path} holds {index.get('dimension')}-dim vectors, "
+                             f"expected {self.dimension}; delete it or run with --reset")
+        codec = index.get("codec", "float32")
+        if self.codec is not None and codec != self.codec:
+            raise ValueError(f"Local index in {self.path} stores {codec} vectors, expected {self.codec}; "
+                             "delete it or run with --reset")
+        self.codec = codec
+        self.ids = index["ids"]
+        self.metadata = index["metadata"]
+        self.rows_by_id = {cid: row for row, cid in enumerate(self.ids)}
+        self._alive = np.ones(len(self.ids), dtype=bool)
+        indptr = np.fromfile(self._file(SPARSE_INDPTR_FILE), dtype=np.int64)
+        indices = np.fromfile(self._file(SPARSE_INDICES_FILE), dtype=np.uint32)
+        values = np.fromfile(self._file(SPARSE_VALUES_FILE), dtype=np.float32)
+        self._sparse = [(indices[start:end], values[start:end]) for start, end in zip(indptr[:-1], indptr[1:])]
+        if os.path.exists(self._file(ANN_FILE)):
+            ann = IVFIndex.load(self._file(ANN_FILE), nlist=self.ann_nlist)
+            # A stale index (e.g. from an interrupted run) is retrained on save().
+            if len(ann) == len(self.ids) and ann.dimension == self.dimension:
+                self.ann = ann
+
+    def _sparse_csr(self):
+        """(row of each nonzero, term indices, values) over all rows."""
+        if self._csr is None:
+            lengths = np.fromiter((len(idx) for idx, _ in self._sparse), dtype=np.int64, count=len(self._sparse))
+            rows = np.repeat(np.arange(len(self._sparse)), lengths)
+            indices = np.concatenate([idx for idx, _ in self._sparse]) if self._sparse else np.empty(0, np.uint32)
+            values = np.concatenate([val for _, val in self._sparse]) if self._sparse else np.empty(0, np.float32)
+            self._csr = (rows, indices.astype(np.int64), values)
+        return self._csr
+
+    def _sparse_postings(self):
+        """The nonzeros grouped by term: (terms, start of each term's run,
+        rows, values), for scoring only the rows a query's terms occur in."""
+        if self._postings is None:
+            rows, indices, values = self._sparse_csr()
+            order = np.argsort(indices, kind="stable")
+            terms, starts = np.unique(indices[order], return_index=True)
+            self._postings = (terms, np.append(starts, len(order)), rows[order], values[order])
+        return self._postings
+
+    def sparse_scores(self, sparse_vector) -> np.ndarray:
+        """Sparse dotproduct of every row with sparse_vector."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        if not sparse_vector or not len(sparse_vector["indices"]):
+            return scores
+        terms, starts, rows, values = self._sparse_postings()
+        for term, weight in zip(sparse_vector["indices"], sparse_vector["values"]):
+            pos = np.searchsorted(terms, term)
+            if pos < len(terms) and terms[pos] == term:
+                run = slice(starts[pos], starts[pos + 1])
+                scores[rows[run]] += weight * values[run]
+        return scores
+
+    def __len__(self) -> int:
+        return len(self.rows_by_id)
+
+    def ensure_index(self):
+        os.makedirs(self.path, exist_ok=True)
+        print(f"  Local index in {self.path}/ ({len(self)} vectors)")
+
+    def count(self) -> int:
+        return len(self)
+
+    def upsert(self, records: list[dict]):
+        dense = np.asarray([record["values"] for record in records], dtype=np.float32)
+        if dense.shape != (len(records), self.dimension):
+            raise ValueError(f"Expected {self.dimension}-dim vectors, got shape {dense.shape}")
+        self._alive = np.concatenate([self._alive, np.ones(len(records), dtype=bool)])
+        for record in records:
+            old_row = self.rows_by_id.get(record["id"])
+            if old_row is not None:
+                self._kill(old_row)
+            sparse = record.get("sparse_values") or {"indices": [], "values": []}
+            self.rows_by_id[record["id"]] = len(self.ids)
+            self.ids.append(record["id"])
+            self.metadata.append(record.get("metadata") or {})
+            self._sparse.append((np.asarray(sparse["indices"], dtype=np.uint32),
+                                 np.asarray(sparse["values"], dtype=np.float32)))
+        os.makedirs(self.path, exist_ok=True)
+        self._csr = None
+        self._postings = None
+        self.vectors.append(dense)
+        if self.ann is not None:
+            self.ann.add(dense)
+
+    def upsert_async(self, records: list[dict]):
+        self.upsert(records)
+        return _Completed()
+
+    def _kill(self, row: int):
+        self.ids[row] = None
+        self.metadata[row] = None
+        self._alive[row] = False
+
+    def delete(self, ids: list[str]):
+        for cid in ids:
+            row = self.rows_by_id.pop(cid, None)
+            if row is not None:
+                self._kill(row)
+
+    def delete_all(self):
+        self.ids, self.metadata, self.rows_by_id, self._sparse = [], [], {}, []
+        self._alive = np.zeros(0, dtype=bool)
+        self._csr = None
+        self._postings = None
+        self.ann = None
+        self.vectors.delete()
+        if self.namespace:
+            shutil.rmtree(self.path, ignore_errors=True)
+            return
+        for name in (SPARSE_INDPTR_FILE, SPARSE_INDICES_FILE, SPARSE_VALUES_FILE, INDEX_FILE, ANN_FILE):
+            if os.path.exists(self._file(name)):
+                os.remove(self._file(name))
+
+    def scores(self, vector, sparse_vector=None) -> np.ndarray:
+        """Hybrid dotproduct score of every row (dead rows included)."""
+        return self.vectors.dot(vector) + self.sparse_scores(sparse_vector)
+
+    def _best(self, rows, row_scores, top_k, filter) -> tuple[np.ndarray, np.ndarray]:
+        """The top_k live rows of rows that pass filter, best first, with
+        their scores. The filter is only evaluated on the best-scoring rows,
+        a widening window at a time, until top_k of them pass."""
+        live = self._alive[rows]
+        rows, row_scores = rows[live], row_scores[live]
+        if not filter:
+            if len(rows) > top_k:
+                best = np.argpartition(-row_scores, top_k - 1)[:top_k]
+                rows, row_scores = rows[best], row_scores[best]
+            order = np.argsort(-row_scores, kind="stable")
+            return rows[order], row_scores[order]
+        picked, checked, window = [], np.zeros(len(rows), dtype=bool), top_k * 4
+        while len(picked) < top_k:
+            top = np.argpartition(-row_scores, window - 1)[:window] if window < len(rows) else np.arange(len(rows))
+            top = top[np.argsort(-row_scores[top], kind="stable")]
+            for i in top[~checked[top]].tolist():
+                if matches_filter(self.metadata[rows[i]], filter):
+                    picked.append(i)
+                    if len(picked) == top_k:
+                        break
+            if window >= len(rows):
+                break
+            checked[top] = True
+            window *= 4
+        return rows[picked], row_scores[picked]
+
+    def _candidates(self, vector, sparse_vector, top_k, nprobe, candidates):
+        """Hybrid scores for the dense candidates (from the IVF index, or the
+        sign scan of a binary store) plus the top sparse matches: (rows, scores)."""
+        limit = top_k * candidates
+        sparse = self.sparse_scores(sparse_vector)
+        if self.ann is not None:
+            rows = self.ann.search(vector, nprobe, limit)
+        else:
+            rows = self.vectors.sign_search(vector, limit)
+        matched = np.flatnonzero(sparse)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-sparse[matched], limit - 1)[:limit]]
+        rows = np.union1d(rows, matched)
+        return rows, self.vectors.dot(vector, rows) + sparse[rows]
+
+    def query(self, vector, sparse_vector=None, top_k=10, filter=None,
+              nprobe=ANN_NPROBE, candidates=ANN_CANDIDATES, exact=False) -> list[dict]:
+        """Top-k rows by hybrid score. Uses the IVF index when there is one,
+        or the sign scan for a binary store (exact=True forces a full scan).
+        Candidates that leave fewer than top_k results, because the filter
+        excluded them or their rows are dead, fall back to the full scan."""
+        rows = None
+        if (self.ann is not None or self.codec == "binary") and not exact:
+            rows, row_scores = self._best(*self._candidates(vector, sparse_vector, top_k, nprobe, candidates),
+                                          top_k, filter)
+            if len(rows) < top_k:
+                rows = None
+        if rows is None:
+            rows, row_scores = self._best(np.arange(len(self.ids)), self.scores(vector, sparse_vector), top_k, filter)
+        return [{"id": self.ids[row], "score": float(score), "metadata": self.metadata[row]}
+                for row, score in zip(rows.tolist(), row_scores.tolist())]
+
+    def save(self):
+        """Compact dead rows, bring the IVF index up to date and write the
+        sparse, index and ANN files."""
+        if len(self.rows_by_id) < len(self.ids):
+            self._compact()
+        if not self.ids and not os.path.isdir(self.path):
+            return
+        os.makedirs(self.path, exist_ok=True)
+        self._update_ann()
+        lengths = [len(idx) for idx, _ in self._sparse]
+        indptr = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).astype(np.int64)
+        rows, indices, values = self._sparse_csr()
+        indptr.tofile(self._file(SPARSE_INDPTR_FILE))
+        indices.astype(np.uint32).tofile(self._file(SPARSE_INDICES_FILE))
+        values.astype(np.float32).tofile(self._file(SPARSE_VALUES_FILE))
+        index = {"dimension": self.dimension, "codec": self.codec, "ids": self.ids, "metadata": self.metadata}
+        tmp_path = self._file(INDEX_FILE) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._file(INDEX_FILE))
+
+    def _compact(self):
+        keep = [row for row, cid in enumerate(self.ids) if cid is not None]
+        self.vectors.compact(keep)
+        self.ids = [self.ids[row] for row in keep]
+        self.metadata = [self.metadata[row] for row in keep]
+        self._sparse = [self._sparse[row] for row in keep]
+        self.rows_by_id = {cid: row for row, cid in enumerate(self.ids)}
+        self._alive = np.ones(len(self.ids), dtype=bool)
+        self._csr = None
+        self._postings = None
+        if self.ann is not None:
+            self.ann.keep(keep)
+
+    def _update_ann(self):
+        """Train the IVF index once the store reaches ann_min_rows, retrain it
+        after ANN_RETRAIN_GROWTH-fold growth (or a settings change), and drop
+        it if the store shrinks back below the threshold. Binary stores
+        find their candidates by sign scan and never build one."""
+        if len(self.ids) < self.ann_min_rows or self.codec == "binary":
+            self.ann = None
+            if os.path.exists(self._file(ANN_FILE)):
+                os.remove(self._file(ANN_FILE))
+            return
+        stale = (
+            self.ann is None
+            or len(self.ids) >= ANN_RETRAIN_GROWTH * self.ann.trained_rows
+            or self.ann.pq_subvectors != self.ann_pq_subvectors
+            or (self.ann_nlist is not None and len(self.ann.centroids) != self.ann_nlist)
+        )
+        if stale:
+            start = time.perf_counter()
+            self.ann = IVFIndex(self.dimension, nlist=self.ann_nlist, pq_subvectors=self.ann_pq_subvectors)
+            self.ann.train(self.vectors)
+            print(f"  Trained IVF index: {len(self.ann.centroids)} lists"
+                  f"{f', PQ {self.ann_pq_subvectors}x8 bits' if self.ann_pq_subvectors else ''}"
+                  f" over {len(self.ids)} vectors in {time.perf_counter() - start:.1f}s")
+        self.ann.save(self._file(ANN_FILE))